@@ -1,4 +1,6 @@
+import damagetypes
 import dice
+import enum
 import messages
 import world
 from mechanics import DnDRuleset as R
@@ -6,6 +8,27 @@ from mechanics import DnDRuleset as R
 """ asahala 2020  
 https://github.com/asahala/DnD5e-CombatSimulator/ """
 
+class Trigger(enum.IntEnum):
+    """ Events on which passive abilities are used. Passives name their
+    trigger by ´type´, e.g. ´on_start´; other types are not passives.
+    Arguments passed to use() after the creature are given in brackets """
+
+    INITIAL = 0         # Start of turn, also if incapacitated (allies, enemies)
+    ON_START = 1        # Start of turn if the creature acts (allies, enemies)
+    AT_END = 2          # End of turn (allies, enemies)
+    AVOID_DEATH = 3     # Hit to 0 HP (damage, damage type, crit multiplier)
+    ON_HIT = 4          # Weapon hit (target, damage, crit multiplier)
+    ON_MOVE = 5         # Moved (previous position)
+    ON_DEATH = 6        # Died (source of the killing damage)
+
+    @classmethod
+    def get(cls, type_):
+        """ Return trigger of a passive type or None """
+        if isinstance(type_, cls):
+            return type_
+        return cls.__members__.get(str(type_).upper())
+
+
 class Ability:
     """ Base class for special creature actions and abilities
 
@@ -49,6 +72,7 @@ class Restrain(Ability):
         if R.roll_hit(source, target, self):
             target.set_restrain(True, self.dc, self.save)
         self.available = False
+        source.schedule('recharge')
 
 
 class Paralysis(Ability):
@@ -124,7 +148,7 @@ class Poison(Ability):
     def __init__(self, damage, damage_type, duration=None, **kwargs):
         super().__init__(**kwargs)
         self.damage = dice.parse_damage(damage)
-        self.damage_type = damage_type
+        self.damage_type = [damagetypes.get(t) for t in damage_type]
         self.duration = duration
 
     def use(self, source, target, total_damage=0, crit_multipiler=1):
@@ -191,7 +215,7 @@ class Stomach:
         self.name = name
         self.contents = []
         self.damage = dice.parse_damage(damage)
-        self.damage_type = damage_type
+        self.damage_type = [damagetypes.get(t) for t in damage_type]
         self.breakout_dmg = breakout_dmg
         self.breakout_dc = breakout_dc
         self.damage_count = 0
@@ -300,9 +324,7 @@ class PackTactics:
     @staticmethod
     def use(creature, allies, enemies=[]):
 
-        ally_positions = (a.position for a in allies.get_alive()
-                          if a.position != creature.position)
-        if world.any_is_adjacent(creature.position, ally_positions):
+        if world.ally_is_adjacent(creature):
             creature.set_advantage('hit', 1)
         else:
             creature.set_advantage('hit', 0)
@@ -341,6 +363,19 @@ class AvoidDeath:
         self.min_crit = min_crit_to_kill
         self.vulnerabilities = vulnerabilities
 
+    def can_fail(self, creature, damage_types, max_damage):
+        """ Return False if the creature always avoids death against
+        damage of given types up to ´max_damage´: none of the types
+        ignore this passive, crits never do and the save cannot fail
+
+        :type damage_types         [str, ...]
+        :type max_damage           int """
+        if any(t in self.vulnerabilities for t in damage_types):
+            return True
+        if self.min_crit < 2:
+            return True
+        return 1 + creature.saves[self.save] < max_damage + self.penalty
+
     def use(self, creature, damage, damage_type, critical):
         if critical > self.min_crit or damage_type in self.vulnerabilities:
             return creature.hp
@@ -1,3 +1,14 @@
+import abc
+import array
+import dice
+import math
+import messages
+import random
+import recorder
+import scheduler
+import time
+import world
+
 
 class Standard:
 
@@ -8,8 +19,8 @@ class Standard:
 
     def do_stuff(self, allies, enemies):
         self.me.choose_target(enemies)
-        if self.me.focused_enemy is not None:
-            self.me.choose_weapon(enemies)
+        if self.me.focused_enemy is not None \
+                and self.me.choose_weapon(enemies):
             at_range = self.me.move()
             if at_range:
                 self.me.attack()
@@ -29,8 +40,412 @@ class SocialAnimal:
             if a.focused_enemy is not None and not a.focused_enemy.is_dead:
                 choice = a.focused_enemy
         self.me.choose_target(enemies, choice)
-        if self.me.focused_enemy is not None:
-            self.me.choose_weapon(enemies)
+        if self.me.focused_enemy is not None \
+                and self.me.choose_weapon(enemies):
             at_range = self.me.move()
             if at_range:
-                self.me.attack()
\ No newline at end of file
+                self.me.attack()
+
+""" ================================================================ """
+""" ======================= BATCHED POLICIES ======================= """
+""" ================================================================ """
+
+class Batch:
+
+    """ Target decisions of many creatures, possibly from several
+    matches, as feature columns. Decision ´i´ is made by ´creatures[i]´
+    and picks from ´candidates[group[i]]´, the living members of its
+    enemy party
+
+    Columns are array.array('d') indexed like the decisions
+    (´features´) or like the candidates of a group (´candidate_features´)
+    and can be wrapped with numpy.frombuffer() without copying """
+
+    FEATURES = ('x', 'y', 'hp', 'max_hp', 'ac', 'int', 'speed')
+    CANDIDATE_FEATURES = ('x', 'y', 'hp', 'ac')
+
+    def __init__(self):
+        self.creatures = []
+        self.group = array.array('q')
+        self.parties = []
+        self.candidates = []
+        self.features = {f: array.array('d') for f in self.FEATURES}
+        self.candidate_features = []
+        self.groups = {}        # Enemy party -> group index
+
+    def __len__(self):
+        return len(self.creatures)
+
+    def __repr__(self):
+        return "Batch(%i decisions, %i groups)" % (len(self), len(self.parties))
+
+    def add(self, creature, enemies):
+        """ Add a pending decision of a creature against a party """
+        group = self.groups.get(id(enemies))
+        if group is None:
+            group = len(self.parties)
+            self.groups[id(enemies)] = group
+            self.parties.append(enemies)
+            members = list(enemies.get_alive())
+            self.candidates.append(members)
+            self.candidate_features.append({
+                'x': array.array('d', [c.position[0] for c in members]),
+                'y': array.array('d', [c.position[1] for c in members]),
+                'hp': array.array('d', [c.hp for c in members]),
+                'ac': array.array('d', [c.ac for c in members])})
+        self.creatures.append(creature)
+        self.group.append(group)
+        features = self.features
+        features['x'].append(creature.position[0])
+        features['y'].append(creature.position[1])
+        features['hp'].append(creature.hp)
+        features['max_hp'].append(creature.max_hp)
+        features['ac'].append(creature.ac)
+        features['int'].append(creature.scores['int'])
+        features['speed'].append(creature.speed['ground'])
+
+
+class Policy(abc.ABC):
+
+    """ Batched policy protocol. decide() gets a Batch of decisions and
+    returns one action per decision: the index of the chosen candidate,
+    a list of candidate indices in order of preference, or -1 to let
+    the creature's own behavior choose. A creature takes the first
+    living candidate whenever it needs a new target during the round,
+    so returning the same list object for many decisions is cheap.
+
+    Policies must implement decide(); one that does not cannot be
+    created """
+
+    @abc.abstractmethod
+    def decide(self, batch):
+        """ Return one action per decision of a batch
+
+        :type batch               Batch
+        :rtype                    [int or [int, ...], ...] """
+
+
+class Individual(Policy):
+
+    """ Adapter that leaves every decision to each creature's own
+    behavior, e.g. Standard or SocialAnimal """
+
+    def decide(self, batch):
+        return [-1] * len(batch)
+
+
+class StandardPolicy(Policy):
+
+    """ Batched version of the Standard behavior: creatures with
+    intelligence of 4 or less pick the closest enemy and others the
+    weakest one. Candidates are ranked by HP once per enemy party and
+    round, and closest candidates are looked up from a grid of
+    buckets """
+
+    """ Bucket side in map cells """
+    BUCKET = 4
+
+    def decide(self, batch):
+        actions = [-1] * len(batch)
+        weakest = {}
+        buckets = {}
+        x = batch.features['x']
+        y = batch.features['y']
+        for i, creature in enumerate(batch.creatures):
+            group = batch.group[i]
+            candidates = batch.candidates[group]
+            if not candidates:
+                continue
+            features = batch.candidate_features[group]
+            if creature.scores['int'] <= 4:
+                """ Closest enemies are not shared; look them up only for
+                creatures without a target """
+                focus = creature.focused_enemy
+                if focus is not None and not focus.is_dead:
+                    continue
+                if group not in buckets:
+                    buckets[group] = self.get_buckets(features)
+                actions[i] = self.get_closest(creature.position,
+                                              candidates, buckets[group])
+            else:
+                if group not in weakest:
+                    hp = features['hp']
+                    weakest[group] = sorted(range(len(hp)),
+                                            key=hp.__getitem__)
+                actions[i] = weakest[group]
+        return actions
+
+    def get_buckets(self, features):
+        """ Return candidate indices by bucket """
+        side = self.BUCKET
+        buckets = {}
+        for j, (cx, cy) in enumerate(zip(features['x'], features['y'])):
+            buckets.setdefault((int(cx) // side, int(cy) // side),
+                               []).append(j)
+        return buckets
+
+    def get_closest(self, position, candidates, buckets):
+        """ Return index of the closest candidate, ties broken by index
+        as in Party.get_closest(). Buckets are searched in growing rings
+        until no closer candidate can be found """
+        side = self.BUCKET
+        bx, by = int(position[0]) // side, int(position[1]) // side
+        best = None
+        seen = 0
+        r = 0
+        while seen < len(candidates):
+            """ Candidates beyond ring r are at least this far """
+            bound = round(max(r - 1, 0) * side) * 5
+            if best is not None and best[0] < bound:
+                break
+            for key in ring(bx, by, r):
+                for j in buckets.get(key, ()):
+                    seen += 1
+                    d = (world.get_dist(candidates[j].position, position), j)
+                    if best is None or d < best:
+                        best = d
+            r += 1
+        return best[1]
+
+
+def ring(x, y, r):
+    """ Return bucket keys at Chebyshev distance r from (x, y) """
+    if r == 0:
+        return [(x, y)]
+    keys = [(x + d, y - r) for d in range(-r, r + 1)]
+    keys += [(x + d, y + r) for d in range(-r, r + 1)]
+    keys += [(x - r, y + d) for d in range(-r + 1, r)]
+    keys += [(x + r, y + d) for d in range(-r + 1, r)]
+    return keys
+
+
+def plan_targets(policy, matches):
+    """ Let a batched policy choose targets for every creature of the
+    given matches in one batch. Choices are suggestions for the coming
+    round: a creature uses them only when it needs a new target and
+    falls back to its own choice if all suggested targets are dead
+
+    :param policy             batched policy
+    :param matches            parties fighting each other
+
+    :type policy              Policy
+    :type matches             [(Party, Party), ...] """
+    batch = Batch()
+    for party1, party2 in matches:
+        for party, enemies in ((party1, party2), (party2, party1)):
+            for creature in party.get_alive():
+                creature.suggested_targets = None
+                if not creature.is_swallowed:
+                    batch.add(creature, enemies)
+    if len(batch):
+        suggest(batch, policy.decide(batch))
+
+
+def suggest(batch, actions):
+    """ Turn actions of a policy into suggested targets """
+    rankings = {}
+    for creature, group, action in zip(batch.creatures, batch.group,
+                                       actions):
+        candidates = batch.candidates[group]
+        if isinstance(action, int):
+            if action >= 0:
+                creature.suggested_targets = [candidates[action]]
+        else:
+            """ Share converted rankings between creatures """
+            key = (id(action), group)
+            if key not in rankings:
+                rankings[key] = [candidates[j] for j in action]
+            creature.suggested_targets = rankings[key]
+
+
+class PolicyBehavior:
+
+    """ Adapter that runs a batched policy as the behavior of a single
+    creature, one decision per batch. Use PolicyBehavior.using(policy)
+    as the ´ai´ of a creature """
+
+    policy = Individual()
+
+    def __init__(self, creature):
+        self.me = creature
+
+    @classmethod
+    def using(cls, policy):
+        return type(cls.__name__, (cls,), {'policy': policy})
+
+    def do_stuff(self, allies, enemies):
+        focus = self.me.focused_enemy
+        if focus is None or focus.is_dead:
+            batch = Batch()
+            batch.add(self.me, enemies)
+            suggest(batch, self.policy.decide(batch))
+        Standard.do_stuff(self, allies, enemies)
+
+
+""" ================================================================ """
+""" ============================ SEARCH ============================ """
+""" ================================================================ """
+
+class MonteCarlo:
+
+    """ Monte Carlo tree search over targets, for bosses and other
+    creatures that should fight smarter than Standard. Once per round
+    the creature tries its living enemies as targets in rollouts: the
+    battle state is snapshotted (see snapshot.py), the creature takes
+    its turn against the target and the fight is played on headlessly
+    for HORIZON rounds with Standard choices, except that the creature
+    itself chooses its targets again from the search tree for DEPTH
+    turns in total. Each rollout is scored by the share of remaining
+    HP of the creature's party, 1 for a win and 0 for a loss, and the
+    creature attacks the target with the most rollouts (UCB1). Moves
+    follow from the target, as in Standard.
+
+    Tree nodes are kept in a transposition table keyed by the HP of
+    every creature in quarters, so statistics are shared between
+    rollouts that reach similar states and reused on the creature's
+    next turns. The battle and its dice are restored after the search.
+
+    Use MonteCarlo as the ´ai´ of a creature, or set the budget with
+    e.g. MonteCarlo.using(rollouts=200, time=0.05) """
+
+    ROLLOUTS = 64       # Rollouts per decision
+    TIME = None         # Seconds per decision, checked between rollouts
+    DEPTH = 2           # Turns of the creature chosen from the tree
+    HORIZON = 3         # Rounds played after the creature's turn
+    EXPLORATION = 1.0   # UCB1 exploration constant
+    MAX_NODES = 10000   # Table is cleared when it grows beyond this
+
+    """ Behavior running rollouts, or None """
+    searching = None
+
+    def __init__(self, creature):
+        self.me = creature
+        self.table = {}         # State key -> {target: [visits, value]}
+        self.path = []          # Nodes and targets chosen in a rollout
+        self.round = None       # Round of the last decision
+
+    @classmethod
+    def using(cls, rollouts=None, time=None, depth=None, horizon=None):
+        """ Return MonteCarlo with another budget """
+        budget = {'ROLLOUTS': rollouts, 'TIME': time, 'DEPTH': depth,
+                  'HORIZON': horizon}
+        return type(cls.__name__, (cls,),
+                    {k: v for k, v in budget.items() if v is not None})
+
+    def do_stuff(self, allies, enemies):
+        me = self.me
+        searching = MonteCarlo.searching
+        if scheduler.Wheel.round != self.round and not me.is_swallowed \
+                and (searching is None or searching is self):
+            self.round = scheduler.Wheel.round
+            if searching is None:
+                self.decide(allies, enemies)
+            elif len(self.path) < self.DEPTH:
+                self.select(enemies)
+        Standard.do_stuff(self, allies, enemies)
+
+    def get_key(self, order):
+        """ Return the transposition key of the battle state """
+        return tuple(-1 if c.is_dead
+                     else min(4 * max(c.hp, 0) // max(c.max_hp, 1), 3)
+                     for c in order)
+
+    def select(self, enemies):
+        """ Choose a target from the tree during a rollout: untried
+        targets first, then by UCB1 """
+        order = scheduler.Wheel.encounter.order_of_action
+        targets = [c.slot for c in enemies.get_alive()]
+        if not targets:
+            return
+        node = self.table.setdefault(self.get_key(order), {})
+        for target in targets:
+            if node.setdefault(target, [0, 0.0])[0] == 0:
+                break
+        else:
+            total = math.log(sum(node[t][0] for t in targets))
+            target = max(targets, key=lambda t: node[t][1] / node[t][0]
+                         + self.EXPLORATION * math.sqrt(total / node[t][0]))
+        self.path.append(node[target])
+        self.me.focused_enemy = order[target]
+
+    def evaluate(self, allies, enemies):
+        """ Return the value of a rollout for the creature's party """
+        if not enemies.is_alive:
+            return 1.0
+        if not allies.is_alive:
+            return 0.0
+        ours = sum(max(c.hp, 0) / max(c.max_hp, 1) for c in allies.get_alive())
+        theirs = sum(max(c.hp, 0) / max(c.max_hp, 1)
+                     for c in enemies.get_alive())
+        return ours / (ours + theirs) if ours + theirs else 0.5
+
+    def rollout(self, encounter, state, seed, allies, enemies):
+        """ Play one rollout from the snapshot and back up its value """
+        import snapshot
+        me = self.me
+        snapshot.branch(encounter, state, seed)
+        dice.STREAM = random if me.stream is None else me.stream
+        self.path = []
+        self.select(enemies)
+
+        """ Rest of the creature's turn, then the following rounds """
+        me.make_attacks(allies, enemies)
+        me.close_turn(allies, enemies)
+        encounter.turn = me.slot + 1
+        for _ in range(self.HORIZON):
+            if not encounter.play_round():
+                break
+
+        value = self.evaluate(allies, enemies)
+        for stats in self.path:
+            stats[0] += 1
+            stats[1] += value
+
+    def decide(self, allies, enemies):
+        """ Search for the best target within the budget and focus on
+        it. Other targets are suggested in order of their rollouts in
+        case the target dies during the turn """
+        encounter = scheduler.Wheel.encounter
+        if encounter is None or sum(1 for _ in enemies.get_alive()) < 2:
+            return
+        if len(self.table) > self.MAX_NODES:
+            self.table = {}
+
+        """ Imported here, since snapshot pulls in the process pool,
+        which every import of main and definitions would pay for """
+        import snapshot
+        me = self.me
+        state = snapshot.take(encounter)
+        key = self.get_key(encounter.order_of_action)
+        seeds = random.Random(random.getrandbits(63))
+        saved = (dice.STREAM, messages.VERBOSE_LEVEL, messages.IO.turn,
+                 recorder.ACTIVE, encounter.telemetry)
+        messages.VERBOSE_LEVEL = 0
+        recorder.ACTIVE = None
+        encounter.telemetry = None
+        MonteCarlo.searching = self
+
+        deadline = None if self.TIME is None \
+            else time.perf_counter() + self.TIME
+        try:
+            for _ in range(self.ROLLOUTS):
+                if deadline is not None and time.perf_counter() > deadline:
+                    break
+                self.rollout(encounter, state, seeds.getrandbits(63),
+                             allies, enemies)
+                self.round = state.wheel[0]
+        finally:
+            MonteCarlo.searching = None
+            self.path = []
+            snapshot.restore(encounter, state)
+            stream, messages.VERBOSE_LEVEL, messages.IO.turn, \
+                recorder.ACTIVE, encounter.telemetry = saved
+            dice.STREAM = random if stream is random else me.stream
+
+        node = self.table.get(key)
+        if not node:
+            return
+        order = encounter.order_of_action
+        ranking = sorted(node, key=lambda t: -node[t][0])
+        me.focused_enemy = order[ranking[0]]
+        me.suggested_targets = [order[t] for t in ranking]
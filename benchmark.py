@@ -0,0 +1,117 @@
+import sys
+import subprocess
+import time
+import random
+import behavior
+import main
+from main import npc, pc
+from results import STATS
+
+""" Canonical timing scenarios. Run ``python benchmark.py`` and compare
+against the targets below after touching the battle loop. Scenarios
+ending in ´-batch´ let behavior.StandardPolicy choose targets of all
+creatures once per round, in lockstep over several matches; compare
+their creature turns per second with the sequential scenario.
+
+Targets (single process, CPython 3):
+    horde       10,000 kobolds vs. Ogno, horde=True:  >= 1 match/s
+
+Import times of the modules in IMPORT_BUDGETS are measured each in its
+own fresh interpreter and compared against their budgets; every CLI
+call and service worker pays for them.
+
+Matches in DECISIVE always have a winner; a draw means that stalemate
+detection overlooked a way to kill (see BaseCreature.can_kill()). """
+
+SCENARIOS = {
+    'duel': dict(team_a=[npc.troll], team_b=[pc.ogno], matches=200),
+    'skirmish': dict(team_a=[npc.zombie]*30, team_b=[npc.purple_worm],
+                     matches=20),
+    'multiattack': dict(team_a=[npc.owlbear]*20 + [npc.orog]*20,
+                        team_b=[npc.brown_bear]*40, matches=10),
+    'melee': dict(team_a=[npc.goblin]*150, team_b=[npc.skeleton]*150,
+                  matches=4),
+    'melee-batch': dict(team_a=[npc.goblin]*150, team_b=[npc.skeleton]*150,
+                        matches=4, policy=behavior.StandardPolicy(),
+                        parallel=4),
+    'horde': dict(team_a=[npc.kobold]*10000, team_b=[pc.ogno], matches=3,
+                  horde=True),
+}
+
+""" Matches that must not end in a draw. Trolls only die to fire or
+acid, and the tarrasque's only acid is its stomach """
+DECISIVE = {
+    'tarrasque': dict(team_a=[npc.tarrasque], team_b=[npc.troll]*6,
+                      matches=10),
+    'tarrasque-duel': dict(team_a=[npc.tarrasque], team_b=[npc.troll],
+                           matches=10),
+}
+
+""" Cumulative import-time budgets in milliseconds of each module
+imported alone """
+IMPORT_BUDGETS = {'main': 30, 'definitions': 30}
+
+
+def measure_imports(module='main'):
+    """ Return cumulative import times in milliseconds of the modules
+    imported by a module, measured in a fresh interpreter
+
+    :type module            str
+    :rtype                  {str: float} """
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             'import ' + module],
+                            capture_output=True, text=True).stderr
+    times = {}
+    for line in output.splitlines():
+        fields = line.split('|')
+        if line.startswith('import time:') and fields[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[1]) / 1000
+    return times
+
+
+def count_draws(name, seed=0):
+    """ Return the number of drawn matches of a scenario in DECISIVE
+
+    :type name              str
+    :type seed              int
+    :rtype                  int """
+    random.seed(seed)
+    result = main.simulate(quiet=True, **DECISIVE[name])
+    return sum(result.draws.values())
+
+
+def run(name, seed=0):
+    """ Time a scenario and return matches and creature turns per
+    second
+
+    :param name             scenario name
+    :param seed             random seed
+
+    :type name              str
+    :type seed              int
+    :rtype                  (float, float) """
+    random.seed(seed)
+    kwargs = dict(SCENARIOS[name])
+    start = time.time()
+    result = main.simulate(quiet=True, **kwargs)
+    elapsed = time.time() - start
+    turns = sum(result.sums[row * len(STATS) + STATS.index('turns_alive')]
+                for row in range(len(result.types)))
+    return kwargs['matches'] / elapsed, turns / elapsed
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(SCENARIOS)
+    if not sys.argv[1:]:
+        for module, budget in IMPORT_BUDGETS.items():
+            elapsed = measure_imports(module).get(module, 0.0)
+            print('%-12s %8.1f ms import %7s (budget %i ms)'
+                  % (module, elapsed,
+                     'OK' if elapsed <= budget else 'OVER', budget))
+        for name in DECISIVE:
+            draws = count_draws(name)
+            print('%-12s %8i draws  %s' % (name, draws,
+                                           'OK' if not draws else 'FAIL'))
+    results = [(name, run(name)) for name in names]
+    for name, (rate, turns) in results:
+        print('%-12s %8.2f matches/s %10.0f turns/s' % (name, rate, turns))
@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import copy
+import messages
+import pickle
+import random
+import world
+from collections import namedtuple
+from main import Encounter, setup_party
+from results import STATS, CampaignResult
+
+""" Adventuring days: chains of encounters fought by the same party.
+
+Usage:
+
+    day = [Stage([npc.goblin] * 6),
+           Stage([npc.orc] * 3, rest=10),           # Short rest first
+           Stage([npc.troll], position=(0, -8, 0))]
+    result = campaign.simulate(1000, party=[pc.ogno], stages=day,
+                               workers=4)
+    result.survival(2)                  # Party alive after the troll
+
+The party is copied once per chain and fights the encounters in
+order. HP, lost max HP, dead members, ammo, abilities waiting for a
+recharge (they keep rolling to recharge in the next encounter), ability
+damage and curses that prevent healing carry over from one encounter
+to the next; conditions such as poison, fear or grappling, temporary
+immunities and the statistics of the members end with the encounter.
+Each encounter has its own, fresh monsters. A chain ends when the
+whole party is dead.
+
+Results are kept per encounter of the chain, see results.CampaignResult. """
+
+
+""" Encounter of a chain: monsters, where they are set in formation,
+the width of their rows (None sets them in a line, otherwise they are
+set up in horde mode, see main.setup_party()) and HP healed by every
+living party member in a short rest before the encounter """
+Stage = namedtuple('Stage', ['monsters', 'position', 'width', 'rest'])
+Stage.__new__.__defaults__ = ((0, -3, 0), None, 0)
+
+""" Where the party is set in formation """
+PARTY_POSITION = (0, 3, 0)
+
+""" Conditions that end with an encounter, reset from the member's
+stat block """
+CONDITIONS = ('grappled', 'poisoned', 'paralyzed', 'restrained',
+              'frightened', 'swallowed', 'advantage')
+
+
+def recover(creature, template):
+    """ End an encounter for a party member: clear conditions and
+    combat statistics but keep HP and other damage
+
+    :param template           the member's stat block
+    :type creature            BaseCreature
+    :type template            BaseCreature """
+    for name in CONDITIONS:
+        setattr(creature, name, dict(getattr(template, name)))
+    creature.prone = False
+    creature.immunities = list(template.immunities)
+    creature.speed = creature.max_speed.copy()
+    creature.ac_bonus = template.ac_bonus
+    creature.to_hit_bonus = template.to_hit_bonus
+    creature.timers = set()
+    creature.focused_enemy = None
+    creature.suggested_targets = None
+    creature.turn_plan = None
+    creature.distance = 0
+    creature.first_attack = True
+    for stat in STATS:
+        setattr(creature, stat, 0)
+
+
+def play_chain(party, stages, result, seed=None):
+    """ Fight one chain of encounters and add it to the results
+
+    :param party              stat blocks of the party members
+    :type party               [BaseCreature, ...]
+    :type stages              [Stage, ...]
+    :type result              results.CampaignResult
+    :type seed                int """
+    if seed is not None:
+        random.seed(seed)
+
+    members = [copy.deepcopy(c) for c in party]
+    templates = dict(zip(map(id, members), party))
+    for step, stage in enumerate(stages):
+        if step == 0:
+            team = setup_party(world.TEAM_A, members, PARTY_POSITION,
+                               copies=False)
+        else:
+            living = [c for c in members if not c.is_dead]
+            if not living:
+                break
+            for creature in living:
+                recover(creature, templates[id(creature)])
+                if stage.rest:
+                    creature.heal(stage.rest, 'short rest')
+            team = setup_party(world.TEAM_A, living, PARTY_POSITION,
+                               copies=False, rename=False)
+
+        monsters = setup_party(world.TEAM_B, stage.monsters, stage.position,
+                               horde=stage.width is not None,
+                               width=stage.width)
+        encounter = Encounter(team, monsters)
+        result.add(step, encounter, encounter.fight(), members)
+
+
+def play_chains(party, stages, seeds):
+    """ Fight chains of encounters, one per seed
+
+    :rtype                    results.CampaignResult """
+    result = CampaignResult(len(stages), world.TEAM_A)
+    for seed in seeds:
+        play_chain(party, stages, result, seed)
+    return result
+
+
+def play_chunk(data, seeds):
+    """ Worker process: unpickle the party and the stages and fight
+    chains of them. Damage types are interned anew in the worker, so
+    the damage modifiers of the creatures are compiled again """
+    messages.VERBOSE_LEVEL = 0
+    party, stages = pickle.loads(data)
+    for creature in party + [c for s in stages for c in s.monsters]:
+        creature.compile_damage()
+    return play_chains(party, stages, seeds)
+
+
+def simulate(chains=1000, party=[], stages=[], seed=None, workers=1,
+             quiet=False):
+    """ Fight chains of encounters with the same party and return
+    survival and remaining HP after each encounter
+
+        :param chains             number of chains
+        :param party              party members
+        :param stages             encounters of a chain in order, as
+                                  Stages or plain lists of monsters
+        :param seed               seed of the chain seeds; each chain
+                                  is seeded separately so that results
+                                  do not depend on the number of workers
+        :param workers            number of worker processes
+        :param quiet              do not print the results
+
+        :type chains              int
+        :type party               [BaseCreature, ...]
+        :type stages              [Stage or [BaseCreature, ...], ...]
+        :type seed                int
+        :type workers             int
+        :type quiet               bool
+        :rtype                    results.CampaignResult """
+    stages = [s if isinstance(s, Stage) else Stage(list(s)) for s in stages]
+    verbose = messages.VERBOSE_LEVEL
+    messages.VERBOSE_LEVEL = 0
+
+    seeds = random.Random(seed)
+    seeds = [seeds.getrandbits(63) for _ in range(chains)]
+    try:
+        if workers <= 1:
+            result = play_chains(party, stages, seeds)
+        else:
+            data = pickle.dumps((list(party), stages))
+            size = -(-chains // workers)
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunks = list(pool.map(play_chunk, [data] * workers,
+                                       [seeds[i:i + size]
+                                        for i in range(0, chains, size)]))
+            result = chunks[0]
+            for chunk in chunks[1:]:
+                result.merge(chunk)
+    finally:
+        messages.VERBOSE_LEVEL = verbose
+
+    if not quiet:
+        result.report()
+    return result
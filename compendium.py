@@ -0,0 +1,470 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import csv
+import functools
+import inspect
+import json
+import marshal
+import os
+import re
+import abilities
+import behavior
+import damagetypes
+import dice
+import weapons
+from registry import CreatureSpec
+
+""" Monster compendium loaded from JSON or CSV files.
+
+Usage:
+
+    monsters = load('bestiary/srd_sample.json')
+    simulate(team_a=[monsters.hill_giant], team_b=[monsters.gnoll]*4)
+    registry.get_specs(monsters)            # metadata, nothing is built
+
+Entries are validated and compiled into plain data: dice expressions
+are parsed, damage types are collected into a table and referenced by
+index, and ability and weapon classes are checked by name. The
+compiled form is cached next to the source in a marshal file keyed by
+the source's modification time and size, so warm loads skip parsing
+and validation. Creatures are returned as registry.CreatureSpecs and
+built on first use, like the creatures in definitions.
+
+JSON files hold a list of creatures, or an object with a list of
+´creatures´ and a table of shared ´weapons´. Creature fields are the
+arguments of BaseCreature; ´size´ is a size name such as ´large´, ´ai´
+a class name in behavior (default ´Standard´) and ´key´ the attribute
+name (default: the name in lower case with underscores). Weapons are
+objects with the arguments of Weapon and an optional ´class´
+(´Weapon´ or ´MultiWeapon´), or names of shared weapons. Abilities are
+objects with an ´ability´ class name from abilities and its
+arguments, e.g.
+
+    {"ability": "Knockdown", "name": "pounce", "dc": 12, "save": "str",
+     "charge_distance": 20, "bonus_action": {"name": "bite", ...}}
+
+CSV files have one creature per row. Scores are in columns ´str´ to
+´cha´, resistances, immunities and vulnerabilities are separated by
+semicolons, and attacks, passives, actions, saves and stomach are JSON
+objects. Empty cells are left out. """
+
+""" Version of the compiled form; bump when it changes """
+CACHE_VERSION = 1
+
+SIZES = {'tiny': 1, 'small': 2, 'medium': 3, 'large': 4, 'huge': 5,
+         'gargantuan': 6, 'colossal': 7}
+
+SCORES = ('str', 'dex', 'con', 'int', 'wis', 'cha')
+
+""" Creature fields kept as spec metadata and fields built on use """
+REQUIRED = ('name', 'cr', 'ac', 'hp', 'speed', 'size', 'category', 'scores')
+OPTIONAL = ('key', 'ai', 'attacks', 'dies_at', 'speed_fly', 'saves',
+            'resistances', 'immunities', 'vulnerabilities')
+BUILT = ('melee_attacks', 'ranged_attacks', 'passives', 'actions', 'stomach')
+
+""" CSV columns by type """
+INTEGERS = ('ac', 'hp', 'speed', 'attacks', 'dies_at', 'speed_fly') + SCORES
+LISTS = ('resistances', 'immunities', 'vulnerabilities')
+OBJECTS = ('saves',) + BUILT
+
+WEAPONS = {'Weapon': weapons.Weapon, 'MultiWeapon': weapons.MultiWeapon}
+
+""" Ability classes by name; classes without a constructor, such as
+PackTactics, are used as they are """
+ABILITIES = {name: value for name, value in vars(abilities).items()
+             if isinstance(value, type) and hasattr(value, 'use')}
+
+DICE = re.compile(r'^\d+d\d+(\+\d+)?$')
+
+
+def get_parameters(cls):
+    """ Return names of the constructor arguments of a class and its
+    base classes, and the names of those without defaults
+
+    :rtype                    (set, [str, ...]) """
+    names = set()
+    required = []
+    for base in cls.__mro__:
+        if base is not object and '__init__' in vars(base):
+            for name, parameter in inspect.signature(
+                    base.__init__).parameters.items():
+                if name == 'self' or name in names or parameter.kind in (
+                        parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+                    continue
+                names.add(name)
+                if parameter.default is parameter.empty:
+                    required.append(name)
+    return names, required
+
+
+def parse_cr(value, where):
+    """ Return challenge rating of a number or a fraction such as ´1/4´ """
+    try:
+        if isinstance(value, str) and '/' in value:
+            numerator, denominator = value.split('/')
+            return int(numerator) / int(denominator)
+        return float(value) if isinstance(value, str) else value
+    except ValueError:
+        raise ValueError("%s: invalid cr %r" % (where, value))
+
+
+class Compiler:
+
+    """ Validates compendium entries into the compiled form
+
+    :param source             file name used in error messages
+
+    :type source              str """
+
+    def __init__(self, source):
+        self.source = source
+        self.types = []         # Damage type names, referenced by index
+        self.type_index = {}
+        self.dice = {}          # Dice expression -> [times, sides, bonus]
+        self.weapons = {}       # Shared weapons by name
+        self.shared = {}        # Raw shared weapons to compile
+
+    def error(self, where, message):
+        return ValueError("%s: %s: %s" % (self.source, where, message))
+
+    def check_keys(self, data, where, allowed, required=()):
+        if not isinstance(data, dict):
+            raise self.error(where, "expected an object, got %r" % (data,))
+        unknown = set(data) - set(allowed) - set(required)
+        if unknown:
+            raise self.error(where, "unknown fields %s"
+                             % ', '.join(sorted(unknown)))
+        missing = [k for k in required if k not in data]
+        if missing:
+            raise self.error(where, "missing fields %s" % ', '.join(missing))
+
+    def compile_damage(self, expressions, where):
+        """ Return list of dice expressions, parsed into the dice table """
+        if isinstance(expressions, str):
+            expressions = [expressions]
+        for expression in expressions:
+            if not isinstance(expression, str) or not DICE.match(expression):
+                raise self.error(where, "invalid dice %r" % (expression,))
+            if expression not in self.dice:
+                self.dice[expression] = dice.parse_damage(expression)[0]
+        return list(expressions)
+
+    def compile_types(self, names, where):
+        """ Return damage types as indices of the type table """
+        if isinstance(names, str):
+            names = [names]
+        indices = []
+        for name in names:
+            if not isinstance(name, str):
+                raise self.error(where, "invalid damage type %r" % (name,))
+            if name not in self.type_index:
+                self.type_index[name] = len(self.types)
+                self.types.append(name)
+            indices.append(self.type_index[name])
+        return indices
+
+    def compile_weapon(self, data, where):
+        if isinstance(data, str):
+            if data not in self.shared:
+                raise self.error(where, "unknown weapon %r" % data)
+            if data not in self.weapons:
+                self.weapons[data] = None   # Guard against cycles
+                self.weapons[data] = self.compile_weapon(
+                    self.shared[data], 'weapons.' + data)
+            elif self.weapons[data] is None:
+                raise self.error(where, "weapon %r refers to itself" % data)
+            return {'ref': data}
+
+        if not isinstance(data, dict):
+            raise self.error(where, "expected a weapon, got %r" % (data,))
+        cls = WEAPONS.get(data.get('class', 'Weapon'))
+        if cls is None:
+            raise self.error(where, "unknown weapon class %r" % data['class'])
+        names, required = get_parameters(cls)
+        self.check_keys(data, where, names | {'class'}, required)
+        where = "%s.%s" % (where, data['name'])
+
+        args = {k: v for k, v in data.items() if k != 'class'}
+        args['damage'] = self.compile_damage(data['damage'], where)
+        args['damage_type'] = self.compile_types(data['damage_type'], where)
+        if len(args['damage']) != len(args['damage_type']):
+            raise self.error(where, "damage and damage_type differ in length")
+        args['special'] = [self.compile_ability(a, where + '.special')
+                           for a in data.get('special', [])]
+        return {'class': data.get('class', 'Weapon'), 'args': args}
+
+    def compile_ability(self, data, where):
+        if not isinstance(data, dict) or data.get('ability') not in ABILITIES:
+            raise self.error(where, "unknown ability %r" % (
+                data.get('ability') if isinstance(data, dict) else data,))
+        cls = ABILITIES[data['ability']]
+        if cls.__init__ is object.__init__:
+            self.check_keys(data, where, {'ability'})
+            return {'ability': data['ability'], 'args': {}}
+
+        """ ´type´ is accepted for the ´type_´ argument of Ability """
+        data = dict(data)
+        if 'type' in data:
+            data['type_'] = data.pop('type')
+        names, required = get_parameters(cls)
+        self.check_keys(data, where, names | {'ability'}, required)
+        where = "%s.%s" % (where, data['name'])
+
+        args = {k: v for k, v in data.items() if k != 'ability'}
+        if 'damage' in args and args['damage'] is not None:
+            args['damage'] = self.compile_damage(args['damage'], where)
+        if 'damage_type' in args:
+            args['damage_type'] = self.compile_types(args['damage_type'],
+                                                     where)
+        if args.get('bonus_action') is not None:
+            args['bonus_action'] = self.compile_weapon(
+                args['bonus_action'], where + '.bonus_action')
+        return {'ability': data['ability'], 'args': args}
+
+    def compile_stomach(self, data, where):
+        self.check_keys(data, where, (),
+                        get_parameters(abilities.Stomach)[1])
+        args = dict(data)
+        args['damage'] = self.compile_damage(data['damage'], where)
+        args['damage_type'] = self.compile_types(data['damage_type'], where)
+        return args
+
+    def compile_attacks(self, data, where):
+        if not isinstance(data, dict) or set(data) - {'basic', 'special'}:
+            raise self.error(where, "expected an object with ´basic´ "
+                                    "and ´special´ weapon lists")
+        return {key: [self.compile_weapon(w, "%s.%s" % (where, key))
+                      for w in weapons_]
+                for key, weapons_ in data.items()}
+
+    def compile_creature(self, data, index):
+        where = "creature %i" % index
+        self.check_keys(data, where, OPTIONAL + BUILT, REQUIRED)
+        where = data['name']
+
+        stats = {k: v for k, v in data.items()
+                 if k in REQUIRED or k in OPTIONAL}
+        stats['cr'] = parse_cr(data['cr'], where)
+        if isinstance(data['size'], str):
+            if data['size'] not in SIZES:
+                raise self.error(where, "unknown size %r" % data['size'])
+            stats['size'] = SIZES[data['size']]
+        if not isinstance(data['scores'], dict) \
+                or sorted(data['scores']) != sorted(SCORES) \
+                or not all(isinstance(v, int) for v in data['scores'].values()):
+            raise self.error(where, "scores need integer %s"
+                             % ', '.join(SCORES))
+        ai = data.get('ai', 'Standard')
+        if not isinstance(getattr(behavior, ai, None), type):
+            raise self.error(where, "unknown ai %r" % ai)
+        stats['ai'] = ai
+        key = stats.pop('key', None) \
+            or data['name'].lower().replace(' ', '_').replace('-', '_')
+        if not key.isidentifier():
+            raise self.error(where, "invalid key %r" % key)
+
+        build = {}
+        for field in ('melee_attacks', 'ranged_attacks'):
+            if field in data:
+                build[field] = self.compile_attacks(data[field],
+                                                    "%s.%s" % (where, field))
+        for field in ('passives', 'actions'):
+            if field in data:
+                build[field] = [self.compile_ability(a, "%s.%s" % (where,
+                                                                   field))
+                                for a in data[field]]
+        if 'stomach' in data:
+            build['stomach'] = self.compile_stomach(data['stomach'],
+                                                    where + '.stomach')
+        if not build.get('melee_attacks') and not build.get('ranged_attacks'):
+            raise self.error(where, "no melee or ranged attacks")
+        return {'key': key, 'stats': stats, 'build': build}
+
+    def compile(self, creatures, shared=None):
+        """ Return the compiled form of a list of creature entries and
+        a table of shared weapons """
+        self.shared = shared or {}
+        entries = []
+        keys = set()
+        for i, data in enumerate(creatures):
+            entry = self.compile_creature(data, i)
+            if entry['key'] in keys:
+                raise self.error(entry['stats']['name'],
+                                 "duplicate key %r" % entry['key'])
+            keys.add(entry['key'])
+            entries.append(entry)
+        return {'version': CACHE_VERSION, 'types': self.types,
+                'dice': self.dice, 'weapons': self.weapons,
+                'entries': entries}
+
+
+def read_json(path):
+    """ Return creature entries and shared weapons of a JSON file """
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return data, {}
+    return data.get('creatures', []), data.get('weapons', {})
+
+
+def read_csv(path):
+    """ Return creature entries of a CSV file """
+    creatures = []
+    with open(path, newline='') as f:
+        for line, row in enumerate(csv.DictReader(f), 2):
+            entry = {}
+            for column, value in row.items():
+                value = (value or '').strip()
+                if not value or column is None:
+                    continue
+                try:
+                    if column in INTEGERS:
+                        value = int(value)
+                    elif column in LISTS:
+                        value = [v.strip() for v in value.split(';')
+                                 if v.strip()]
+                    elif column in OBJECTS:
+                        value = json.loads(value)
+                except ValueError:
+                    raise ValueError("%s: line %i: invalid %s %r"
+                                     % (path, line, column, value))
+                if column in SCORES:
+                    entry.setdefault('scores', {})[column] = value
+                else:
+                    entry[column] = value
+            creatures.append(entry)
+    return creatures, {}
+
+
+def compile_file(path):
+    """ Return the compiled form of a compendium file """
+    if path.lower().endswith('.csv'):
+        creatures, shared = read_csv(path)
+    else:
+        creatures, shared = read_json(path)
+    return Compiler(path).compile(creatures, shared)
+
+
+def get_source_key(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_cache(path, cache):
+    """ Return the cached compiled form of a file, or None if there is
+    no cache or it is out of date. Parsed dice that do not match
+    dice.parse_damage(), e.g. in a cache edited by hand, also make the
+    cache out of date """
+    try:
+        with open(cache, 'rb') as f:
+            compiled = marshal.loads(f.read())
+        source = get_source_key(path)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(compiled, dict) \
+            or compiled.get('version') != CACHE_VERSION \
+            or compiled.get('source') != source:
+        return None
+    try:
+        for expression, parsed in compiled['dice'].items():
+            if dice.parse_damage(expression)[0] != parsed:
+                return None
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+    return compiled
+
+
+def write_cache(path, cache, compiled):
+    """ Write the compiled form of a file, keyed by the file's
+    modification time and size. Unwritable caches are skipped """
+    compiled = dict(compiled, source=get_source_key(path))
+    try:
+        with open(cache + '.tmp', 'wb') as f:
+            f.write(marshal.dumps(compiled))
+        os.replace(cache + '.tmp', cache)
+    except OSError:
+        pass
+
+
+def build_weapon(compiled, context):
+    """ Return a weapon of the compiled form. Shared weapons are built
+    once per creature """
+    types, shared, built = context
+    if 'ref' in compiled:
+        name = compiled['ref']
+        if name not in built:
+            built[name] = build_weapon(shared[name], context)
+        return built[name]
+    args = dict(compiled['args'])
+    args['damage_type'] = [types[i] for i in args['damage_type']]
+    args['special'] = [build_ability(a, context) for a in args['special']]
+    return WEAPONS[compiled['class']](**args)
+
+
+def build_ability(compiled, context):
+    """ Return an ability of the compiled form """
+    types = context[0]
+    cls = ABILITIES[compiled['ability']]
+    if cls.__init__ is object.__init__:
+        return cls
+    args = dict(compiled['args'])
+    if 'damage_type' in args:
+        args['damage_type'] = [types[i] for i in args['damage_type']]
+    if args.get('bonus_action') is not None:
+        args['bonus_action'] = build_weapon(args['bonus_action'], context)
+    return cls(**args)
+
+
+def build_creature(compiled, types, shared):
+    """ Return the built BaseCreature arguments of a compiled entry """
+    context = (types, shared, {})
+    arguments = {}
+    for field, value in compiled.items():
+        if field in ('melee_attacks', 'ranged_attacks'):
+            arguments[field] = {k: [build_weapon(w, context) for w in v]
+                                for k, v in value.items()}
+        elif field == 'stomach':
+            stomach = dict(value)
+            stomach['damage_type'] = [types[i]
+                                      for i in stomach['damage_type']]
+            arguments[field] = abilities.Stomach(**stomach)
+        else:
+            arguments[field] = [build_ability(a, context) for a in value]
+    return arguments
+
+
+def get_namespace(compiled, name='Compendium'):
+    """ Return a class with the CreatureSpecs of a compiled compendium
+    as attributes, like definitions.Creatures """
+    types = [damagetypes.get(t) for t in compiled['types']]
+    specs = {}
+    for entry in compiled['entries']:
+        stats = dict(entry['stats'])
+        stats['ai'] = getattr(behavior, stats['ai'])
+        specs[entry['key']] = CreatureSpec(
+            build=functools.partial(build_creature, entry['build'], types,
+                                    compiled['weapons']),
+            **stats)
+    return type(name, (), specs)
+
+
+def load(path, cache=True):
+    """ Return the creatures of a compendium file as a class of
+    registry.CreatureSpecs
+
+    :param path               JSON or CSV file
+    :param cache              cache file, True for ´<path>.cache´ or
+                              False to always compile the source
+
+    :type path                str
+    :type cache               bool or str
+    :rtype                    type """
+    if cache is True:
+        cache = path + '.cache'
+    compiled = read_cache(path, cache) if cache else None
+    if compiled is None:
+        compiled = compile_file(path)
+        if cache:
+            write_cache(path, cache, compiled)
+    return get_namespace(compiled)
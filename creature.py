@@ -3,20 +3,39 @@
 
 import operator
 import time
-from typing import Dict
 
+import damagetypes
 import dice
 import math
 import random
 import world
 import messages
+import recorder
+import scheduler
+from abilities import Trigger
 from mechanics import DnDRuleset as R
+from weapons import WeaponTable
+
+""" Triggers checked on every turn, move or hit; enum member lookups
+are slow on hot paths """
+INITIAL = Trigger.INITIAL
+ON_START = Trigger.ON_START
+AT_END = Trigger.AT_END
+ON_MOVE = Trigger.ON_MOVE
+AVOID_DEATH = Trigger.AVOID_DEATH
+ON_DEATH = Trigger.ON_DEATH
 
 """ asahala 2020  
 https://github.com/asahala/DnD5e-CombatSimulator/ """
 
 TOTALTIME = 0
 
+def shallow_copy(obj):
+    """ Cheaper copy.copy() for plain instances """
+    new = obj.__class__.__new__(obj.__class__)
+    new.__dict__.update(obj.__dict__)
+    return new
+
 class BaseCreature(object):
 
     """
@@ -93,6 +112,7 @@ class BaseCreature(object):
         self.to_hit_bonus = 0
         self.initiative = 0
         self.focused_enemy = None  # Focused enemy (object)
+        self.suggested_targets = None  # Targets from a batched policy
         self.party = None  # Belongs to this party
 
         """ Combat statistics """
@@ -115,6 +135,19 @@ class BaseCreature(object):
         self.prone = False
         self.prevent_heal = False
 
+        """ Scheduled condition checks as (phase, name), see TIMERS, and
+        the initiative slot they are keyed by """
+        self.timers = set()
+        self.slot = 0
+
+        """ Own random stream of the creature's turns in paired
+        comparisons, see dice.STREAM """
+        self.stream = None
+
+        """ Tilted d20 of attack rolls in rare-event estimates, see
+        dice.Tilt """
+        self.tilt = None
+
         """ Set advantage or disadvantage to hit, ability checks or 
         saves tied to certain ability scores """
         self.advantage = dict(hit=0, ability=0, str=0, dex=0,
@@ -135,11 +168,18 @@ class BaseCreature(object):
 
         """ Turn specific flags and saving roll states """
         self.first_attack = True
+        self.weapon_choice = None  # Weapon table and key of the last choice
+        self.turn_plan = None      # Situation of the last attack this turn
         self.save_success = False
 
         """ Container for swallowed creatures """
         self.stomach = stomach
 
+        """ Precompiled weapon selection tables and passive dispatch """
+        self.compile_weapons()
+        self.compile_passives()
+        self.compile_damage()
+
     def __repr__(self):
         CR = {0.125: "1/8", 0.25: "1/4", 0.5: "1/2"}
         indentation = " " * (20 - len(self.name))
@@ -154,6 +194,46 @@ class BaseCreature(object):
                   CR.get(self.cr, str(self.cr)),
                   self.speed['ground'])
 
+    def clone(self):
+        """ Return a fresh copy of the creature for a new battle. Faster
+        than copy.deepcopy(): only state that changes during battle is
+        copied and definitions are shared """
+        new = shallow_copy(self)
+        new.speed = self.speed.copy()
+        new.scores = self.scores.copy()
+        new.saves = self.saves.copy()
+        new.immunities = list(self.immunities)
+        new.advantage = self.advantage.copy()
+        new.grappled = self.grappled.copy()
+        new.poisoned = self.poisoned.copy()
+        new.paralyzed = self.paralyzed.copy()
+        new.restrained = self.restrained.copy()
+        new.frightened = self.frightened.copy()
+        new.swallowed = self.swallowed.copy()
+        new.timers = set()
+
+        """ Weapons keep ammo and uses, abilities keep availability """
+        weapons = {}
+
+        def clone_weapon(weapon):
+            if id(weapon) not in weapons:
+                w = shallow_copy(weapon)
+                w.special = [shallow_copy(a) for a in weapon.special]
+                weapons[id(weapon)] = w
+            return weapons[id(weapon)]
+
+        new.melee_attacks = {k: [clone_weapon(w) for w in v]
+                             for k, v in self.melee_attacks.items()}
+        new.ranged_attacks = {k: [clone_weapon(w) for w in v]
+                              for k, v in self.ranged_attacks.items()}
+        new.actions = [shallow_copy(a) for a in self.actions]
+        if self.stomach is not None:
+            new.stomach = shallow_copy(self.stomach)
+            new.stomach.contents = []
+        new.ai = self.ai.__class__(new)
+        new.weapon_sets = new.get_weapon_sets()
+        return new
+
     def __gt__(self, other):
         """ Compare creature strength """
         if self.speed['ground'] == other.speed['ground'] * 2 \
@@ -246,6 +326,8 @@ class BaseCreature(object):
             world.Map.remove(self)
             self.position = source.position
             source.stomach.contents.append(self)
+            source.schedule('digest')
+            self.schedule('swallowed')
             messages.IO.printmsg("-> %s is swallowed by %s. " % (self.name, source.name), 2, True, False)
             self.speed['fly'] = 0
             self.speed['ground'] = 0
@@ -259,6 +341,7 @@ class BaseCreature(object):
         if 'grapple' not in self.immunities:
             if state:
                 messages.IO.printmsg("-> %s is grappled. " % self.name, 2, True, False)
+                self.schedule('grapple')
                 self.set_advantage('hit', -1)
                 self.set_advantage('dex', -1)
                 self.speed['fly'] = 0
@@ -274,6 +357,7 @@ class BaseCreature(object):
         if 'restrain' not in self.immunities:
             if state:
                 messages.IO.printmsg("-> %s is restrained. " % self.name, 2, True, False)
+                self.schedule('restrain')
                 self.set_advantage('hit', -1)
                 self.set_advantage('dex', -1)
                 self.speed['ground'] = 0
@@ -298,6 +382,7 @@ class BaseCreature(object):
                 self.set_advantage('wis', -1)
                 self.set_advantage('cha', -1)
                 messages.IO.printmsg("-> %s is frightened. " % self.name, 2, True, False)
+                self.schedule('fear')
             else:
                 messages.IO.printmsg("%s is no longer frightened. " % self.name, 2, True, True)
                 self.set_advantage('hit', 0)
@@ -317,6 +402,8 @@ class BaseCreature(object):
         if "paralysis" not in self.immunities:
             if state:
                 messages.IO.printmsg("-> %s is paralyzed. " % self.name, 2, True, False)
+                self.schedule('paralysis')
+                self.schedule('paralysis_save')
                 self.speed['ground'] = 0
                 self.speed['fly'] = 0
             else:
@@ -331,6 +418,7 @@ class BaseCreature(object):
         if 'prone' not in self.immunities:
             if state:
                 messages.IO.printmsg("-> %s falls prone. " % self.name, 2, True, False)
+                self.schedule('prone')
                 self.set_advantage('hit', -1)
             else:
                 messages.IO.printmsg("%s stands up. " % self.name, 2, True, True)
@@ -341,6 +429,7 @@ class BaseCreature(object):
         if 'poison' not in self.immunities:
             if state:
                 messages.IO.printmsg("-> %s is poisoned. " % self.name, 2, True, False)
+                self.schedule('poison')
                 self.set_advantage('hit', -1)
             else:
                 self.set_advantage('hit', 0)
@@ -381,82 +470,162 @@ class BaseCreature(object):
         self.distance = 0                    # reset traveled distance
         self.speed = self.max_speed.copy()   # reset movement speed
         self.first_attack = True             # reset first attack flag
+        self.turn_plan = None                # forget last turn's plan
+
+        """ Conditions and recharges register their checks when they
+        are applied; creatures without any have nothing to do """
+        if self.timers:
+            return self.run_timers(scheduler.BEGIN)
+        return True
+
+    def end_turn(self):
+        """ Reroll saves against paralysis and fear """
+        if self.timers:
+            self.run_timers(scheduler.END)
+
+        """ Set first attack flag in case creature can make attacks
+        of opportunity """
+        self.first_attack = True
+
+    # ==================================================================
+    # Scheduled condition checks
+    # ==================================================================
 
+    """ Checks by name as (phase, priority). Each check is a method
+    ´tick_<name>´ that returns (again, proceed): whether to check again
+    next turn and whether the turn goes on. Priorities keep the order
+    of the checks within a phase """
+    TIMERS = {'poison': (scheduler.BEGIN, 0),
+              'digest': (scheduler.BEGIN, 1),
+              'recharge': (scheduler.BEGIN, 2),
+              'prone': (scheduler.BEGIN, 3),
+              'swallowed': (scheduler.BEGIN, 4),
+              'grapple': (scheduler.BEGIN, 5),
+              'paralysis': (scheduler.BEGIN, 6),
+              'restrain': (scheduler.BEGIN, 7),
+              'paralysis_save': (scheduler.END, 0),
+              'fear': (scheduler.END, 1)}
+
+    def schedule(self, name):
+        """ Register a check for the creature's next turn """
+        phase, priority = self.TIMERS[name]
+        scheduler.Wheel.schedule(self, phase, priority, name)
+
+    def run_timers(self, phase):
+        """ Run checks due in a phase of the turn. Return False if the
+        creature used its action, e.g. to break free; the remaining
+        checks are then postponed to the next turn """
+        events = scheduler.Wheel.pop(self, phase)
+        for i, (priority, _, name) in enumerate(events):
+            again, proceed = getattr(self, 'tick_' + name)()
+            if again:
+                scheduler.Wheel.schedule(self, phase, priority, name,
+                                         next_turn=True)
+            if not proceed:
+                scheduler.Wheel.defer(self, phase, events[i + 1:])
+                return False
+        return True
+
+    def skip_timers(self, phase):
+        """ Postpone checks of a phase the creature does not get to """
+        events = scheduler.Wheel.pop(self, phase)
+        if events:
+            scheduler.Wheel.defer(self, phase, events)
+
+    def tick_poison(self):
         if self.poisoned['duration'] == 0:
             self.set_poison(state=False, dc=0, save='con', duration=-1)
 
         if self.is_poisoned:
             self.poisoned['duration'] -= 1
+            return True, True
+        return False, True
 
+    def tick_digest(self):
         """ If swallowed creatures, do damage and check conditions """
-        if self.stomach is not None:
-            if self.stomach.contents:
-                self.stomach.check_status(self)
+        if self.stomach is not None and self.stomach.contents:
+            self.stomach.check_status(self)
+            return bool(self.stomach.contents), True
+        return False, True
 
+    def tick_recharge(self):
         """ Recharge abilities """
-        if self.actions:
-            for action in self.actions:
-                action.check_and_recharge()
+        for action in self.actions:
+            action.check_and_recharge()
+        return not all(a.available for a in self.actions), True
 
+    def tick_prone(self):
         """ Stand up if prone """
         if self.is_proned:
             self.set_prone(state=False)
             self.speed['fly'] = math.floor(self.speed['fly'] / 2)
             self.speed['ground'] = math.floor(self.speed['ground'] / 2)
+        return False, True
 
+    def tick_swallowed(self):
         if self.is_swallowed:
             self.position = self.swallowed['by'].position
             self.speed['fly'] = 0
             self.speed['ground'] = 0
+            return True, True
+        return False, True
 
+    def tick_grapple(self):
         """ Free from grapple if grappler has died """
-        if self.grappled["state"]:
-            self.speed['fly'] = 0
-            self.speed['ground'] = 0
-            if self.grappled["by"].is_dead:
-                self.set_grapple(state=False, dc=0, save='str', source=None)
-            else:
-                dc = self.grappled["dc"]
-                ability = self.grappled["save"]
-                if R.roll_save(self, ability, dc):
-                    self.set_grapple(state=False, dc=0, save=None)
-                    return False
-
+        if not self.grappled["state"]:
+            return False, True
+        self.speed['fly'] = 0
+        self.speed['ground'] = 0
+        if self.grappled["by"].is_dead:
+            self.set_grapple(state=False, dc=0, save='str', source=None)
+            return False, True
+        dc = self.grappled["dc"]
+        ability = self.grappled["save"]
+        if R.roll_save(self, ability, dc):
+            self.set_grapple(state=False, dc=0, save=None)
+            return False, False
+        return True, True
+
+    def tick_paralysis(self):
         if self.paralyzed["state"]:
             self.speed['fly'] = 0
             self.speed['ground'] = 0
-
-        if self.restrained["state"]:
-            self.speed['fly'] = 0
-            self.speed['ground'] = 0
-            dc = self.restrained["dc"]
-            ability = self.restrained['save']
-            if R.roll_save(self, ability, dc):
-                self.set_restrain(state=False, dc=0, save=None)
-                return False
-        return True
-
-    def end_turn(self):
-        """ Reroll save against paralysis  """
-        if self.is_paralyzed:
-            dc = self.paralyzed["dc"]
-            ability = self.paralyzed['save']
-            if R.roll_save(self, ability, dc) or self.paralyzed['duration'] == 0:
-                self.set_paralysis(state=False, dc=0, save=None, duration=-1)
-
-        if self.is_frightened:
-            dc = self.frightened["dc"]
-            ability = self.frightened['save']
-            if R.roll_save(self, ability, dc) or self.frightened['duration'] == 0:
-                self.set_fear(state=False, dc=0, save=None, duration=-1, by=None)
-
-        """ Decrease paralysis duration counter """
+            return True, True
+        return False, True
+
+    def tick_restrain(self):
+        if not self.restrained["state"]:
+            return False, True
+        self.speed['fly'] = 0
+        self.speed['ground'] = 0
+        dc = self.restrained["dc"]
+        ability = self.restrained['save']
+        if R.roll_save(self, ability, dc):
+            self.set_restrain(state=False, dc=0, save=None)
+            return False, False
+        return True, True
+
+    def tick_paralysis_save(self):
+        """ Reroll save against paralysis and decrease its duration """
+        if not self.is_paralyzed:
+            return False, True
+        dc = self.paralyzed["dc"]
+        ability = self.paralyzed['save']
+        if R.roll_save(self, ability, dc) or self.paralyzed['duration'] == 0:
+            self.set_paralysis(state=False, dc=0, save=None, duration=-1)
         self.paralyzed['duration'] -= 1
+        return self.is_paralyzed, True
+
+    def tick_fear(self):
+        """ Reroll save against fear and decrease its duration """
+        if not self.is_frightened:
+            return False, True
+        dc = self.frightened["dc"]
+        ability = self.frightened['save']
+        if R.roll_save(self, ability, dc) or self.frightened['duration'] == 0:
+            self.set_fear(state=False, dc=0, save=None, duration=-1, by=None)
         self.frightened['duration'] -= 1
-
-        """ Set first attack flag in case creature can make attacks
-        of opportunity """
-        self.first_attack = True
+        return self.is_frightened, True
 
     def heal(self, amount, spellname):
         if not self.prevent_heal and self.hp < self.max_hp:
@@ -477,9 +646,15 @@ class BaseCreature(object):
         """ Check if creature has vulnerability, resistance or immunity
             to the given damage type """
 
+        modifiers = self.damage_modifiers
         for dmg_type, damage in damage_types.items():
-            damage = self.check_resistances(dmg_type, damage)
-            damage = self.check_vulnerabilities(dmg_type, damage)
+            type_id = damagetypes.get(dmg_type).id
+            modifier = modifiers[type_id] if type_id < len(modifiers) else None
+            if modifier is not None:
+                halve, factor = modifier
+                if halve:
+                    damage = math.floor(damage / 2)
+                damage *= factor
 
             """ Store damage statistics """
             source.damage_dealt += damage
@@ -487,13 +662,11 @@ class BaseCreature(object):
             self.hp -= damage
 
             """ Check if creature can drop to 1 HP instead of 0 """
-            if self.hp <= 0 and self.passives:
-                for passive in self.passives:
-                    if passive.type == 'avoid_death':
-                        self.hp = passive.use(self, damage, dmg_type, crit_multiplier)
+            if self.hp <= 0 and self.triggers[AVOID_DEATH]:
+                for passive in self.triggers[AVOID_DEATH]:
+                    self.hp = passive.use(self, damage, dmg_type, crit_multiplier)
 
-            messages.IO.total_damage.setdefault(dmg_type, 0)
-            messages.IO.total_damage[dmg_type] += damage
+            messages.IO.add_damage(type_id, damage)
         messages.IO.hp = self.hp
         messages.IO.target_name = self.name
         messages.IO.printlog()
@@ -515,12 +688,63 @@ class BaseCreature(object):
             world.Map.remove(self)
             world.Map.statics[self.position] = ' † '
 
+            if self.triggers[ON_DEATH]:
+                self.trigger(ON_DEATH, source)
+
         if self.is_swallowed:
             self.swallowed['by'].stomach.damage_count += damage
 
         """ Return damage in case it's needed for special on-hit effects """
         return damage_types
 
+    def get_damage_sources(self):
+        """ Yield dice and damage types of everything the creature can
+        deal damage with: weapons, their on-hit abilities and bonus
+        actions, other actions and its stomach """
+        abilities = list(self.actions)
+        for attacks in (self.melee_attacks, self.ranged_attacks):
+            for weapons in attacks.values():
+                for weapon in weapons:
+                    yield weapon.damage, weapon.damage_type
+                    abilities.extend(weapon.special)
+        for ability in abilities:
+            bonus_action = getattr(ability, 'bonus_action', None)
+            if bonus_action is not None:
+                yield bonus_action.damage, bonus_action.damage_type
+            if getattr(ability, 'damage', None) is not None \
+                    and hasattr(ability, 'damage_type'):
+                yield ability.damage, ability.damage_type
+        if self.stomach is not None:
+            yield self.stomach.damage, self.stomach.damage_type
+
+    def can_kill(self, target):
+        """ Return False if nothing the creature deals damage with can
+        kill the target: the target is immune to all its damage types
+        or always avoids death against them (e.g. a troll without fire
+        or acid), see get_damage_sources(). Conditions are not
+        considered
+
+        :type target              BaseCreature
+        :rtype                    bool """
+        modifiers = target.damage_modifiers
+        damage_types = []
+        max_damage = 0
+        for damage, types in self.get_damage_sources():
+            for (t, s, b), type_ in zip(damage, types):
+                modifier = modifiers[type_.id] \
+                    if type_.id < len(modifiers) else None
+                if t * s + b > 0 and (modifier is None
+                                      or modifier[1] != 0):
+                    damage_types.append(type_)
+                    max_damage = max(max_damage, 2 * t * s + b)
+        if not damage_types:
+            return False
+        for passive in target.triggers[AVOID_DEATH]:
+            if hasattr(passive, 'can_fail') \
+                    and not passive.can_fail(target, damage_types, max_damage):
+                return False
+        return True
+
     def roll_initiative(self):
         """ Roll initiative for the creature, add decimals based
         on dexterity score and challenge rating to resolve equal rolls """
@@ -529,35 +753,49 @@ class BaseCreature(object):
         dex_mod = self.get_modifier('dex')
         self.initiative = dice.roll(1, 20, dex_mod) + dex + cr
 
-    def check_resistances(self, damage_type, damage):
-        """ Strip save DC info from damage_type """
-        if damage_type in self.resistances:
-            damage = math.floor(damage / 2)
-        if damage_type in self.immunities:
-            damage = 0
-        return damage
-
-    def check_vulnerabilities(self, damage_type, damage):
-        """ Strip save DC info from damage_type """
-        if damage_type in self.vulnerabilities:
-            return damage * 2
-        return damage
+    def compile_damage(self):
+        """ Compile resistances, immunities and vulnerabilities into
+        damage modifiers indexed by damage type id, see damagetypes.
+        Call this again if they are changed after creation """
+        self.damage_modifiers = damagetypes.get_modifiers(
+            self.resistances, self.immunities, self.vulnerabilities)
 
     def take_ability_score_damage(self, ability_score, damage):
         self.scores[ability_score] -= damage
         ## TODO: Adjust AC, damage and hit
 
+    def compile_passives(self):
+        """ Compile passives into a dispatch table indexed by trigger,
+        see abilities.Trigger. Call this again if passives are changed
+        after creation """
+        table = [[] for _ in Trigger]
+        for passive in self.passives:
+            trigger = Trigger.get(passive.type)
+            if trigger is not None:
+                table[trigger].append(passive)
+        self.triggers = tuple(tuple(passives) for passives in table)
+
+    def trigger(self, trigger, *args):
+        """ Use passives of a trigger """
+        for passive in self.triggers[trigger]:
+            passive.use(self, *args)
+
     def check_passives(self, allies, enemies, type_=None):
-        """ Check passive skills """
-        if self.passives:
-            for passive in self.passives:
-                if passive.type == type_:
-                    passive.use(self, allies, enemies)
+        """ Use passives of a trigger or passive type on allies and
+        enemies """
+        trigger = Trigger.get(type_)
+        if trigger is not None:
+            self.trigger(trigger, allies, enemies)
 
     def attack(self):
         """ Set focus on enemy and attack it """
 
         #if not self.focused_enemy.is_dead:
+        """ Remember the situation so that further attacks of this turn
+        can skip planning if nothing changes """
+        enemy = self.focused_enemy
+        self.turn_plan = (enemy, enemy.position, self.position,
+                          self.weapon_choice)
         self.active_weapon.use(self, self.focused_enemy)
         self.active_weapon.ammo -= 1
         self.first_attack = False
@@ -592,21 +830,25 @@ class BaseCreature(object):
         if self.is_swallowed:
             return True
 
+        run = False
         if distance > weapon.reach:
             """ If not at reach, close distance """
             path = world.get_path(A, B)
-            if distance > self.speed['ground'] + weapon.reach:
-                """ Run if can't get to range by moving regularly. 
-                Return False as action points spent on moving  """
-                points, new_pos = world.close_distance(self, path, weapon.reach, run=True)
-                return False
-            else:
-                points, new_pos = world.close_distance(self, path, weapon.reach)
+            run = distance > self.speed['ground'] + weapon.reach
+            world.close_distance(self, path, weapon.reach, run=run)
         elif distance < weapon.reach and weapon.ranged:
             """ If using ranged weapon, keep distance """
             path = world.get_opposite(A, B, self.speed['ground'])
             points, new_pos = world.keep_distance(self, enemy, path, weapon.reach)
 
+        if self.triggers[ON_MOVE] and self.position != A:
+            self.trigger(ON_MOVE, A)
+
+        if run:
+            """ Run if can't get to range by moving regularly. 
+            Return False as action points spent on moving  """
+            return False
+
         if self.speed['ground'] < 0:
             return False
 
@@ -614,98 +856,194 @@ class BaseCreature(object):
 
     def choose_target(self, enemies, choice=None):
         """ Set focus to some enemy and keep it unless the target dies;
-        lower intelligence results to simpler decisions """
-        if choice is None:
-            if self.scores['int'] <= 4:
-                choice = enemies.get_closest(self.position)
-            else:
-                choice = enemies.get_weakest()
-
+        lower intelligence results to simpler decisions. A new target
+        is looked up only when it is needed """
         if self.is_swallowed:
             self.focused_enemy = self.swallowed['by']
-        elif self.focused_enemy is None:
-            self.focused_enemy = choice
-        elif self.focused_enemy.is_dead:
+        elif self.focused_enemy is None or self.focused_enemy.is_dead:
+            """ Prefer targets suggested by a batched policy """
+            if choice is None and self.suggested_targets:
+                for target in self.suggested_targets:
+                    if not target.is_dead:
+                        choice = target
+                        break
+            if choice is None:
+                if self.scores['int'] <= 4:
+                    choice = enemies.get_closest(self.position)
+                else:
+                    choice = enemies.get_weakest()
             self.focused_enemy = choice
 
+    def compile_weapons(self):
+        """ Compile weapon sets into selection tables. Call this again
+        if melee or ranged attacks are changed after creation """
+        self.weapon_sets = self.get_weapon_sets()
+        self.weapon_tables = dict(
+            close=WeaponTable(self.weapon_sets['close']),
+            ranged=WeaponTable(self.weapon_sets['ranged'],
+                               check_ammo=True, check_range=False),
+            special=WeaponTable(self.weapon_sets['special']),
+            basic=WeaponTable(self.weapon_sets['basic']))
+
+    def get_weapon_sets(self):
+        """ Return weapon lists the selection tables refer to """
+        melee = self.melee_attacks
+        ranged = self.ranged_attacks
+        return dict(close=melee.get('special', melee.get('basic')) or [],
+                    ranged=ranged.get('special', ranged.get('basic')) or [],
+                    special=melee.get('special') or [],
+                    basic=melee.get('basic') or [])
+
     def choose_weapon(self, enemies, weapons=None):
-        # TODO optimize for big encounters, just check surroundings
-        # TODO rewrite this method
-        """ Check if enemies are too close, pick melee weapon if so """
+        """ Check if enemies are too close, pick melee weapon if so.
+        Return False if the creature has no weapon to attack with, e.g.
+        its only weapons are ranged and out of ammo, or all of them
+        have been used as many times as they can be this turn """
 
         distance_to_target = world.get_dist(self.position,
                                             self.focused_enemy.position)
-
-        def has_ammo(weapons):
-            if weapons is None:
-                return None
-            w = [attack for attack in weapons if attack.ammo > 0]
-            if not w:
-                return None
-            return w
-
-        def has_min_range(weapons):
-            if weapons is None:
-                return None
-            w = [attack for attack in weapons
-                 if attack.min_distance <= distance_to_target]
-            if not w:
-                return None
-            return w
+        tables = self.weapon_tables
+        sets = self.weapon_sets
+        name = None
+        key = None
 
         """ Pick melee weapon if enemy too close """
-        enemy_positions = (e.position for e in enemies.get_alive())
-        if world.any_is_adjacent(self.position, enemy_positions):
-            weapons = has_min_range(self.melee_attacks.get('special',
-                            self.melee_attacks.get('basic', None)))
+        if world.enemy_is_adjacent(self, enemies):
+            name = 'close'
+            key = tables[name].select(sets[name], distance_to_target)
 
         """ General weapon selector; prioritize ranged -> melee and
         special -> basic """
-        if self.ranged_attacks and weapons is None and not self.is_swallowed:
-            weapons = has_ammo(self.ranged_attacks.get('special',
-                                self.ranged_attacks.get('basic', None)))
+        if key is None and tables['ranged'] and not self.is_swallowed:
+            name = 'ranged'
+            key = tables[name].select(sets[name], distance_to_target)
+
+        if key is None:
+            name = 'special'
+            key = tables[name].select(sets[name], distance_to_target)
+        if key is None:
+            name = 'basic'
+            key = tables[name].select(sets[name], distance_to_target)
+        if key is None:
+            key = tables[name].select(sets[name], math.inf)
+        if key is None:
+            self.weapon_choice = None
+            self.active_weapon = None
+            return False
 
-        if weapons is None and self.melee_attacks:
-            weapons = has_min_range(self.melee_attacks.get('special', None))
-            if weapons is None:
-                weapons = has_min_range(self.melee_attacks.get('basic', None))
+        self.weapon_choice = (name, key)
+        return self.draw_weapon()
 
-        if weapons is None or not weapons:
-            weapons = self.melee_attacks
+    def draw_weapon(self):
+        """ Draw active weapon from the candidates of the last choice.
+        Return False if none of them has uses left this turn """
+        name, key = self.weapon_choice
+        table = self.weapon_tables[name]
+        weapons = self.weapon_sets[name]
 
         """ Reset multiattacks and limited at the start of the combat round"""
         if self.first_attack:
-            for weapon in weapons:
+            for weapon in table.get(weapons, key):
                 weapon.uses_per_turn = weapon.max_uses_per_turn
 
-        if not [w for w in weapons if w.uses_per_turn != 0]:
-            for weapon in weapons:
-                print(weapon.uses_per_turn, weapon)
+        self.active_weapon = table.draw(weapons, key)
+        return self.active_weapon is not None
+
+    def follow_turn_plan(self):
+        """ Repeat the previous attack of this turn without planning
+        target, weapon and movement again, if the attacker and its
+        target are where they were and the target is alive. Weapons
+        are still drawn per attack so that uses per turn are honored.
+        Return False if the creature has to plan its action """
+        plan = self.turn_plan
+        if plan is None:
+            return False
+        target, target_position, position, (name, key) = plan
+        if target is not self.focused_enemy or target.is_dead \
+                or target.position != target_position \
+                or self.position != position or self.is_swallowed:
+            self.turn_plan = None
+            return False
 
-        self.active_weapon = random.choice([w for w in weapons if w.uses_per_turn != 0])
+        if self.weapon_tables[name].check_ammo:
+            """ Choose again if ammo has run out """
+            key = self.weapon_tables[name].select(self.weapon_sets[name],
+                                                  math.inf)
+            if key is None:
+                self.turn_plan = None
+                return False
+            self.weapon_choice = (name, key)
+        if not self.draw_weapon():
+            """ Every weapon of the plan has been used up this turn """
+            return True
+
+        """ Move only if the drawn weapon cannot attack from here """
+        weapon = self.active_weapon
+        distance = world.get_dist(position, target_position)
+        if distance <= weapon.reach \
+                and not (weapon.ranged and distance < weapon.reach):
+            self.attack()
+        elif self.move():
+            self.attack()
+        return True
 
     def act(self, allies, enemies):
         """ Routine for actions that utilize given behavior class """
         world.Map.remove(self)
-        self.check_passives(allies, enemies, type_="initial")
+        passives = self.triggers
+        if passives[INITIAL]:
+            self.trigger(INITIAL, allies, enemies)
         if not self.is_dead and not self.is_incapacitated:
             self.turns_alive += 1
             if self.begin_turn():
-                self.check_passives(allies, enemies, type_="on_start")
-                for i in range(self.attacks):
-                    if enemies.is_alive:
-                        self.ai.do_stuff(allies, enemies)
-
-        self.check_passives(allies, enemies, type_="at_end")
+                if passives[ON_START]:
+                    self.trigger(ON_START, allies, enemies)
+                self.make_attacks(allies, enemies)
+        elif self.timers:
+            self.skip_timers(scheduler.BEGIN)
+        self.close_turn(allies, enemies)
+
+    def make_attacks(self, allies, enemies):
+        """ Make the attacks of the turn. Each attack is planned by the
+        behavior unless the previous one can be repeated """
+        for i in range(self.attacks):
+            if enemies.is_alive:
+                if recorder.ACTIVE is not None:
+                    recorder.ACTIVE.begin(self)
+                if not self.follow_turn_plan():
+                    self.ai.do_stuff(allies, enemies)
+                if recorder.ACTIVE is not None:
+                    recorder.ACTIVE.end(self)
+
+    def close_turn(self, allies, enemies):
+        """ End the turn and put the creature back on the map """
+        if self.triggers[AT_END]:
+            self.trigger(AT_END, allies, enemies)
         self.end_turn()
         world.Map.update(self)
 
 
 class Party:
 
-    def __init__(self, name):
+    """ Party of creatures
+
+    :param name               party name
+    :param horde              allow map-backed queries that scale to
+                              thousands of members, see RING_SEARCH """
+
+    """ Parties larger than this look up the closest enemy from the map
+    in horde mode if RING_SEARCH is set. The map search is faster but
+    approximate (see get_closest()), so it is off by default """
+    HORDE_SIZE = 64
+    RING_SEARCH = False
+
+    def __init__(self, name, horde=False):
         self.name = name
+        self.horde = horde
         self.members = []
+        self.type_counts = {}    # Number of members per creature type
+        self.order = {}          # Member -> index in members
+        self.alive_hint = 0      # No living members before this index
 
     def __repr__(self):
         return messages.IO.center_and_pad(self.name) + '\n' \
@@ -721,8 +1059,16 @@ class Party:
 
     @property
     def is_alive(self):
-        """ Return True if any party member is alive """
-        return False in [c.is_dead for c in self.members]
+        """ Return True if any party member is alive. Dead members
+        before the first known living member are skipped """
+        members = self.members
+        for i in range(self.alive_hint, len(members)):
+            if not members[i].is_dead:
+                self.alive_hint = i
+                return True
+        """ Rescan in case a skipped member has been brought back """
+        self.alive_hint = 0
+        return False in [c.is_dead for c in members]
 
     @staticmethod
     def remove_dead(party):
@@ -731,29 +1077,37 @@ class Party:
     def get_alive(self):
         return (c for c in self.members if not c.is_dead)
 
-    def add(self, creature):
+    def add(self, creature, sort=True, rename=True):
         """ Add party members and roll initiatives, the party is
-         ordered by initiative """
+         ordered by initiative. Creatures that have already been
+         numbered in a party keep their names if ´rename´ is False """
         creature.roll_initiative()
         creature.party = self.name
 
         """ Add number after creature name if the party has already 
         similar creature types """
-        count = len([c.type for c in self.members if c.type == creature.type])
-        if count >= 1:
+        count = self.type_counts.get(creature.type, 0)
+        if count >= 1 and rename:
             creature.name = "%s %i" % (creature.name, count + 1)
+        self.type_counts[creature.type] = count + 1
 
         self.members.append(creature)
+        if sort:
+            self.sort_by('initiative')
+
+    def add_many(self, creatures, rename=True):
+        """ Add many party members and sort the party only once """
+        for creature in creatures:
+            self.add(creature, sort=False, rename=rename)
         self.sort_by('initiative')
 
     def get_weakest(self):
         """ Pick weakest creature (HP-wise)
         :rtype BaseCreature or None """
         try:
-            weakest = sorted(self.remove_dead(self.members),
-                             key=operator.attrgetter('hp'),
-                             reverse=False)[0]
-        except IndexError:
+            weakest = min(self.remove_dead(self.members),
+                          key=operator.attrgetter('hp'))
+        except ValueError:
             return None
 
         if weakest:
@@ -763,6 +1117,18 @@ class Party:
     def get_closest(self, B):
         """ Pick closest enemy to position ´B´
         :rtype BaseCreature or None """
+        if self.RING_SEARCH and self.horde \
+                and len(self.members) > self.HORDE_SIZE:
+            """ Search the map around ´B´ instead of every member, up to
+            the radius at which a scan of the members is cheaper. Ties
+            go to the earliest member, as in the scan, but creatures
+            hidden from the map are missed (see world.find_closest()),
+            so the search may pick another target than the scan """
+            limit = int(math.sqrt(len(self.members)))
+            found = world.find_closest(B, self.name, limit)
+            if found:
+                return min(found, key=self.order.__getitem__)
+
         try:
             closest = min([(world.get_dist(x.position, B), x)
                            for x in self.remove_dead(self.members)],
@@ -778,7 +1144,7 @@ class Party:
         """ :type other Party
             :type creature BaseCreature
             :rtype (Party, Party) """
-        if creature in self.members:
+        if creature.party == self.name:
             return self, other
         else:
             return other, self
@@ -794,10 +1160,24 @@ class Party:
         """ Reorder party by a given creature variable """
         self.members.sort(key=operator.attrgetter(value),
                           reverse=strongest_first)
+        self.order = {c: i for i, c in enumerate(self.members)}
+        self.alive_hint = 0
 
-    def set_formation(self, position):
-        """ Sets party in formation near given coordinates """
+    def set_formation(self, position, width=None):
+        """ Sets party in formation near given coordinates. If ´width´
+        is given, the party is set in rows of that many creatures
+        extending away from the y axis """
         x, y, z = position
+        if width is not None:
+            direction = -1 if y < 0 else 1
+            for n, creature in enumerate(self.members):
+                row, i = divmod(n, width)
+                i += 1
+                k = -(i // 2) if i % 2 == 0 else i // 2
+                creature.position = (x + k, y + direction * row, z)
+                world.Map.update(creature)
+            return
+
         i = 1
         for creature in self.members:
             j = dice.roll(1, 2, -1)
@@ -0,0 +1,68 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Interned damage types.
+
+Damage types are names such as ´magical slashing´. Each name is
+interned once, when weapons and creatures are defined, into a
+DamageType: a string that also carries a small integer ´id´. Since
+DamageType is a string, it compares, hashes and prints like the plain
+name, but creatures and the message log can index fixed tables by its
+id instead of scanning lists and dicts of names. """
+
+
+class DamageType(str):
+
+    """ Interned damage type name with an integer id. Use get() to
+    create these """
+
+    def __repr__(self):
+        return "DamageType(%s, %i)" % (str.__repr__(self), self.id)
+
+    def __reduce__(self):
+        """ Intern again by name when unpickled, since ids depend on the
+        order in which a process interns the names """
+        return get, (str(self),)
+
+
+""" Interned damage types by id and by name """
+TYPES = []
+INDEX = {}
+
+
+def get(name):
+    """ Return the interned damage type of a name
+
+    :type name                str or DamageType
+    :rtype                    DamageType """
+    if name.__class__ is DamageType:
+        return name
+    type_ = INDEX.get(name)
+    if type_ is None:
+        type_ = DamageType(name)
+        type_.id = len(TYPES)
+        TYPES.append(type_)
+        INDEX[str(name)] = type_
+    return type_
+
+
+def get_modifiers(resistances, immunities, vulnerabilities):
+    """ Return damage modifiers indexed by damage type id as (halve,
+    factor): resistance halves damage rounding down, immunity sets the
+    factor to 0 and vulnerability to 2. Types not listed get None, and
+    types interned later are past the end of the table; both take full
+    damage
+
+    :rtype                    ((bool, int) or None, ...) """
+    names = set(resistances) | set(immunities) | set(vulnerabilities)
+    ids = {get(name).id for name in names}
+    table = [None] * (max(ids) + 1 if ids else 0)
+    for type_ in (TYPES[i] for i in ids):
+        if type_ in immunities:
+            factor = 0
+        elif type_ in vulnerabilities:
+            factor = 2
+        else:
+            factor = 1
+        table[type_.id] = (type_ in resistances, factor)
+    return tuple(table)
@@ -1,7 +1,7 @@
 import copy
 import behavior
 from abilities import *
-from creature import BaseCreature
+from registry import CreatureSpec
 from weapons import Weapon, MultiWeapon
 
 """ asahala 2020
@@ -285,104 +285,111 @@ wyvern_stinger = MultiWeapon(name='stinger',
 
 class Creatures:
 
-    black_bear = BaseCreature(name='black bear', cr=0.5, ac=11, hp=19, speed=40,
-                          size=medium,
-                          category=beast,
-                          attacks=2,
-                          ai=behavior.Standard,
-                          scores={'str': 15, 'dex': 10, 'con': 14,
-                                  'int': 2, 'wis': 12, 'cha': 7},
-                          melee_attacks={'basic':
-                                             [MultiWeapon(name='bite',
-                                                          damage=["1d6+2"],
-                                                          damage_type=[piercing],
-                                                          reach=5,
-                                                          to_hit=3,
-                                                          uses_per_turn=1),
-                                              MultiWeapon(name='claws',
-                                                          damage=["2d4+2"],
-                                                          damage_type=[slashing],
-                                                          reach=5,
-                                                          to_hit=3,
-                                                          uses_per_turn=1)]})
-
-    brown_bear = BaseCreature(name='brown bear', cr=1, ac=11, hp=34, speed=40,
+    black_bear = CreatureSpec(name='black bear', cr=0.5, ac=11, hp=19, speed=40,
+                              size=medium,
+                              category=beast,
+                              attacks=2,
+                              ai=behavior.Standard,
+                              scores={'str': 15, 'dex': 10, 'con': 14,
+                                      'int': 2, 'wis': 12, 'cha': 7},
+                              build=lambda: dict(
+                                  melee_attacks={'basic':
+                                                     [MultiWeapon(name='bite',
+                                                                  damage=["1d6+2"],
+                                                                  damage_type=[piercing],
+                                                                  reach=5,
+                                                                  to_hit=3,
+                                                                  uses_per_turn=1),
+                                                      MultiWeapon(name='claws',
+                                                                  damage=["2d4+2"],
+                                                                  damage_type=[slashing],
+                                                                  reach=5,
+                                                                  to_hit=3,
+                                                                  uses_per_turn=1)]}))
+
+    brown_bear = CreatureSpec(name='brown bear', cr=1, ac=11, hp=34, speed=40,
                               size=large,
                               category=beast,
                               attacks=2,
                               ai=behavior.Standard,
                               scores={'str': 19, 'dex': 10, 'con': 16,
                                       'int': 2, 'wis': 13, 'cha': 7},
-                              melee_attacks={'basic':
-                                                 [MultiWeapon(name='bite',
-                                                              damage=["1d8+4"],
-                                                              damage_type=[piercing],
-                                                              reach=5,
-                                                              to_hit=5,
-                                                              uses_per_turn=1),
-                                                  MultiWeapon(name='claws',
-                                                              damage=["2d6+4"],
-                                                              damage_type=[slashing],
-                                                              reach=5,
-                                                              to_hit=5,
-                                                              uses_per_turn=1)]})
-
-    bugbear = BaseCreature(name='bugbear', cr=1, ac=16, hp=27, speed=30,
-                       size=medium,
-                       category=humanoid,
-                       ai=behavior.Standard,
-                       # Surprise attack undefined
-                       # Brute hardcoded into weapon 
-                       scores={'str': 15, 'dex': 14, 'con': 13,
-                               'int': 8, 'wis': 11, 'cha': 9},
-                       melee_attacks={'basic': [
-                           Weapon(name='morningstar', damage=["2d8+2"],
-                                  damage_type=[piercing], reach=5,
-                                  to_hit=4)]},
-                       ranged_attacks={'basic': [
-                           Weapon(name='javelin', damage=["1d6+2"],
-                                  damage_type=[piercing], reach=30,
-                                  ranged=True,
-                                  ammo=5,
-                                  to_hit=4)]})
-
-    crocodile = BaseCreature(name='crocodile', cr=0.5, ac=12, hp=19, speed=20,
+                              build=lambda: dict(
+                                  melee_attacks={'basic':
+                                                     [MultiWeapon(name='bite',
+                                                                  damage=["1d8+4"],
+                                                                  damage_type=[piercing],
+                                                                  reach=5,
+                                                                  to_hit=5,
+                                                                  uses_per_turn=1),
+                                                      MultiWeapon(name='claws',
+                                                                  damage=["2d6+4"],
+                                                                  damage_type=[slashing],
+                                                                  reach=5,
+                                                                  to_hit=5,
+                                                                  uses_per_turn=1)]}))
+
+    bugbear = CreatureSpec(name='bugbear', cr=1, ac=16, hp=27, speed=30,
+                           size=medium,
+                           category=humanoid,
+                           ai=behavior.Standard,
+                           # Surprise attack undefined
+                           # Brute hardcoded into weapon
+                           scores={'str': 15, 'dex': 14, 'con': 13,
+                                   'int': 8, 'wis': 11, 'cha': 9},
+                           build=lambda: dict(
+                               melee_attacks={'basic': [
+                                   Weapon(name='morningstar', damage=["2d8+2"],
+                                          damage_type=[piercing], reach=5,
+                                          to_hit=4)]},
+                               ranged_attacks={'basic': [
+                                   Weapon(name='javelin', damage=["1d6+2"],
+                                          damage_type=[piercing], reach=30,
+                                          ranged=True,
+                                          ammo=5,
+                                          to_hit=4)]}))
+
+    crocodile = CreatureSpec(name='crocodile', cr=0.5, ac=12, hp=19, speed=20,
                              size=large,
                              category=beast,
                              ai=behavior.Standard,
                              scores={'str': 15, 'dex': 10, 'con': 13,
                                      'int': 2, 'wis': 10, 'cha': 5},
-                             melee_attacks={'basic': [crocodile_bite]})
+                             build=lambda: dict(
+                                 melee_attacks={'basic': [crocodile_bite]}))
 
-    dire_wolf = BaseCreature(name='dire wolf', cr=1, ac=14, hp=37, speed=50,
+    dire_wolf = CreatureSpec(name='dire wolf', cr=1, ac=14, hp=37, speed=50,
                              size=large,
                              ai=behavior.SocialAnimal,
                              category=beast,
                              scores={'str': 17, 'dex': 15, 'con': 15,
                                      'int': 3, 'wis': 12, 'cha': 7},
-                             melee_attacks={'special': [dire_wolf_bite]},
-                             passives=[PackTactics])
-
-    giant_crocodile = BaseCreature(name='giant crocodile', cr=5, ac=14, hp=85, speed=30,
-                             size=huge,
-                             category=beast,
-                             ai=behavior.Standard,
-                             attacks=2,
-                             scores={'str': 21, 'dex': 9, 'con': 17,
-                                     'int': 2, 'wis': 10, 'cha': 7},
-                             melee_attacks={'basic': [giant_crocodile_bite,
-                                                      giant_crocodile_tail] })
-
-
-    giant_spider = BaseCreature(name='giant spider', cr=1, ac=14, hp=26, speed=30,
+                             build=lambda: dict(
+                                 melee_attacks={'special': [dire_wolf_bite]},
+                                 passives=[PackTactics]))
+
+    giant_crocodile = CreatureSpec(name='giant crocodile', cr=5, ac=14, hp=85, speed=30,
+                                   size=huge,
+                                   category=beast,
+                                   ai=behavior.Standard,
+                                   attacks=2,
+                                   scores={'str': 21, 'dex': 9, 'con': 17,
+                                           'int': 2, 'wis': 10, 'cha': 7},
+                                   build=lambda: dict(
+                                       melee_attacks={'basic': [giant_crocodile_bite,
+                                                                giant_crocodile_tail] }))
+
+
+    giant_spider = CreatureSpec(name='giant spider', cr=1, ac=14, hp=26, speed=30,
                                 size=large,
                                 category=beast,
                                 ai=behavior.Standard,
                                 scores={'str': 14, 'dex': 16, 'con': 12,
                                         'int': 2, 'wis': 11, 'cha': 4},
-                                melee_attacks={'basic': [giant_spider_bite]})
+                                build=lambda: dict(
+                                    melee_attacks={'basic': [giant_spider_bite]}))
 
-    ghast = BaseCreature(name='ghast', cr=2, ac=13, hp=36, speed=30,
+    ghast = CreatureSpec(name='ghast', cr=2, ac=13, hp=36, speed=30,
                          size=medium,
                          category=undead,
                          ai=behavior.Standard,
@@ -390,81 +397,88 @@ class Creatures:
                                  'int': 11, 'wis': 10, 'cha': 8},
                          immunities=[poison, paralysis, charm],
                          resistances=[necrotic],
-                         melee_attacks={'basic': [ghast_bite],
-                                        'special': [ghast_claw]},
-                         passives=[Stench(name='ghast stench',
-                                          type_='on_start',
-                                          save='con',
-                                          dc=10)])
-
-    ghoul = BaseCreature(name='ghoul', cr=1, ac=12, hp=22, speed=30,
+                         build=lambda: dict(
+                             melee_attacks={'basic': [ghast_bite],
+                                            'special': [ghast_claw]},
+                             passives=[Stench(name='ghast stench',
+                                              type_='on_start',
+                                              save='con',
+                                              dc=10)]))
+
+    ghoul = CreatureSpec(name='ghoul', cr=1, ac=12, hp=22, speed=30,
                          size=medium,
                          category=undead,
                          ai=behavior.Standard,
                          scores={'str': 13, 'dex': 15, 'con': 10,
                                  'int': 7, 'wis': 10, 'cha': 6},
                          immunities=[poison, paralysis, charm, fear],
-                         melee_attacks={'basic': [ghoul_bite],
-                                        'special': [ghoul_claw]})
+                         build=lambda: dict(
+                             melee_attacks={'basic': [ghoul_bite],
+                                            'special': [ghoul_claw]}))
 
-    goblin = BaseCreature(name='goblin', cr=0.25, ac=15, hp=7, speed=30,
-                       size=small,
-                       category=humanoid,
-                       ai=behavior.Standard,
-                       scores={'str': 8, 'dex': 14, 'con': 10,
-                               'int': 10, 'wis': 8, 'cha': 8},
-                       melee_attacks={'basic': [
-                           Weapon(name='scimitar', damage=["1d6+2"],
-                                  damage_type=[slashing], reach=5,
-                                  to_hit=4)]},
-                       ranged_attacks={'basic': [copy.deepcopy(shortbow)]})
+    goblin = CreatureSpec(name='goblin', cr=0.25, ac=15, hp=7, speed=30,
+                          size=small,
+                          category=humanoid,
+                          ai=behavior.Standard,
+                          scores={'str': 8, 'dex': 14, 'con': 10,
+                                  'int': 10, 'wis': 8, 'cha': 8},
+                          build=lambda: dict(
+                              melee_attacks={'basic': [
+                                  Weapon(name='scimitar', damage=["1d6+2"],
+                                         damage_type=[slashing], reach=5,
+                                         to_hit=4)]},
+                              ranged_attacks={'basic': [copy.deepcopy(shortbow)]}))
     
-    kobold = BaseCreature(name='kobold', cr=0.125, ac=12, hp=5, speed=30,
-                       size=small,
-                       category=humanoid,
-                       ai=behavior.Standard,
-                       scores={'str': 7, 'dex': 15, 'con': 9,
-                               'int': 8, 'wis': 7, 'cha': 8},
-                       passives=[PackTactics],
-                       melee_attacks={'basic': [
-                           Weapon(name='dagger', damage=["1d4+2"],
-                                  damage_type=[piercing], reach=5,
-                                  to_hit=4)]},
-                       ranged_attacks={'basic': [
-                           Weapon(name='sling', damage=["1d4+2"],
-                                  damage_type=[bludgeoning], reach=30,
-                                  ranged=True,
-                                  ammo=20,
-                                  to_hit=4)]})
-
-    lion = BaseCreature(name='lion', cr=1, ac=12, hp=26, speed=50,
+    kobold = CreatureSpec(name='kobold', cr=0.125, ac=12, hp=5, speed=30,
+                          size=small,
+                          category=humanoid,
+                          ai=behavior.Standard,
+                          scores={'str': 7, 'dex': 15, 'con': 9,
+                                  'int': 8, 'wis': 7, 'cha': 8},
+                          build=lambda: dict(
+                              passives=[PackTactics],
+                              melee_attacks={'basic': [
+                                  Weapon(name='dagger', damage=["1d4+2"],
+                                         damage_type=[piercing], reach=5,
+                                         to_hit=4)]},
+                              ranged_attacks={'basic': [
+                                  Weapon(name='sling', damage=["1d4+2"],
+                                         damage_type=[bludgeoning], reach=30,
+                                         ranged=True,
+                                         ammo=20,
+                                         to_hit=4)]}))
+
+    lion = CreatureSpec(name='lion', cr=1, ac=12, hp=26, speed=50,
                         size=large,
                         category=beast,
                         ai=behavior.SocialAnimal,
                         scores={'str': 17, 'dex': 15, 'con': 13,
                                 'int': 3, 'wis': 12, 'cha': 8},
-                        melee_attacks={'basic': [lion_bite, lion_claw],
-                                       'special': [lion_pounce]},
-                        passives=[PackTactics])
+                        build=lambda: dict(
+                            melee_attacks={'basic': [lion_bite, lion_claw],
+                                           'special': [lion_pounce]},
+                            passives=[PackTactics]))
 
-    mammoth = BaseCreature(name='mammoth', cr=6, ac=13, hp=126, speed=40,
+    mammoth = CreatureSpec(name='mammoth', cr=6, ac=13, hp=126, speed=40,
                            size=huge,
                            category=beast,
                            ai=behavior.Standard,
                            scores={'str': 24, 'dex': 9, 'con': 21,
                                    'int': 3, 'wis': 11, 'cha': 6},
-                           melee_attacks={'basic': [mammoth_gore]})
+                           build=lambda: dict(
+                               melee_attacks={'basic': [mammoth_gore]}))
 
-    minotaur = BaseCreature(name='minotaur', cr=3, ac=14, hp=76, speed=40,
+    minotaur = CreatureSpec(name='minotaur', cr=3, ac=14, hp=76, speed=40,
                             size=medium,
                             category=beast,
                             ai=behavior.Standard,
                             scores={'str': 18, 'dex': 11, 'con': 16,
                                     'int': 6, 'wis': 16, 'cha': 9},
-                            melee_attacks={'basic': [minotaur_axe],
-                                           'special': [minotaur_gore]})
+                            build=lambda: dict(
+                                melee_attacks={'basic': [minotaur_axe],
+                                               'special': [minotaur_gore]}))
 
-    mummy = BaseCreature(name='mummy', cr=3, ac=11, hp=58, speed=20,
+    mummy = CreatureSpec(name='mummy', cr=3, ac=11, hp=58, speed=20,
                          size=medium,
                          category=undead,
                          ai=behavior.Standard,
@@ -474,137 +488,144 @@ class Creatures:
                          immunities=[necrotic, poison, charm, paralysis, fear],
                          scores={'str': 16, 'dex': 8, 'con': 15,
                                  'int': 6, 'wis': 10, 'cha': 12},
-                         melee_attacks={'basic': [mummy_fist]},
-                         passives=[DreadfulGlare(name="Dreadful Glare",
-                                                 save="wis",
-                                                 dc=11,
-                                                 type_='at_end',
-                                                 duration=1)])
-
-    orc = BaseCreature(name='orc', cr=0.5, ac=13, hp=15, speed=30,
+                         build=lambda: dict(
+                             melee_attacks={'basic': [mummy_fist]},
+                             passives=[DreadfulGlare(name="Dreadful Glare",
+                                                     save="wis",
+                                                     dc=11,
+                                                     type_='at_end',
+                                                     duration=1)]))
+
+    orc = CreatureSpec(name='orc', cr=0.5, ac=13, hp=15, speed=30,
                        size=medium,
                        category=humanoid,
                        ai=behavior.Standard,
                        scores={'str': 16, 'dex': 12, 'con': 16,
                                'int': 7, 'wis': 11, 'cha': 10},
-                       melee_attacks={'basic': [
-                           Weapon(name='greataxe', damage=["1d12+2"],
-                                  damage_type=[slashing], reach=5,
-                                  to_hit=5)]},
-                       ranged_attacks={'basic': [
-                           Weapon(name='javelin', damage=["1d6+3"],
-                                  damage_type=[piercing], reach=30,
-                                  ranged=True,
-                                  ammo=5,
-                                  to_hit=5)]})
-
-    orc_war_chieftain = BaseCreature(name='orc war chieftain', cr=4, ac=16, hp=93, speed=30,
+                       build=lambda: dict(
+                           melee_attacks={'basic': [
+                               Weapon(name='greataxe', damage=["1d12+2"],
+                                      damage_type=[slashing], reach=5,
+                                      to_hit=5)]},
+                           ranged_attacks={'basic': [
+                               Weapon(name='javelin', damage=["1d6+3"],
+                                      damage_type=[piercing], reach=30,
+                                      ranged=True,
+                                      ammo=5,
+                                      to_hit=5)]}))
+
+    orc_war_chieftain = CreatureSpec(name='orc war chieftain', cr=4, ac=16, hp=93, speed=30,
                                      size=medium,
                                      category=humanoid,
                                      ai=behavior.Standard,
                                      attacks=2,
                                      scores={'str': 18, 'dex': 12, 'con': 18,
                                              'int': 11, 'wis': 11, 'cha': 16},
-                                     melee_attacks={'basic': [
-                                         Weapon(name='greataxe', damage=["2d10+4"],
-                                                     damage_type=[slashing], reach=5,
-                                                     to_hit=6)]},
-                                     ranged_attacks={'basic': [
-                                         Weapon(name='javelin', damage=["2d7+4"],
-                                                     damage_type=[piercing], reach=40,
-                                                     ranged=True,
-                                                     ammo=5,
-                                                     to_hit=6)]})
-
-    orog = BaseCreature(name='orog', cr=2, ac=18, hp=42, speed=30,
+                                     build=lambda: dict(
+                                         melee_attacks={'basic': [
+                                             Weapon(name='greataxe', damage=["2d10+4"],
+                                                         damage_type=[slashing], reach=5,
+                                                         to_hit=6)]},
+                                         ranged_attacks={'basic': [
+                                             Weapon(name='javelin', damage=["2d7+4"],
+                                                         damage_type=[piercing], reach=40,
+                                                         ranged=True,
+                                                         ammo=5,
+                                                         to_hit=6)]}))
+
+    orog = CreatureSpec(name='orog', cr=2, ac=18, hp=42, speed=30,
                         size=medium,
                         category=humanoid,
                         ai=behavior.Standard,
                         attacks=2,
                         scores={'str': 18, 'dex': 12, 'con': 18,
                                 'int': 12, 'wis': 11, 'cha': 12},
-                        melee_attacks={'basic': [
-                            Weapon(name='greataxe', damage=["1d12+2"],
-                                        damage_type=[slashing], reach=5,
-                                        to_hit=6)]},
-                        ranged_attacks={'basic': [
-                            Weapon(name='javelin', damage=["1d6+3"],
-                                        damage_type=[piercing], reach=30,
-                                        ranged=True,
-                                        ammo=5,
-                                        to_hit=5)]})
-
-    owlbear = BaseCreature(name='owlbear', cr=3, ac=13, hp=59, speed=40,
+                        build=lambda: dict(
+                            melee_attacks={'basic': [
+                                Weapon(name='greataxe', damage=["1d12+2"],
+                                            damage_type=[slashing], reach=5,
+                                            to_hit=6)]},
+                            ranged_attacks={'basic': [
+                                Weapon(name='javelin', damage=["1d6+3"],
+                                            damage_type=[piercing], reach=30,
+                                            ranged=True,
+                                            ammo=5,
+                                            to_hit=5)]}))
+
+    owlbear = CreatureSpec(name='owlbear', cr=3, ac=13, hp=59, speed=40,
                            size=medium,
                            category=beast,
                            ai=behavior.Standard,
                            attacks=2,
                            scores={'str': 20, 'dex': 12, 'con': 17,
                                    'int': 3, 'wis': 12, 'cha': 7},
-                           melee_attacks={'basic': [
-                               MultiWeapon(name='beak', damage=["1d10+5"],
-                                           damage_type=[piercing], reach=5,
-                                           to_hit=7, uses_per_turn=1),
-                               MultiWeapon(name='claws', damage=["2d8+5"],
-                                           damage_type=[slashing], reach=5,
-                                           to_hit=7, uses_per_turn=1)
-                           ]})
-
-    polar_bear = BaseCreature(name='brown bear', cr=2, ac=12, hp=42, speed=40,
+                           build=lambda: dict(
+                               melee_attacks={'basic': [
+                                   MultiWeapon(name='beak', damage=["1d10+5"],
+                                               damage_type=[piercing], reach=5,
+                                               to_hit=7, uses_per_turn=1),
+                                   MultiWeapon(name='claws', damage=["2d8+5"],
+                                               damage_type=[slashing], reach=5,
+                                               to_hit=7, uses_per_turn=1)
+                               ]}))
+
+    polar_bear = CreatureSpec(name='brown bear', cr=2, ac=12, hp=42, speed=40,
                               size=large,
                               category=beast,
                               attacks=2,
                               ai=behavior.Standard,
                               scores={'str': 20, 'dex': 10, 'con': 16,
                                       'int': 2, 'wis': 13, 'cha': 7},
-                              melee_attacks={'basic':
-                                                 [MultiWeapon(name='bite',
-                                                              damage=["1d8+5"],
-                                                              damage_type=[piercing],
-                                                              reach=5,
-                                                              to_hit=7,
-                                                              uses_per_turn=1),
-                                                  MultiWeapon(name='claws',
-                                                              damage=["2d6+6"],
-                                                              damage_type=[slashing],
-                                                              reach=5,
-                                                              to_hit=7,
-                                                              uses_per_turn=1)]})
-
-
-    purple_worm = BaseCreature(name='purple worm', cr=15, ac=18, hp=247, speed=50,
+                              build=lambda: dict(
+                                  melee_attacks={'basic':
+                                                     [MultiWeapon(name='bite',
+                                                                  damage=["1d8+5"],
+                                                                  damage_type=[piercing],
+                                                                  reach=5,
+                                                                  to_hit=7,
+                                                                  uses_per_turn=1),
+                                                      MultiWeapon(name='claws',
+                                                                  damage=["2d6+6"],
+                                                                  damage_type=[slashing],
+                                                                  reach=5,
+                                                                  to_hit=7,
+                                                                  uses_per_turn=1)]}))
+
+
+    purple_worm = CreatureSpec(name='purple worm', cr=15, ac=18, hp=247, speed=50,
                                size=gargantuan,
                                category=monstrosity,
                                ai=behavior.Standard,
                                attacks=2,
-                               stomach=Stomach(name="purple worm stomach",
-                                               damage_type=[acid],
-                                               damage=['6d6'],
-                                               breakout_dmg=30,
-                                               breakout_dc=21),
                                scores={'str': 28, 'dex': 7, 'con': 22,
                                        'int': 1, 'wis': 8, 'cha': 4},
                                saves={'con': 11, 'wis': 4},
-                               melee_attacks={'basic': [
-                                   MultiWeapon(name='bite', damage=["3d8+9"],
-                                               damage_type=[piercing], reach=10,
-                                               to_hit=9, uses_per_turn=1,
-                                               special=[Swallow(name="swallow",
-                                                                save="dex",
-                                                                dc=19)]),
-                                   MultiWeapon(name='tail stinger', damage=["3d6+9"],
-                                               damage_type=[piercing], reach=10,
-                                               to_hit=9, uses_per_turn=1,
-                                               special=[Poison(name='poison stinger',
-                                                               dc=19,
-                                                               save='con',
-                                                               damage=['12d6'],
-                                                               damage_type=[poison],
-                                                               success=0.5,
-                                                               duration=None)])
-                               ]})
-
-    skeleton = BaseCreature(name='skeleton', cr=0.25, ac=13, hp=13, speed=30,
+                               build=lambda: dict(
+                                   stomach=Stomach(name="purple worm stomach",
+                                                   damage_type=[acid],
+                                                   damage=['6d6'],
+                                                   breakout_dmg=30,
+                                                   breakout_dc=21),
+                                   melee_attacks={'basic': [
+                                       MultiWeapon(name='bite', damage=["3d8+9"],
+                                                   damage_type=[piercing], reach=10,
+                                                   to_hit=9, uses_per_turn=1,
+                                                   special=[Swallow(name="swallow",
+                                                                    save="dex",
+                                                                    dc=19)]),
+                                       MultiWeapon(name='tail stinger', damage=["3d6+9"],
+                                                   damage_type=[piercing], reach=10,
+                                                   to_hit=9, uses_per_turn=1,
+                                                   special=[Poison(name='poison stinger',
+                                                                   dc=19,
+                                                                   save='con',
+                                                                   damage=['12d6'],
+                                                                   damage_type=[poison],
+                                                                   success=0.5,
+                                                                   duration=None)])
+                                   ]}))
+
+    skeleton = CreatureSpec(name='skeleton', cr=0.25, ac=13, hp=13, speed=30,
                             size=medium,
                             category=undead,
                             ai=behavior.Standard,
@@ -612,15 +633,16 @@ class Creatures:
                                     'int': 6, 'wis': 8, 'cha': 5},
                             immunities=[poison, paralysis, fear],
                             vulnerabilities=[bludgeoning],
-                            melee_attacks={'basic':
-                                               [Weapon(name='shortsword',
-                                                       damage=["1d6+2"],
-                                                       damage_type=[slashing],
-                                                       reach=5,
-                                                       to_hit=4)]},
-                            ranged_attacks={'basic': [copy.deepcopy(shortbow)]})
-
-    stone_giant = BaseCreature(name='stone giant', cr=7, ac=17, hp=126, speed=40,
+                            build=lambda: dict(
+                                melee_attacks={'basic':
+                                                   [Weapon(name='shortsword',
+                                                           damage=["1d6+2"],
+                                                           damage_type=[slashing],
+                                                           reach=5,
+                                                           to_hit=4)]},
+                                ranged_attacks={'basic': [copy.deepcopy(shortbow)]}))
+
+    stone_giant = CreatureSpec(name='stone giant', cr=7, ac=17, hp=126, speed=40,
                                size=large,
                                category=giant,
                                ai=behavior.Standard,
@@ -628,10 +650,11 @@ class Creatures:
                                        'int': 10, 'wis': 12, 'cha': 9},
                                saves={'str': 10},
                                attacks=2,
-                               melee_attacks={'basic': [greatclub]},
-                               actions=[])
+                               build=lambda: dict(
+                                   melee_attacks={'basic': [greatclub]},
+                                   actions=[]))
 
-    tarrasque = BaseCreature(name='tarrasque', cr=30, ac=25, hp=676, speed=40,
+    tarrasque = CreatureSpec(name='tarrasque', cr=30, ac=25, hp=676, speed=40,
                              size=gargantuan,
                              category=monstrosity,
                              ai=behavior.Standard,
@@ -640,41 +663,42 @@ class Creatures:
                              # TODO: legendary resistance
                              immunities=[fire, poison, bludgeoning, piercing,
                                          slashing, charm, paralysis, poison, fear],
-                             stomach=Stomach(name="tarrasque stomach",
-                                             damage_type=[acid],
-                                             damage=['16d6'],
-                                             breakout_dmg=60,
-                                             breakout_dc=20),
                              scores={'str': 30, 'dex': 11, 'con': 30,
                                      'int': 3, 'wis': 11, 'cha': 11},
                              saves={'int': 5, 'wis': 9, 'cha': 9},
-                             passives=[FrightfulPresence(name='Frightful Presence',
-                                                         range=120,
-                                                         duration=10,
-                                                         dc=17,
-                                                         save="wis")],
-                             melee_attacks={'basic': [
-                                 MultiWeapon(name='bite', damage=["4d12+10"],
-                                             damage_type=[piercing], reach=10,
-                                             to_hit=19, uses_per_turn=1,
-                                             special=[Swallow(name="swallow",
-                                                              save="str",
-                                                              dc=20)]),
-                                 MultiWeapon(name='claws', damage=["4d8+10"],
-                                             damage_type=[slashing], reach=15,
-                                             to_hit=19, uses_per_turn=2),
-                                 MultiWeapon(name='horns', damage=["4d10+10"],
-                                             damage_type=[piercing], reach=10,
-                                             to_hit=19, uses_per_turn=1),
-                                 MultiWeapon(name='tail', damage=["4d6+10"],
-                                             damage_type=[bludgeoning], reach=20,
-                                             to_hit=19, uses_per_turn=1,
-                                             specials=[Knockdown(name="tail",
-                                             dc=20,
-                                             save='str')])
-                             ]})
-
-    troll = BaseCreature(name='troll', cr=5, ac=15, hp=84, speed=30,
+                             build=lambda: dict(
+                                 stomach=Stomach(name="tarrasque stomach",
+                                                 damage_type=[acid],
+                                                 damage=['16d6'],
+                                                 breakout_dmg=60,
+                                                 breakout_dc=20),
+                                 passives=[FrightfulPresence(name='Frightful Presence',
+                                                             range=120,
+                                                             duration=10,
+                                                             dc=17,
+                                                             save="wis")],
+                                 melee_attacks={'basic': [
+                                     MultiWeapon(name='bite', damage=["4d12+10"],
+                                                 damage_type=[piercing], reach=10,
+                                                 to_hit=19, uses_per_turn=1,
+                                                 special=[Swallow(name="swallow",
+                                                                  save="str",
+                                                                  dc=20)]),
+                                     MultiWeapon(name='claws', damage=["4d8+10"],
+                                                 damage_type=[slashing], reach=15,
+                                                 to_hit=19, uses_per_turn=2),
+                                     MultiWeapon(name='horns', damage=["4d10+10"],
+                                                 damage_type=[piercing], reach=10,
+                                                 to_hit=19, uses_per_turn=1),
+                                     MultiWeapon(name='tail', damage=["4d6+10"],
+                                                 damage_type=[bludgeoning], reach=20,
+                                                 to_hit=19, uses_per_turn=1,
+                                                 specials=[Knockdown(name="tail",
+                                                 dc=20,
+                                                 save='str')])
+                                 ]}))
+
+    troll = CreatureSpec(name='troll', cr=5, ac=15, hp=84, speed=30,
                          size=large,
                          category=giant,
                          ai=behavior.Standard,
@@ -682,19 +706,20 @@ class Creatures:
                          dies_at=-1,
                          scores={'str': 18, 'dex': 13, 'con': 20,
                                  'int': 7, 'wis': 9, 'cha': 7},
-                         melee_attacks={'basic': [troll_bite, troll_claws, troll_claws],
-                                        },
-                         passives=[AvoidDeath(name="Kill it with fire!",
-                                              save='con',
-                                              vulnerabilities=[acid, fire],
-                                              minimum_hp=0,
-                                              min_crit_to_kill=1000,
-                                              penalty=-1000),
-                                   Regeneration(name="Regeneration",
-                                                amount=10,
-                                                type_="initial")])
-
-    wight = BaseCreature(name='wight', cr=3, ac=14, hp=45, speed=30,
+                         build=lambda: dict(
+                             melee_attacks={'basic': [troll_bite, troll_claws, troll_claws],
+                                            },
+                             passives=[AvoidDeath(name="Kill it with fire!",
+                                                  save='con',
+                                                  vulnerabilities=[acid, fire],
+                                                  minimum_hp=0,
+                                                  min_crit_to_kill=1000,
+                                                  penalty=-1000),
+                                       Regeneration(name="Regeneration",
+                                                    amount=10,
+                                                    type_="initial")]))
+
+    wight = CreatureSpec(name='wight', cr=3, ac=14, hp=45, speed=30,
                          size=medium,
                          category=undead,
                          ai=behavior.Standard,
@@ -703,20 +728,21 @@ class Creatures:
                                  'int': 10, 'wis': 13, 'cha': 15},
                          immunities=[poison, paralysis, fear, charm],
                          resistances=[necrotic, bludgeoning, piercing, slashing],
-                         melee_attacks={'basic':
-                                            [wight_longsword,
-                                             wight_longsword,
-                                             wight_life_drain]},
-                         ranged_attacks={'basic':
-                                             [MultiWeapon(name='longbow',
-                                                          damage=["1d8+2"],
-                                                          damage_type=[piercing],
-                                                          ranged=True,
-                                                          ammo=20,
-                                                          reach=150,
-                                                          to_hit=11)]})
-
-    wraith = BaseCreature(name='wraith', cr=5, ac=13, hp=67, speed=60,
+                         build=lambda: dict(
+                             melee_attacks={'basic':
+                                                [wight_longsword,
+                                                 wight_longsword,
+                                                 wight_life_drain]},
+                             ranged_attacks={'basic':
+                                                 [MultiWeapon(name='longbow',
+                                                              damage=["1d8+2"],
+                                                              damage_type=[piercing],
+                                                              ranged=True,
+                                                              ammo=20,
+                                                              reach=150,
+                                                              to_hit=11)]}))
+
+    wraith = CreatureSpec(name='wraith', cr=5, ac=13, hp=67, speed=60,
                           size=medium,
                           category=undead,
                           ai=behavior.Standard,
@@ -727,30 +753,31 @@ class Creatures:
                                       restrain, fear],
                           resistances=[acid, cold, fire, lightning, thunder,
                                        bludgeoning, piercing, slashing],
-                          melee_attacks={'basic':
-                                             [Weapon(name='life drain',
-                                                     damage=["4d8+3"],
-                                                     damage_type=[necrotic],
-                                                     reach=5, to_hit=6,
-                                                     special=[DamageMaxHP(name='life drain',
-                                                                          dc=14,
-                                                                          save='con')]
-                                                     )]})
-
-    wyvern = BaseCreature(name='wyvern', cr=6, ac=13, hp=110, speed=80,
+                          build=lambda: dict(
+                              melee_attacks={'basic':
+                                                 [Weapon(name='life drain',
+                                                         damage=["4d8+3"],
+                                                         damage_type=[necrotic],
+                                                         reach=5, to_hit=6,
+                                                         special=[DamageMaxHP(name='life drain',
+                                                                              dc=14,
+                                                                              save='con')]
+                                                         )]}))
+
+    wyvern = CreatureSpec(name='wyvern', cr=6, ac=13, hp=110, speed=80,
                           size=large,
                           category=dragon,
                           ai=behavior.Standard,
                           attacks=2,
                           scores={'str': 19, 'dex': 10, 'con': 16,
                                   'int': 5, 'wis': 12, 'cha': 6},
-                          melee_attacks={'basic':
-                                             [wyvern_bite,
-                                              wyvern_claws,
-                                              wyvern_stinger]}
-                          )
+                          build=lambda: dict(
+                              melee_attacks={'basic':
+                                                 [wyvern_bite,
+                                                  wyvern_claws,
+                                                  wyvern_stinger]}))
 
-    zombie = BaseCreature(name='zombie', cr=0.25, ac=8, hp=22, speed=20,
+    zombie = CreatureSpec(name='zombie', cr=0.25, ac=8, hp=22, speed=20,
                           ai=behavior.Standard,
                           size=medium,
                           category=undead,
@@ -758,17 +785,18 @@ class Creatures:
                                   'int': 3, 'wis': 6, 'cha': 5},
                           saves={'wis': 0},
                           immunities=[poison, paralysis, fear],
-                          melee_attacks={'basic':
-                                             [Weapon(name='slam',
-                                                     damage=["1d6+1"],
-                                                     damage_type=[bludgeoning],
-                                                     reach=5,
-                                                     to_hit=3)]
-                                         },
-                          passives=[AvoidDeath(name="Undead Fortitude",
-                                               save='con',
-                                               vulnerabilities=[radiant],
-                                               minimum_hp=1)])
+                          build=lambda: dict(
+                              melee_attacks={'basic':
+                                                 [Weapon(name='slam',
+                                                         damage=["1d6+1"],
+                                                         damage_type=[bludgeoning],
+                                                         reach=5,
+                                                         to_hit=3)]
+                                             },
+                              passives=[AvoidDeath(name="Undead Fortitude",
+                                                   save='con',
+                                                   vulnerabilities=[radiant],
+                                                   minimum_hp=1)]))
 
 """ ================================================================ """
 """ ================== PLAYER CHARACTERS =========================== """
@@ -784,7 +812,7 @@ ognon_kirves = Weapon(name='greataxe +2',
 
 class PlayerCharacters:
 
-    ogno = BaseCreature(name='Ogno Pisam', cr=4, ac=18, hp=120, speed=40,
+    ogno = CreatureSpec(name='Ogno Pisam', cr=4, ac=18, hp=120, speed=40,
                         size=medium,
                         ai=behavior.Standard,
                         category=humanoid,
@@ -794,4 +822,5 @@ class PlayerCharacters:
                                 'int': 12, 'wis': 14, 'cha': 10},
                         saves={'str': 8, 'dex': 3, 'con': 7,
                                'int': 1, 'wis': 1, 'cha': 0},
-                        melee_attacks={'basic': [ognon_kirves]})
+                        build=lambda: dict(
+                            melee_attacks={'basic': [ognon_kirves]}))
@@ -1,6 +1,98 @@
+import math
 import random
 import re
 
+""" Random stream of all dice rolls and weapon draws. Encounters swap
+in per-creature streams for paired comparisons, see main.compare() """
+STREAM = random
+
+
+class AntitheticRandom(random.Random):
+
+    """ Random stream that mirrors random.Random seeded the same: where
+    that rolls x with randint(a, b), this rolls a + b - x, and choice()
+    picks from the other end """
+
+    def _randbelow(self, n):
+        return n - 1 - super()._randbelow(n)
+
+    def random(self):
+        return 1.0 - super().random()
+
+
+class Tilt:
+
+    """ Tilted d20 of attack rolls for importance sampling. Rolls are
+    grouped into misses, hits and crits, and the chances of hits and
+    crits are raised (´theta´ > 0) or lowered (´theta´ < 0) by factors
+    exp(theta) and exp(2 * theta) before normalising. Rolls within a
+    group keep equal chances, since they have the same outcome, so the
+    likelihood ratios vary only as much as the outcomes do.
+
+    If ´active´ is False, rolls are fair. In either case ´log_ratio´
+    sums the log likelihood ratios of tilted to fair rolls made so
+    far, see main.estimate_risk()
+
+    :param theta              tilt per step from miss to hit to crit
+
+    :type theta               float """
+
+    def __init__(self, theta):
+        self.theta = theta
+        self.groups = {}        # Lowest roll that hits -> groups
+        self.active = True
+        self.log_ratio = 0.0
+
+    def reset(self, active=True):
+        self.active = active
+        self.log_ratio = 0.0
+
+    def get_groups(self, threshold):
+        """ Return groups of rolls as (cumulative fair chance,
+        cumulative tilted chance, log likelihood ratio, lowest roll,
+        number of rolls) """
+        groups = self.groups.get(threshold)
+        if groups is None:
+            threshold = min(max(threshold, 2), 20)
+            rolls = [(1, threshold - 1), (threshold, 20 - threshold),
+                     (20, 1)]
+            weights = [n / 20 * math.exp(self.theta * k)
+                       for k, (_, n) in enumerate(rolls)]
+            total = sum(weights)
+            groups = []
+            fair = tilted = 0.0
+            for (lowest, n), weight in zip(rolls, weights):
+                if n:
+                    fair += n / 20
+                    tilted += weight / total
+                    groups.append((fair, tilted,
+                                   math.log(weight / total / (n / 20)),
+                                   lowest, n))
+            self.groups[threshold] = groups
+        return groups
+
+    def roll_d20(self, threshold):
+        groups = self.get_groups(threshold)
+        u = STREAM.random()
+        index = 1 if self.active else 0
+        for group in groups:
+            if u < group[index]:
+                break
+        _, _, log_ratio, lowest, n = group
+        self.log_ratio += log_ratio
+        return lowest + min(int(STREAM.random() * n), n - 1)
+
+    def roll(self, threshold, advantage=0):
+        """ Roll a d20 with advantage (1) or disadvantage (-1)
+
+        :param threshold          lowest roll that hits """
+        if advantage == -1:
+            return min(self.roll_d20(threshold), self.roll_d20(threshold))
+        elif advantage == 1:
+            return max(self.roll_d20(threshold), self.roll_d20(threshold))
+        return self.roll_d20(threshold)
+
+
 def roll(times, sides, bonus, advantage=0):
 
     if advantage == -1:
@@ -10,7 +102,7 @@ def roll(times, sides, bonus, advantage=0):
         #print('advantage')
         return max(roll(times, sides, bonus), roll(times, sides, bonus))
     else:
-        return sum([random.randint(1, sides) for n in range(0, times)]) + bonus
+        return sum([STREAM.randint(1, sides) for n in range(0, times)]) + bonus
 
 #def roll_advantage(times, sides, bonus):
 #    return max(roll(times, sides, bonus), roll(times, sides, bonus))
@@ -19,6 +111,10 @@ def roll(times, sides, bonus, advantage=0):
 #    return min(roll(times, sides, bonus), roll(times, sides, bonus))
 
 
+""" Parsed damage expressions, e.g. ´2d6+3´ -> [2, 6, 3] """
+PARSED = {}
+
+
 def parse_damage(damage):
 
     if not damage:
@@ -28,8 +124,10 @@ def parse_damage(damage):
         if isinstance(damage,str):
             damage = [damage]
         for dmg in damage:
-            if '+' in dmg:
-                yield [int(i) for i in re.split("d|\+", dmg)]
-            else:
-                yield [int(i) for i in dmg.split('d') + [0]]
+            if dmg not in PARSED:
+                if '+' in dmg:
+                    PARSED[dmg] = [int(i) for i in re.split("d|\+", dmg)]
+                else:
+                    PARSED[dmg] = [int(i) for i in dmg.split('d') + [0]]
+            yield list(PARSED[dmg])
     return list(parse(damage))
\ No newline at end of file
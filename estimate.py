@@ -0,0 +1,353 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import collections
+import math
+import oracle
+from abilities import AvoidDeath, Regeneration
+
+""" Quick estimates of encounters for screening.
+
+quick_estimate(team_a, team_b) predicts the win probability of team A
+and the number of rounds without simulating, in the time it takes to
+simulate a single round:
+
+    quick_estimate([npc.zombie]*30, [npc.purple_worm])
+
+Identical creatures are grouped, and the fight is played as a race of
+expected damage, half a round at a time (an action-economy form of
+Lanchester's square law). Each living creature deals its exact damage
+per round (oracle.dpr()) to the weakest living enemy, and kills reduce
+the damage the enemy deals in later turns. Damage beyond a kill
+carries over to the next enemy, less the mean overshoot of killing
+blows (see oracle.hits_to_kill()). At most eight creatures can attack
+one enemy in melee, which keeps large melee teams from focusing their
+whole damage on one target; the rest shoot if they can. Effective HP
+includes the hits needed to get past AvoidDeath (e.g. Undead
+Fortitude), and regeneration is subtracted from incoming damage.
+
+The fight is played once with each team acting first and the results
+are weighted by the chance that the team wins the initiative. The win
+probability is a normal approximation of how far the loser was from
+turning the fight, given the variance of the damage both teams dealt
+and the error of the model itself.
+
+Movement, reach, conditions and most abilities are not modelled; run
+calibrate() (``python estimate.py``) to see how the estimates compare
+with full simulations of the canonical benchmark scenarios. """
+
+
+""" Estimated win probability of team A and rounds of the fight """
+Estimate = collections.namedtuple('Estimate', ['win_a', 'rounds'])
+
+""" Fights are interrupted at this round, see Encounter.play_round() """
+MAX_ROUNDS = 100
+
+""" Number of creatures that can surround one in melee """
+ADJACENT = 8
+
+""" Deviation of the model from full simulations, as a share of the
+winning team's effective HP; fitted to the benchmark scenarios """
+MODEL_ERROR = 0.3
+
+""" Upper limit of the chance that AvoidDeath saves a creature, so that
+creatures that can only be killed in special ways (e.g. trolls without
+fire) are very tough instead of immortal """
+MAX_AVOID = 0.95
+
+
+def phi(x):
+    """ Standard normal cumulative distribution """
+    return 0.5 * (1 + math.erf(x / math.sqrt(2)))
+
+
+def group(team):
+    """ Return identical creatures of a team as [creature, count] in
+    order of first appearance """
+    counts = {}
+    for creature in team:
+        if id(creature) in counts:
+            counts[id(creature)][1] += 1
+        else:
+            counts[id(creature)] = [creature, 1]
+    return list(counts.values())
+
+
+def get_hits(creature, enemies):
+    """ Return the mean damage of a hit by enemies on a creature and the
+    share of crits and of each damage type in those hits
+
+    :type enemies             [[BaseCreature, int], ...]
+    :rtype                    (float, float, {str: float}) """
+    hits = damage = crits = 0.0
+    types = {}
+    for enemy, count in enemies:
+        weapons = oracle.get_weapons(enemy)
+        for weapon in weapons:
+            odds = oracle.attack(weapon, creature)
+            weight = count * enemy.attacks / len(weapons)
+            hits += weight * odds.hit
+            crits += weight * odds.crit
+            damage += weight * odds.mean
+            for type_ in weapon.damage_type:
+                types[type_] = types.get(type_, 0.0) + weight * odds.hit
+    if not hits:
+        return 0.0, 0.0, {}
+    return damage / hits, crits / hits, \
+        {t: share / hits for t, share in types.items()}
+
+
+def get_ehp(creature, enemies):
+    """ Return effective HP of a creature against enemies. Each killing
+    blow that AvoidDeath survives takes another hit to finish
+
+    :type enemies             [[BaseCreature, int], ...]
+    :rtype                    float """
+    ehp = creature.hp - creature.dies_at
+    passives = [p for p in creature.passives if isinstance(p, AvoidDeath)]
+    if not passives:
+        return ehp
+    hit, crit, types = get_hits(creature, enemies)
+    for passive in passives:
+        bypass = sum(share for t, share in types.items()
+                     if t in passive.vulnerabilities)
+        if passive.min_crit < 2:
+            bypass += crit
+        dc = int(round(hit)) + passive.penalty
+        avoid = (1 - min(bypass, 1)) * oracle.save(creature, passive.save, dc)
+        avoid = min(avoid, MAX_AVOID)
+        ehp += avoid / (1 - avoid) * max(hit, 1.0)
+    return ehp
+
+
+def get_dpr(attacker, defender, ehp, ranged=False):
+    """ Return mean and variance of damage per round and the mean damage
+    of killing blows beyond what it takes to kill the defender, which
+    is lost. The latter follows from the hits it takes to kill them,
+    see oracle.hits_to_kill()
+
+    :rtype                    (float, float, float) """
+    weapons = oracle.get_weapons(attacker, ranged)
+    if not weapons:
+        return 0.0, 0.0, 0.0
+    overshoot = hits = 0.0
+    for weapon in weapons:
+        odds = oracle.attack(weapon, defender)
+        kill = oracle.hits_to_kill(weapon, defender, math.ceil(ehp))
+        if odds.hit and kill < math.inf:
+            overshoot += odds.hit * (kill * odds.mean / odds.hit - ehp)
+            hits += odds.hit
+    mean, variance = oracle.dpr(attacker, defender, ranged=ranged)
+    return mean, variance, overshoot / hits if hits else 0.0
+
+
+def get_regeneration(creature):
+    return sum(p.amount for p in creature.passives
+               if isinstance(p, Regeneration))
+
+
+class Side:
+
+    """ Team in the fluid fight: living creatures by group and the
+    remaining effective HP of the weakest one
+
+    :param groups             [[creature, count], ...]
+    :param enemies            groups of the enemy team """
+
+    def __init__(self, groups, enemies):
+        self.groups = sorted(([c, n, get_ehp(c, enemies),
+                               get_regeneration(c)] for c, n in groups),
+                             key=lambda g: g[2])
+        self.front = 0                   # Index of the weakest group
+        self.alive = [n for _, n, _, _ in self.groups]
+        self.hp = self.groups[0][2] if self.groups else 0.0
+        self.total = sum(n * ehp for _, n, ehp, _ in self.groups)
+        self.taken = 0.0                 # Damage taken less regeneration
+        self.variance = 0.0              # Variance of damage dealt
+
+    @property
+    def is_alive(self):
+        return self.front < len(self.groups)
+
+    @property
+    def target(self):
+        return self.groups[self.front][0]
+
+    def get_dpr(self, enemy, fraction, memo):
+        """ Return mean and variance of damage the living creatures deal
+        to the weakest enemy in a fraction of a round, and the mean
+        damage lost with each kill. Only so many creatures fit around
+        the enemies to attack them in melee; the rest use ranged weapons
+        if they have any """
+        ehp = enemy.groups[enemy.front][2]
+        mean = variance = overshoot = 0.0
+        crowd = []
+        for (creature, _, _, _), alive in zip(self.groups, self.alive):
+            if alive:
+                key = (id(creature), id(enemy), enemy.front)
+                if key not in memo:
+                    memo[key] = (get_dpr(creature, enemy.target, ehp),
+                                 get_dpr(creature, enemy.target, ehp, True)
+                                 if creature.ranged_attacks
+                                 else (0.0, 0.0, 0.0))
+                melee, ranged = memo[key]
+                if creature.melee_attacks:
+                    crowd.append((alive, melee, ranged))
+                else:
+                    crowd.append((0, melee, melee))
+
+        room = ADJACENT * sum(enemy.alive)
+        for alive, melee, ranged in crowd:
+            engaged = min(alive, room)
+            room -= engaged
+            for count, (m, v, o) in ((engaged, melee),
+                                     (alive - engaged, ranged)):
+                mean += count * m
+                variance += count * v
+                overshoot += count * m * o
+        if mean:
+            overshoot /= mean
+        return mean * fraction, variance * fraction, overshoot
+
+    def take(self, damage, fraction, overshoot=0.0):
+        """ Take damage in order from the weakest creature up, less what
+        the damaged creature regenerates in a fraction of a round.
+        Damage beyond a kill carries over to the next creature, less
+        the overshoot of the killing blow """
+        if self.is_alive and self.hp < self.groups[self.front][2]:
+            damage -= self.groups[self.front][3] * fraction
+        while damage > 0 and self.is_alive:
+            if damage < self.hp:
+                self.hp -= damage
+                self.taken += damage
+                return
+            damage -= self.hp + overshoot
+            self.taken += self.hp
+            self.alive[self.front] -= 1
+            if not self.alive[self.front]:
+                self.front += 1
+            if self.is_alive:
+                self.hp = self.groups[self.front][2]
+
+
+def race(a, b, steps=2):
+    """ Play the fluid fight with ´a´ acting first each round. Return
+    the winner, the loser and the number of rounds
+
+    :param steps              fractions of a round played at a time;
+                              within a step ´a´ acts first
+    :rtype                    (Side, Side, float) """
+    memo = {}
+    t = 0.0
+    while a.is_alive and b.is_alive and t < MAX_ROUNDS:
+        t += 1 / steps
+        for attacker, defender in ((a, b), (b, a)):
+            if attacker.is_alive and defender.is_alive:
+                mean, variance, overshoot = attacker.get_dpr(
+                    defender, 1 / steps, memo)
+                attacker.variance += variance
+                defender.take(mean, 1 / steps, overshoot)
+    if a.is_alive and b.is_alive:
+        return None, None, t
+    return (a, b, t) if a.is_alive else (b, a, t)
+
+
+def get_win_chance(winner, loser):
+    """ Return the chance that the winner of the fluid fight wins: the
+    loser would have needed to deal the rest of the winner's effective
+    HP in the time the winner needed, give or take the deviation of
+    the winner's damage and the model error """
+    margin = winner.total - winner.taken
+    ratio = winner.taken / loser.taken if loser.taken else 0.0
+    deviation = math.sqrt(loser.variance + ratio ** 2 * winner.variance
+                          + (MODEL_ERROR * winner.total) ** 2)
+    if deviation == 0:
+        return 1.0 if margin > 0 else 0.5
+    return phi(margin / deviation)
+
+
+def get_initiative(groups_a, groups_b):
+    """ Return the chance that a creature of team A rolls a higher
+    initiative than a creature of team B, for mean dexterity modifiers
+    of the teams """
+    def get_mean(groups):
+        return sum(n * c.get_modifier('dex') for c, n in groups) \
+            / sum(n for _, n in groups)
+    difference = round(get_mean(groups_a) - get_mean(groups_b))
+    wins = sum(1 for x in range(1, 21) for y in range(1, 21)
+               if x + difference > y)
+    ties = sum(1 for x in range(1, 21) for y in range(1, 21)
+               if x + difference == y)
+    return (wins + ties / 2) / 400
+
+
+def quick_estimate(team_a, team_b):
+    """ Estimate the win probability of team A and the number of rounds
+    of the fight, see the module description
+
+    :type team_a              [BaseCreature, ...]
+    :type team_b              [BaseCreature, ...]
+    :rtype                    Estimate """
+    if not team_a or not team_b:
+        return Estimate(float(bool(team_a)), 0.0)
+    groups_a, groups_b = group(team_a), group(team_b)
+    first = get_initiative(groups_a, groups_b)
+
+    win_a = rounds = 0.0
+    for weight, a_first in ((first, True), (1 - first, False)):
+        a = Side(groups_a, groups_b)
+        b = Side(groups_b, groups_a)
+        winner, loser, t = race(a, b) if a_first else race(b, a)
+        if winner is None:
+            chance = 0.5
+        else:
+            chance = get_win_chance(winner, loser)
+            if winner is b:
+                chance = 1 - chance
+        win_a += weight * chance
+        rounds += weight * math.ceil(t)
+    return Estimate(win_a, rounds)
+
+
+def calibrate(names=None, matches=None, seed=0):
+    """ Compare quick estimates with full simulations of the benchmark
+    scenarios and print win rates of team A and mean rounds. Estimates
+    outside the 95% confidence interval of the simulated win rate are
+    flagged
+
+    :param names              scenario names, by default all that are
+                              not batched
+    :param matches            matches per scenario instead of the
+                              scenario's own
+    :param seed               seed of the simulations
+    :rtype                    {str: (Estimate, SimulationResult)} """
+    import time
+    import world
+    from benchmark import SCENARIOS
+    from main import simulate
+
+    names = names or [n for n in SCENARIOS if not n.endswith('-batch')]
+    report = {}
+    print('%-12s %8s %8s %15s %8s %8s %10s'
+          % ('scenario', 'estimate', 'sim.', '95% CI', 'rounds', 'sim.',
+             'time'))
+    for name in names:
+        kwargs = dict(SCENARIOS[name])
+        if matches is not None:
+            kwargs['matches'] = matches
+        start = time.perf_counter()
+        estimate = quick_estimate(kwargs['team_a'], kwargs['team_b'])
+        elapsed = time.perf_counter() - start
+        result = simulate(quiet=True, seed=seed, **kwargs)
+        low, high = result.confidence_interval(world.TEAM_A)
+        rate = result.win_rate(world.TEAM_A)
+        print('%-12s %8.2f %8.2f %7.2f-%-7.2f %8.1f %8.1f %8.2fms %s'
+              % (name, estimate.win_a, rate, low, high, estimate.rounds,
+                 result.mean_rounds(), elapsed * 1000,
+                 '' if low <= estimate.win_a <= high else '!'))
+        report[name] = (estimate, result)
+    return report
+
+
+if __name__ == "__main__":
+    calibrate()
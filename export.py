@@ -0,0 +1,256 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import array
+import ast
+import csv
+import json
+import os
+import sys
+
+""" Streaming export of per-match results.
+
+Usage:
+
+    with ResultWriter('results') as writer:
+        simulate(matches=10**6, team_a=[npc.troll], team_b=[pc.ogno],
+                 export=writer)
+
+    columns = load('results')           # needs NumPy
+    columns['winner'].mean()
+
+Each match is one record: its seed, winner, number of rounds and the
+stats of every creature. Records are buffered in fixed-size chunks and
+appended to disk, so memory does not grow with the number of matches.
+
+Formats:
+
+    npy       directory with one NumPy .npy file per column and a
+              ´columns.json´ index. Written without NumPy; the files
+              can be memory-mapped with numpy.load(mmap_mode='r').
+              Files are only open while a chunk is written to them,
+              so battles with thousands of creature columns do not
+              run out of file handles.
+    parquet   Parquet file with one row group per chunk. Needs pyarrow;
+              ResultWriter raises ImportError without it instead of
+              falling back to another format.
+    csv       plain CSV file, one row per match.
+
+Buffered records are written by flush(), which simulate() calls at the
+end. Parquet and csv files are only complete once the writer has been
+closed, so use it in a ´with´ block or call close(). """
+
+""" Creature stats exported per match and their array typecodes """
+STATS = (('turns_alive', 'q'), ('damage_dealt', 'd'), ('kills', 'q'),
+         ('hits', 'q'), ('misses', 'q'))
+
+""" Array typecodes as NumPy little-endian dtypes """
+DTYPES = {'q': '<i8', 'd': '<f8'}
+
+""" Winner codes """
+WINNERS = ('No-one',)
+
+""" Size of the .npy header; big enough for any one-dimensional shape """
+NPY_HEADER = 128
+
+
+def get_columns(encounter):
+    """ Return (name, typecode) of columns of an encounter. Creature
+    columns are named ´<party>/<creature>/<stat>´ """
+    columns = [('seed', 'q'), ('winner', 'q'), ('rounds', 'q')]
+    for party in (encounter.party1, encounter.party2):
+        for name in sorted(c.name for c in party.members):
+            for stat, typecode in STATS:
+                columns.append(("%s/%s/%s" % (party.name, name, stat),
+                                typecode))
+    return columns
+
+
+def get_record(encounter, seed, winner):
+    """ Return values of a match in column order """
+    winners = (WINNERS[0], encounter.party1.name, encounter.party2.name)
+    record = [seed if seed is not None else -1, winners.index(winner),
+              encounter.rounds]
+    for party in (encounter.party1, encounter.party2):
+        for creature in sorted(party.members, key=lambda c: c.name):
+            for stat, _ in STATS:
+                record.append(getattr(creature, stat))
+    return record
+
+
+def npy_header(dtype, length):
+    """ Return version 1.0 .npy header of a one-dimensional array """
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%i,), }" \
+             % (dtype, length)
+    header = header.ljust(NPY_HEADER - 10 - 1) + '\n'
+    return b'\x93NUMPY\x01\x00' \
+           + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+
+class ResultWriter:
+
+    """ Writes per-match records to disk in chunks
+
+    :param path               output directory (npy) or file
+    :param format             ´npy´, ´parquet´ or ´csv´
+    :param chunk_size         number of matches buffered between writes
+
+    :type path                str
+    :type format              str
+    :type chunk_size          int """
+
+    FORMATS = ('npy', 'parquet', 'csv')
+
+    def __init__(self, path, format='npy', chunk_size=65536):
+        if format not in self.FORMATS:
+            raise ValueError("Unknown format: %s" % format)
+        if format == 'parquet':
+            try:
+                import pyarrow
+            except ImportError:
+                raise ImportError("Parquet export needs pyarrow; "
+                                  "use format='npy' or 'csv' instead")
+        self.path = path
+        self.format = format
+        self.chunk_size = chunk_size
+        self.columns = None
+        self.buffers = None
+        self.length = 0
+        self.files = None       # Names of the npy column files
+        self.parquet = None
+        self.csv = None
+
+    def __repr__(self):
+        return "ResultWriter(%s, %s, %i matches)" % (self.path, self.format,
+                                                     self.length)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record(self, encounter, seed, winner):
+        """ Add a finished match
+
+        :type encounter           main.Encounter
+        :type seed                int or None
+        :type winner              str """
+        if self.columns is None:
+            self.open(encounter)
+        for buffer, value in zip(self.buffers,
+                                 get_record(encounter, seed, winner)):
+            buffer.append(value)
+        if len(self.buffers[0]) >= self.chunk_size:
+            self.flush()
+
+    def open(self, encounter):
+        """ Create output files for the columns of an encounter """
+        self.columns = get_columns(encounter)
+        self.buffers = [array.array(t) for _, t in self.columns]
+
+        if self.format == 'npy':
+            os.makedirs(self.path, exist_ok=True)
+            index = {'winners': [WINNERS[0], encounter.party1.name,
+                                 encounter.party2.name],
+                     'columns': []}
+            files = []
+            for i, (name, typecode) in enumerate(self.columns):
+                filename = "%04i.npy" % i
+                index['columns'].append({'name': name, 'file': filename,
+                                         'dtype': DTYPES[typecode]})
+                files.append(os.path.join(self.path, filename))
+                with open(files[-1], 'wb') as f:
+                    f.write(npy_header(DTYPES[typecode], 0))
+            self.files = files
+            with open(os.path.join(self.path, 'columns.json'), 'w') as f:
+                json.dump(index, f, indent=1)
+
+        elif self.format == 'csv':
+            self.csv = open(self.path, 'w', newline='')
+            csv.writer(self.csv).writerow([n for n, _ in self.columns])
+
+    def flush(self):
+        """ Write buffered records to disk """
+        if not self.buffers or not len(self.buffers[0]):
+            return
+        count = len(self.buffers[0])
+
+        if self.format == 'npy':
+            for filename, (_, typecode), buffer in zip(
+                    self.files, self.columns, self.buffers):
+                if sys.byteorder != 'little':
+                    buffer.byteswap()
+                with open(filename, 'r+b') as f:
+                    f.seek(0, os.SEEK_END)
+                    f.write(buffer.tobytes())
+                    f.seek(0)
+                    f.write(npy_header(DTYPES[typecode],
+                                       self.length + count))
+
+        elif self.format == 'parquet':
+            import pyarrow
+            import pyarrow.parquet
+            table = pyarrow.table({n: b.tolist() for (n, _), b
+                                   in zip(self.columns, self.buffers)})
+            if self.parquet is None:
+                self.parquet = pyarrow.parquet.ParquetWriter(self.path,
+                                                             table.schema)
+            self.parquet.write_table(table)
+
+        else:
+            csv.writer(self.csv).writerows(zip(*self.buffers))
+            self.csv.flush()
+
+        self.length += count
+        self.buffers = [array.array(t) for _, t in self.columns]
+
+    def close(self):
+        """ Flush remaining records and close the output """
+        self.flush()
+        if self.parquet is not None:
+            self.parquet.close()
+            self.parquet = None
+        if self.csv is not None:
+            self.csv.close()
+            self.csv = None
+
+
+def load(path, mmap=True):
+    """ Return columns written in ´npy´ format as a dict of NumPy
+    arrays, memory-mapped by default. Winners are coded as indices of
+    ´winners´ in ´columns.json´
+
+    :type path                str
+    :type mmap                bool
+    :rtype                    {str: numpy.ndarray} """
+    import numpy
+    with open(os.path.join(path, 'columns.json')) as f:
+        index = json.load(f)
+    return {c['name']: numpy.load(os.path.join(path, c['file']),
+                                  mmap_mode='r' if mmap else None)
+            for c in index['columns']}
+
+
+def read_column(path, name):
+    """ Return a column written in ´npy´ format as a Python array,
+    without NumPy
+
+    :type path                str
+    :type name                str
+    :rtype                    array.array """
+    with open(os.path.join(path, 'columns.json')) as f:
+        index = json.load(f)
+    column = [c for c in index['columns'] if c['name'] == name]
+    if not column:
+        raise KeyError(name)
+    typecodes = {v: k for k, v in DTYPES.items()}
+    with open(os.path.join(path, column[0]['file']), 'rb') as f:
+        f.seek(8)
+        header = f.read(int.from_bytes(f.read(2), 'little'))
+        length = ast.literal_eval(header.decode('latin1'))['shape'][0]
+        values = array.array(typecodes[column[0]['dtype']])
+        values.fromfile(f, length)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
@@ -1,11 +1,18 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-import copy
+import behavior
+import dice
+import gc
+import math
 import messages
+import random
+import recorder
+import registry
+import scheduler
 import world
-from collections import Counter, defaultdict
 from creature import Party
+from results import Comparison, RiskEstimate, SimulationResult
 from definitions import Creatures as npc
 from definitions import PlayerCharacters as pc
 
@@ -31,55 +38,232 @@ DIV = '='*64
 
 class Encounter:
 
-    def __init__(self, party1, party2):
+    """ Fight between two parties. Fights that cannot end are called a
+    draw early, and the reason is kept in ´draw_reason´:
+
+        'no damage'     neither party can kill all of the other, e.g.
+                        everyone is immune to the other party's weapons
+        'no contact'    no one has attacked for STALEMATE_ROUNDS rounds,
+                        e.g. the parties cannot reach each other
+        'no progress'   neither party has dropped below its lowest total
+                        HP for STALEMATE_ROUNDS rounds, e.g. damage is
+                        healed or regenerated as fast as it is dealt
+        'round cap'     the fight lasted MAX_ROUNDS rounds """
+
+    STALEMATE_ROUNDS = 10
+    MAX_ROUNDS = 100
+
+    def __init__(self, party1, party2, telemetry=None, policy=None):
         self.party1 = party1
         self.party2 = party2
+        self.telemetry = telemetry
+        self.policy = policy
+        self.round = 1
+        self.rounds = 0
+        self.map = None
         self.order_of_action = party1.combine_and_sort_by(party2, "initiative")
+        self.wheel = None
+        self.draw_reason = None
+        self.turn = 0           # Index of the next creature to act
 
-    def fight(self):
+        """ Initiative slots key the scheduled condition checks """
+        for slot, creature in enumerate(self.order_of_action):
+            creature.slot = slot
 
-        DIVIDER = "=" * 70
+    def fight(self):
 
         """ Simulate combat encounter until either of the parties has
         been killed """
 
-        messages.IO.printmsg(self.party1.__repr__(), 1)
-        messages.IO.printmsg(self.party2.__repr__(), 1)
+        self.start()
+        return self.resume()
+
+    def resume(self):
+        """ Play the rest of a started fight, e.g. one restored from a
+        snapshot, and return the winner """
+        while self.play_round():
+            pass
+        return self.finish()
+
+    def start(self):
+        """ Begin the fight """
+        if messages.VERBOSE_LEVEL >= 1:
+            messages.IO.printmsg(self.party1.__repr__(), 1)
+            messages.IO.printmsg(self.party2.__repr__(), 1)
 
         world.print_coords()
 
-        round_ = 1
-        while self.party1.is_alive and self.party2.is_alive:
+        if self.telemetry is not None:
+            self.telemetry.begin(self)
+
+        self.round = 1
+        self.turn = 0
+        scheduler.Wheel.reset()
+        for creature in self.order_of_action:
+            creature.timers.clear()
+
+            """ Abilities used in an earlier encounter of a campaign
+            keep recharging """
+            if not all(a.available for a in creature.actions):
+                creature.schedule('recharge')
+
+        """ Progress of the fight for stalemate detection """
+        self.draw_reason = None
+        self.lowest_hp = self.get_hp()
+        self.attacks = self.count_attacks()
+        self.last_damage = self.last_attack = 1
+        self.living = None
+        self.can_kill = {}      # (attacker, target) name -> bool
+
+    def play_round(self, plan_targets=True, until=None):
+        """ Play one round. Return False if the fight is over
+
+        :param plan_targets       let the batched policy choose targets
+                                  first; False if it has already been
+                                  done for a batch of matches
+        :param until              stop before the creature in this
+                                  initiative slot acts, e.g. to take a
+                                  snapshot mid-round; the next call
+                                  plays the rest of the round """
+
+        DIVIDER = "=" * 70
+
+        if not (self.party1.is_alive and self.party2.is_alive):
+            return False
+
+        order = self.order_of_action
+        if self.turn == 0:
             """ Reset path maps """
             world.Map.reset_paths()
 
+            """ Choose targets of both parties in one batch """
+            if self.policy is not None and plan_targets:
+                behavior.plan_targets(self.policy,
+                                      [(self.party1, self.party2)])
+
             """ Begin round """
             turn = 1
-            messages.IO.printmsg("\nROUND %i %s\n" % (round_, DIVIDER), level=1, indent=False)
-            for creature in self.order_of_action:
-                messages.IO.turn = "%i (%s)" % (turn, creature.party)
-                """ Get allies and enemies for the creature """
-                allies, enemies = self.party1.get_teams(self.party2, creature)
-
-                """ Allow only living creatures to act """
-                if self.party1.is_alive and self.party2.is_alive:
+            messages.IO.printmsg("\nROUND %i %s\n" % (self.round, DIVIDER), level=1, indent=False)
+        else:
+            turn = 1 + sum(1 for c in order[:self.turn] if not c.is_dead)
+        if self.turn or until is not None:
+            order = order[self.turn:until]
+        scheduler.Wheel.round = self.round
+        scheduler.Wheel.encounter = self
+        for creature in order:
+            scheduler.Wheel.slot = creature.slot
+            messages.IO.turn = "%i (%s)" % (turn, creature.party)
+            """ Get allies and enemies for the creature """
+            allies, enemies = self.party1.get_teams(self.party2, creature)
+
+            """ Allow only living creatures to act """
+            if self.party1.is_alive and self.party2.is_alive:
+                if creature.stream is not None:
+                    dice.STREAM = creature.stream
+                    creature.act(allies, enemies)
+                    dice.STREAM = random
+                else:
                     creature.act(allies, enemies)
 
-                """ Count turns only for living creatures """
-                if not creature.is_dead:
-                    turn += 1
-            world.print_coords()
-            round_ += 1
+            """ Count turns only for living creatures """
+            if not creature.is_dead:
+                turn += 1
 
-            """ Interrupt fight at 100 rounds (e.g. if two creatures
-            are left and they cannot kill each other """
-            if round_ == 100:
-                break
+        if until is not None and until < len(self.order_of_action) \
+                and self.party1.is_alive and self.party2.is_alive:
+            self.turn = until
+            return True
+        self.turn = 0
+        world.print_coords()
+        if self.telemetry is not None:
+            self.telemetry.record(self, self.round)
+        self.round += 1
+
+        """ Interrupt fight if it cannot end """
+        return not self.is_stalemate()
+
+    def set_streams(self, seed, antithetic=False):
+        """ Give each creature its own random stream, seeded by the match
+        seed and its place in its party, so that the creature rolls the
+        same dice in variants of the match
+
+        :type seed                int
+        :param antithetic         use mirrored streams """
+        Stream = dice.AntitheticRandom if antithetic else random.Random
+        for party in (self.party1, self.party2):
+            for i, creature in enumerate(party.members):
+                creature.stream = Stream("%i:%s:%i" % (seed, party.name, i))
+
+    def get_hp(self):
+        """ Return total HP of the living members of both parties """
+        return tuple(sum(max(c.hp, 0) for c in party.get_alive())
+                     for party in (self.party1, self.party2))
+
+    def count_attacks(self):
+        return sum(c.hits + c.misses for c in self.order_of_action)
+
+    def can_win(self, party, enemies):
+        """ Return False if some living enemy cannot be killed by any
+        living member of the party, see BaseCreature.can_kill() """
+        attackers = {c.name: c for c in party.get_alive()}
+        for target in {c.name: c for c in enemies.get_alive()}.values():
+            for attacker in attackers.values():
+                key = (attacker.name, target.name)
+                if key not in self.can_kill:
+                    self.can_kill[key] = attacker.can_kill(target)
+                if self.can_kill[key]:
+                    break
+            else:
+                return False
+        return True
+
+    def is_stalemate(self):
+        """ Check after a round whether the fight can still end and set
+        ´draw_reason´ if it cannot """
+        if self.round == self.MAX_ROUNDS:
+            self.draw_reason = 'round cap'
+            return True
+        if not (self.party1.is_alive and self.party2.is_alive):
+            return False
+
+        hp = self.get_hp()
+        if hp[0] < self.lowest_hp[0] or hp[1] < self.lowest_hp[1]:
+            self.last_damage = self.round
+            self.lowest_hp = (min(hp[0], self.lowest_hp[0]),
+                              min(hp[1], self.lowest_hp[1]))
+        attacks = self.count_attacks()
+        if attacks != self.attacks:
+            self.attacks = attacks
+            self.last_attack = self.round
+
+        """ Who can kill whom changes only when someone dies """
+        living = sum(1 for c in self.order_of_action if not c.is_dead)
+        if living != self.living:
+            self.living = living
+            if not self.can_win(self.party1, self.party2) \
+                    and not self.can_win(self.party2, self.party1):
+                self.draw_reason = 'no damage'
+                return True
+
+        if self.round - self.last_attack >= self.STALEMATE_ROUNDS:
+            self.draw_reason = 'no contact'
+            return True
+        if self.round - self.last_damage >= self.STALEMATE_ROUNDS:
+            self.draw_reason = 'no progress'
+            return True
+        return False
+
+    def finish(self):
+        """ End the fight and return the name of the winner """
+        self.rounds = self.round - 1
+
+        if self.telemetry is not None:
+            self.telemetry.end(self)
 
         world.Map.reset_map()
 
         if self.party1.is_alive and self.party2.is_alive:
-            messages.IO.printmsg("\nDraw!", level=1)
+            messages.IO.printmsg("\nDraw (%s)!" % self.draw_reason, level=1)
             return "No-one"
 
         elif self.party1.is_alive:
@@ -89,6 +273,43 @@ class Encounter:
             messages.IO.printmsg("\n%s wins!" % self.party2.name, level=1)
             return self.party2.name
 
+
+def fight_parallel(encounters, policy):
+    """ Fight several encounters round by round in lockstep so that a
+    batched policy chooses the targets of all of them in one batch.
+    Each encounter keeps its own map and timer wheel, see
+    world.Map.get_state() and scheduler.Wheel.get_state()
+
+    :type encounters          [Encounter, ...]
+    :type policy              behavior.Policy
+    :rtype                    [str, ...] """
+    winners = [None] * len(encounters)
+    active = list(range(len(encounters)))
+    for encounter in encounters:
+        world.Map.set_state(encounter.map)
+        encounter.start()
+        encounter.wheel = scheduler.Wheel.get_state()
+
+    while active:
+        behavior.plan_targets(policy, [(encounters[k].party1,
+                                        encounters[k].party2)
+                                       for k in active])
+        playing = []
+        for k in active:
+            encounter = encounters[k]
+            world.Map.set_state(encounter.map)
+            scheduler.Wheel.set_state(encounter.wheel)
+            if encounter.play_round(plan_targets=False):
+                encounter.map = world.Map.get_state()
+                encounter.wheel = scheduler.Wheel.get_state()
+                playing.append(k)
+            else:
+                winners[k] = encounter.finish()
+        active = playing
+
+    world.Map.reset_map()
+    return winners
+
 #def list_creatures_():
 #    """ Call this function to list all defined creatures """
 #    print('List of creatures')
@@ -100,19 +321,95 @@ class Encounter:
 
 
 def list_creatures():
-    """ Call this function to list all defined creatures """
+    """ Call this function to list all defined creatures. Listing
+    reads the stat block metadata and does not build the creatures """
 
     for category in [('npc', npc), ('pc', pc)]:
         print(DIV)
         print({'npc': 'Creatures', 'pc': 'Player Characters'}[category[0]])
         print(DIV)
-        for k, v in vars(category[-1]).items():
-            if not k.startswith('__'):
-                print(v, f'| `{category[0]}.{k}`', sep='\t')
+        for k, v in registry.get_specs(category[-1]).items():
+            print(v, f'| `{category[0]}.{k}`', sep='\t')
     print(DIV)
 
 
-def simulate(matches=1, verbose=0, team_a=[], team_b=[]):
+def get_creature(name):
+    """ Return creature by its object name as listed by
+    list_creatures(), e.g. ´npc.troll´ or ´pc.ogno´. Names without
+    prefix are looked up from creatures first """
+    prefix, _, key = name.rpartition('.')
+    sources = {'npc': [npc], 'pc': [pc], '': [npc, pc]}.get(prefix)
+    if sources is None or key.startswith('_'):
+        raise KeyError(name)
+    for source in sources:
+        if hasattr(source, key):
+            return getattr(source, key)
+    raise KeyError(name)
+
+
+def setup_encounter(team_a, team_b, horde=False, telemetry=None,
+                    policy=None):
+    """ Copy creatures into two parties in formation and return an
+    encounter between them. In horde mode creatures are cloned in bulk
+    and set in rows instead of one long line
+
+    :type team_a              [BaseCreature, ...]
+    :type team_b              [BaseCreature, ...]
+    :rtype                    Encounter """
+
+    parties = [setup_party(world.TEAM_A, team_a, (0, 3, 0), horde),
+               setup_party(world.TEAM_B, team_b, (0, -3, 0), horde)]
+    return Encounter(*parties, telemetry=telemetry, policy=policy)
+
+
+def setup_party(name, team, position, horde=False, width=None,
+                copies=True, rename=True):
+    """ Copy creatures into a party in formation near ´position´, see
+    setup_encounter(). Creatures join as they are if ´copies´ is False,
+    e.g. to carry their HP and ammo over from a previous encounter, and
+    keep their names if ´rename´ is False
+
+    :param width              width of the rows in horde mode
+    :type name                str
+    :type team                [BaseCreature, ...]
+    :type position            (int, int, int)
+    :type horde               bool
+    :type width               int
+    :type copies              bool
+    :type rename              bool
+    :rtype                    Party """
+    party = Party(name=name, horde=horde)
+    if horde:
+        """ Cloning allocates many containers at once; pause the
+        cyclic garbage collector so it does not rescan them """
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            party.add_many([creature.clone() if copies else creature
+                            for creature in team], rename=rename)
+        finally:
+            if enabled:
+                gc.enable()
+        if width is None:
+            width = get_width(len(team))
+        party.set_formation(position, width=width)
+    else:
+        for creature in team:
+            party.add(creature.clone() if copies else creature,
+                      rename=rename)
+        party.set_formation(position)
+    return party
+
+
+def get_width(size):
+    """ Width of horde formation rows; hordes are four times as wide
+    as they are deep """
+    return max(int(math.sqrt(size * 4)), 1)
+
+
+def simulate(matches=1, verbose=0, team_a=[], team_b=[], horde=False,
+             telemetry=None, export=None, seed=None, quiet=False,
+             record=None, policy=None, parallel=1, workers=1):
     """ :param matches            number of simulated battles
         :param verbose            verbose level
 
@@ -124,11 +421,51 @@ def simulate(matches=1, verbose=0, team_a=[], team_b=[]):
                                        
         :param team_a             list of creatures  
         :param team_b             list of creatures
+        :param horde              horde mode for battles with thousands
+                                  of creatures: bulk party setup, rows
+                                  formation, and map-backed closest
+                                  enemy queries if Party.RING_SEARCH
+                                  is set
+        :param telemetry          collect per-round HP, alive count,
+                                  damage and survival time series into
+                                  this object and print them at the end
+        :param export             write seed, winner, rounds and creature
+                                  stats of each match to this writer;
+                                  it is flushed at the end, but parquet
+                                  and csv writers must still be closed
+                                  (or used in a ´with´ block)
+        :param seed               seed of the match seeds; each match is
+                                  seeded separately (also when exporting)
+                                  so that it can be replayed alone
+        :param quiet              do not print progress or results
+        :param record             record every creature decision and
+                                  the match outcome with this recorder
+        :param policy             batched policy that chooses targets
+                                  of all creatures once per round, see
+                                  behavior.Policy
+        :param parallel           number of matches fought in lockstep
+                                  so that the policy decides for all of
+                                  them in one batch
+        :param workers            number of worker processes that play
+                                  the matches and add up their results
+                                  in shared memory, see shared.py
+
+        Returns a results.SimulationResult of the matches.
 
         :type matches             int
         :type verbose             int
         :type team_a              [BaseCreature, ...]
         :type team_b              [BaseCreature, ...]
+        :type horde               bool
+        :type telemetry           telemetry.RoundTelemetry
+        :type export              export.ResultWriter
+        :type seed                int
+        :type quiet               bool
+        :type record              recorder.DecisionRecorder
+        :type policy              behavior.Policy
+        :type parallel            int
+        :type workers             int
+        :rtype                    results.SimulationResult
 
     """
 
@@ -137,89 +474,232 @@ def simulate(matches=1, verbose=0, team_a=[], team_b=[]):
         print('> Note: Verbose levels 2 and 3 available only for signle matches.')
 
     i = 0
-    results = []
+    result = SimulationResult(teams=(world.TEAM_A, world.TEAM_B))
     messages.VERBOSE_LEVEL = verbose
 
-    statisticsA = defaultdict(list)
-    statisticsB = defaultdict(list)
-
-    stat_order = ['avg.lt', 'avg.dmg', 'kills', 'deaths', 'suicid.', 'hits', 'misses']
+    """ Match seeds are drawn from their own generator """
+    seeds = None
+    if seed is not None or export is not None:
+        seeds = random.Random(seed)
+
+    if parallel > 1 and (policy is None or seeds is not None
+                         or telemetry is not None or record is not None):
+        raise ValueError("Parallel matches need a policy and do not "
+                         "support seeds, export, telemetry or recording")
+    if workers > 1 and (export is not None or record is not None
+                        or parallel > 1):
+        raise ValueError("Worker processes do not support export, "
+                         "recording or parallel matches")
+
+    if workers > 1:
+        """ Imported here, since the workers import this module """
+        import shared
+        result = shared.simulate(matches, team_a, team_b, workers, seed,
+                                 horde, telemetry, policy)
+        i = matches
 
     while i < matches:
-        if i in range(0, matches, max(int(matches/10), 1)):
+        if not quiet and i in range(0, matches, max(int(matches/10), 1)):
             print("Match %i" % i)
 
-        team1 = Party(name=world.TEAM_A)
-        for creature in team_a:
-            team1.add(copy.deepcopy(creature))
-        team1.set_formation((0, 3, 0))
-
-        team2 = Party(name=world.TEAM_B)
-        for creature in team_b:
-            team2.add(copy.deepcopy(creature))
-        team2.set_formation((0, -3, 0))
-
-        x = Encounter(team1, team2)
-
-        results.append(x.fight())
-
-        for character in team1.members:
-            statisticsA[character.name].append([character.turns_alive,
-                                                character.damage_dealt,
-                                                character.kills,
-                                                character.deaths,
-                                                character.suicides,
-                                                character.hits,
-                                                character.misses])
-        for character in team2.members:
-            statisticsB[character.name].append([character.turns_alive,
-                                                character.damage_dealt,
-                                                character.kills,
-                                                character.deaths,
-                                                character.suicides,
-                                                character.hits,
-                                                character.misses])
+        if parallel > 1:
+            """ Each encounter keeps its own map while in lockstep """
+            encounters = []
+            for _ in range(min(parallel, matches - i)):
+                x = setup_encounter(team_a, team_b, horde, policy=policy)
+                x.map = world.Map.get_state()
+                world.Map.reset_map()
+                encounters.append(x)
+            for x, winner in zip(encounters,
+                                 fight_parallel(encounters, policy)):
+                result.add(x, winner)
+            i += len(encounters)
+            continue
+
+        match_seed = None
+        if seeds is not None:
+            match_seed = seeds.getrandbits(63)
+            random.seed(match_seed)
+
+        x = setup_encounter(team_a, team_b, horde, telemetry, policy)
+        recorder.ACTIVE = record
+        try:
+            winner = x.fight()
+        finally:
+            recorder.ACTIVE = None
+        result.add(x, winner)
+
+        if export is not None:
+            export.record(x, match_seed, winner)
+        if record is not None:
+            record.end_match(x, winner)
 
         i += 1
 
-    print('\n')
-    x = dict(Counter(results).items())
-    print('SIMULATION SUMMARY')
-    print('=='*40)
-    for k, v in Counter(results).items():
-        print('{team} wins {rate}% of the matches'.format(team=k, rate=100*x[k]/matches))
+    if export is not None:
+        export.flush()
+
+    if quiet:
+        return result
 
     print('\n')
+    result.report()
+
+    if telemetry is not None:
+        telemetry.report()
+
+    return result
+
+
+def play_pair(team_a, team_b, seed, antithetic=False, horde=False):
+    """ Fight one match on per-creature random streams and return the
+    encounter and the winner. Setup, e.g. initiative, is rolled from
+    a stream of the match seed
+
+    :rtype                    (Encounter, str) """
+    dice.STREAM = dice.AntitheticRandom(seed) if antithetic \
+        else random.Random(seed)
+    try:
+        x = setup_encounter(team_a, team_b, horde=horde)
+    finally:
+        dice.STREAM = random
+    x.set_streams(seed, antithetic)
+    return x, x.fight()
+
+
+def compare(matches=100, team_a=[], team_b=[], variant_a=None,
+            variant_b=None, seed=None, antithetic=False, horde=False,
+            quiet=False):
+    """ Compare the win rate of team A between two variants of a match,
+    e.g. a character with different weapons:
+
+        compare(1000, team_a=[pc.ogno], team_b=[npc.troll]*2,
+                variant_a=[ogno_with_greataxe_1])
+
+    Both variants of each match are fought on common random numbers:
+    every creature rolls from its own stream, seeded by the match and
+    its place in its party, so differences in the outcome come from the
+    variants rather than the dice. The confidence interval of the
+    difference is computed from the paired matches and is much
+    narrower than that of two independent simulate() runs.
+
+        :param matches            number of paired matches
+        :param team_a             team A of the base match
+        :param team_b             team B of the base match
+        :param variant_a          team A of the variant, by default
+                                  team_a; place the changed creatures
+                                  where they are in team_a
+        :param variant_b          team B of the variant, by default
+                                  team_b
+        :param seed               seed of the match seeds
+        :param antithetic         also fight every match on mirrored
+                                  dice (antithetic variates)
+        :param horde              horde mode, see simulate()
+        :param quiet              do not print the comparison
 
-    def tabulate(header, data, creatures, team):
-        print(team)
-        print('--'*40)
-        row_format = "{:8}" * (len(header) + 1)
-        print(row_format.format(*header, "CREATURE"))
-        for creature, row in zip(creatures, data):
-            print(row_format.format(*row, creature.capitalize()[0:24]))
-        print('--'*40)
-        print('\n')
-
-
-    #fix this temporary gimmick later
-    t = [world.TEAM_A, world.TEAM_B]
-    
-    for statistics in [statisticsA, statisticsB]:
-        table = []
-        keys = []
-        for k, v in sorted(statistics.items()):
-            printout = []
-            keys.append(k)
-            for i, stat in enumerate(stat_order):
-                value = sum(j[i] for j in v)
-                if stat.startswith('avg'):
-                    value = value / matches
-                    printout.append("%.2f" % value)
-                else:
-                    printout.append("%i" % value)
-            table.append(printout)
-        tabulate(stat_order, table, keys, t.pop(0))
+        :type matches             int
+        :type team_a              [BaseCreature, ...]
+        :type team_b              [BaseCreature, ...]
+        :type variant_a           [BaseCreature, ...]
+        :type variant_b           [BaseCreature, ...]
+        :type seed                int
+        :type antithetic          bool
+        :type horde               bool
+        :type quiet               bool
+        :rtype                    results.Comparison """
+    variant_a = team_a if variant_a is None else variant_a
+    variant_b = team_b if variant_b is None else variant_b
+    messages.VERBOSE_LEVEL = 0
+
+    seeds = random.Random(seed)
+    comparison = Comparison(world.TEAM_A)
+    for _ in range(matches):
+        match_seed = seeds.getrandbits(63)
+        wins = []
+        for mirrored in ((False, True) if antithetic else (False,)):
+            for a, b, result in ((team_a, team_b, comparison.base),
+                                 (variant_a, variant_b, comparison.variant)):
+                x, winner = play_pair(a, b, match_seed, mirrored, horde)
+                result.add(x, winner)
+                wins.append(float(winner == world.TEAM_A))
+        comparison.add(sum(wins[0::2]) / len(wins[0::2]),
+                       sum(wins[1::2]) / len(wins[1::2]))
+
+    if not quiet:
+        comparison.report()
+    return comparison
+
+
+def team_a_death(encounter, winner):
+    """ Event of estimate_risk(): a creature of team A died """
+    return any(c.deaths for c in encounter.party1.members)
+
+
+def estimate_risk(matches=1000, team_a=[], team_b=[], event=team_a_death,
+                  tilt=(-0.3, 0.3), defensive=0.2, seed=None, horde=False,
+                  quiet=False):
+    """ Estimate the probability of a rare event, by default that a
+    creature of team A dies, with importance sampling. Attack rolls are
+    rolled on d20s tilted toward or away from hits and crits
+    (dice.Tilt), so that the event happens more often, and every match
+    is weighted by the likelihood ratio of fair to tilted dice. For
+    example, team A dies more often if team B hits more and team A
+    misses more, which is the default.
+
+    Over a whole fight the ratios of many rolls multiply, and a few
+    matches with huge weights would dominate. To keep weights bounded,
+    a share ´defensive´ of the matches is fought on fair dice and each
+    match is weighted against the mixture of fair and tilted dice, so
+    no weight exceeds 1 / defensive. The estimate is unbiased; check
+    its diagnostics to tune the tilt, e.g. an effective sample size
+    much below the number of matches means the tilt is too strong.
+
+        :param matches            number of matches
+        :param team_a             list of creatures
+        :param team_b             list of creatures
+        :param event              function of the finished encounter and
+                                  the winner that returns True if the
+                                  event happened
+        :param tilt               tilts of attack rolls of team A and
+                                  team B, see dice.Tilt; positive tilts
+                                  toward hits, negative toward misses
+                                  and (0, 0) is plain Monte Carlo
+        :param defensive          share of matches fought on fair dice
+        :param seed               seed of the matches
+        :param horde              horde mode, see simulate()
+        :param quiet              do not print the estimate
+
+        :type matches             int
+        :type team_a              [BaseCreature, ...]
+        :type team_b              [BaseCreature, ...]
+        :type event               function
+        :type tilt                (float, float)
+        :type defensive           float
+        :type seed                int
+        :type horde               bool
+        :type quiet               bool
+        :rtype                    results.RiskEstimate """
+    messages.VERBOSE_LEVEL = 0
+    if seed is not None:
+        random.seed(seed)
+
+    estimate = RiskEstimate()
+    tilts = [dice.Tilt(theta) for theta in tilt]
+    for _ in range(matches):
+        active = random.random() >= defensive
+        x = setup_encounter(team_a, team_b, horde=horde)
+        for party, dice_ in zip((x.party1, x.party2), tilts):
+            dice_.reset(active)
+            for creature in party.members:
+                creature.tilt = dice_
+        winner = x.fight()
+        log_ratio = min(sum(dice_.log_ratio for dice_ in tilts), 700)
+        weight = 1 / (defensive + (1 - defensive) * math.exp(log_ratio))
+        estimate.add(weight, event(x, winner))
+
+    if not quiet:
+        estimate.report()
+    return estimate
 
 
 if __name__ == "__main__":
@@ -32,7 +32,12 @@ class DnDRuleset:
 
         """ Rollening's """
         advantage = source.advantage['hit']
-        hitroll = dice.roll(1, 20, 0, advantage)
+        if source.tilt is None:
+            hitroll = dice.roll(1, 20, 0, advantage)
+        elif not always_hit:
+            """ Importance sampling, see main.estimate_risk() """
+            hitroll = source.tilt.roll(
+                target.ac + target.ac_bonus - bonus + 1, advantage)
 
         """ Override hitroll if always_hit is true"""
         if always_hit:
@@ -1,4 +1,6 @@
 
+import damagetypes
+
 VERBOSE_LEVEL = 2
 INDENT = " " * 2
 
@@ -8,19 +10,31 @@ class IO:
     hp = 0
     target_name = ""
     conditions = []
-    total_damage = {}
+    total_damage = []   # Damage logged per damage type id
+    damage_types = []   # Ids of logged damage types in logging order
     log = ""
 
     def reset():
         IO.log = ""
-        IO.total_damage = {}
+        for type_id in IO.damage_types:
+            IO.total_damage[type_id] = 0
+        IO.damage_types = []
         IO.hp = 0
         IO.target_name = ""
         IO.conditions = []
 
+    def add_damage(type_id, damage):
+        """ Log damage of a damage type """
+        if type_id >= len(IO.total_damage):
+            IO.total_damage.extend([0] * (type_id + 1 - len(IO.total_damage)))
+        if type_id not in IO.damage_types:
+            IO.damage_types.append(type_id)
+        IO.total_damage[type_id] += damage
+
     def printlog():
-        d = " + ".join(["%i %s" % (v, k) for k, v in IO.total_damage.items()])
-        damages = [i for i in IO.total_damage.values()]
+        damages = [IO.total_damage[i] for i in IO.damage_types]
+        d = " + ".join(["%i %s" % (v, damagetypes.TYPES[i])
+                        for i, v in zip(IO.damage_types, damages)])
         total = sum(damages)
         if d:
             if len(damages) == 1:
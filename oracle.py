@@ -0,0 +1,332 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import collections
+import math
+from registry import CreatureSpec
+
+""" Exact attack odds and damage per round.
+
+The chance that a weapon hits depends only on its ´to_hit´, the
+defender's AC, advantage and the crit rules of DnDRuleset.roll_hit(),
+and its damage only on the dice and the defender's resistances,
+immunities and vulnerabilities. This module computes them exactly from
+the dice instead of sampling fights:
+
+    attack(weapon, defender)        # Odds of one attack
+    dpr(attacker, defender)         # Damage per round
+    save(defender, 'con', 13)       # Chance of a successful save
+
+Results are memoized by the stats they depend on, so clones and
+creatures with the same stats share them, and Matrix tabulates damage
+per round between all creatures of a bestiary for O(1) lookups.
+
+Only weapon damage is counted: on-hit specials such as poison are
+reported as save odds, and on-hit passives are not modelled. """
+
+
+""" Odds of one attack of a weapon on a defender. Damage is counted
+after resistances, immunities and vulnerabilities; ´saves´ maps names
+of the weapon's specials to the chance the defender fails their save,
+if the attack hits """
+Attack = collections.namedtuple(
+    'Attack', ['hit', 'crit', 'mean', 'variance', 'saves'])
+
+""" Memoized distributions and attack odds """
+DICE = {}        # (times, sides, bonus) -> {damage: probability}
+ATTACKS = {}     # Weapon and defender stats -> Attack
+KILLS = {}       # Weapon and defender stats, HP -> hits to kill
+
+
+def get_d20(advantage=0):
+    """ Return probabilities of d20 results 1-20 as a list indexed by
+    the result, rolled with advantage (1) or disadvantage (-1)
+
+    :rtype                    [float, ...] """
+    if advantage == 1:
+        return [0.0] + [(2 * r - 1) / 400 for r in range(1, 21)]
+    elif advantage == -1:
+        return [0.0] + [(41 - 2 * r) / 400 for r in range(1, 21)]
+    return [0.0] + [1 / 20] * 20
+
+
+def get_hit(to_hit, ac, advantage=0, auto_crit=False):
+    """ Return chances to hit and to crit. A natural 1 misses, a natural
+    20 crits and other rolls hit if they exceed the AC. Attacks on
+    paralyzed targets always crit
+
+    :rtype                    (float, float) """
+    if auto_crit:
+        return 1.0, 1.0
+    d20 = get_d20(advantage)
+    hit = d20[20] + sum(d20[r] for r in range(2, 20) if r + to_hit > ac)
+    return hit, d20[20]
+
+
+def save(defender, ability, dc, advantage=None):
+    """ Return the chance of a successful save, see
+    DnDRuleset.roll_save(). Advantage defaults to the defender's
+
+    :type defender            BaseCreature
+    :type ability             str
+    :type dc                  int
+    :rtype                    float """
+    if defender.is_paralyzed and ability in ("str", "dex"):
+        return 0.0
+    if advantage is None:
+        advantage = defender.advantage[ability]
+    bonus = defender.saves[ability]
+    d20 = get_d20(advantage)
+    return sum(d20[r] for r in range(1, 21) if r + bonus >= int(dc))
+
+
+def convolve(a, b):
+    """ Return the distribution of the sum of two independent
+    distributions given as {value: probability} """
+    total = {}
+    for x, p in a.items():
+        for y, q in b.items():
+            total[x + y] = total.get(x + y, 0.0) + p * q
+    return total
+
+
+def get_dice(times, sides, bonus):
+    """ Return the distribution of ´times´d´sides´+´bonus´
+
+    :rtype                    {int: float} """
+    key = (times, sides, bonus)
+    distribution = DICE.get(key)
+    if distribution is None:
+        distribution = {bonus: 1.0}
+        if sides > 0:
+            die = {r: 1 / sides for r in range(1, sides + 1)}
+            for _ in range(times):
+                distribution = convolve(distribution, die)
+        DICE[key] = distribution
+    return distribution
+
+
+def get_damage(damage, damage_types, modifiers, crit_multiplier=1):
+    """ Return the distribution of damage dealt by one hit, see
+    DnDRuleset.roll_damage() and BaseCreature.take_damage(). Like
+    there, a later die of the same damage type replaces an earlier one
+
+    :param damage             parsed dice, e.g. [[2, 6, 3]]
+    :param damage_types       interned damage type of each die
+    :param modifiers          defender's damage modifiers
+    :rtype                    {int: float} """
+    dice_by_type = {}
+    for dmg, type_ in zip(damage, damage_types):
+        dice_by_type[type_.id] = dmg
+
+    total = {0: 1.0}
+    for type_id, (t, s, b) in dice_by_type.items():
+        distribution = get_dice(t * crit_multiplier, s, b)
+        modifier = modifiers[type_id] if type_id < len(modifiers) else None
+        if modifier is not None:
+            halve, factor = modifier
+            modified = {}
+            for x, p in distribution.items():
+                if halve:
+                    x = math.floor(x / 2)
+                x *= factor
+                modified[x] = modified.get(x, 0.0) + p
+            distribution = modified
+        total = convolve(total, distribution)
+    return total
+
+
+def get_moments(distribution):
+    """ Return mean and variance of a distribution """
+    mean = sum(x * p for x, p in distribution.items())
+    variance = sum((x - mean) ** 2 * p for x, p in distribution.items())
+    return mean, variance
+
+
+def get_key(weapon, defender, advantage=0):
+    """ Return the stats that odds of an attack depend on as a memo key,
+    the advantage of the attack and the saves of the weapon's specials
+    as (name, ability, DC) """
+    if defender.gives_advantage_to_attacker:
+        advantage = min(advantage + 1, 1)
+    specials = tuple((s.name, s.save, s.dc) for s in weapon.special
+                     if getattr(s, 'save', None) and getattr(s, 'dc', None))
+    key = (weapon.to_hit, tuple(map(tuple, weapon.damage)),
+           tuple(t.id for t in weapon.damage_type), specials,
+           defender.ac + defender.ac_bonus, defender.damage_modifiers,
+           advantage, defender.is_paralyzed,
+           tuple(sorted(defender.saves.items())),
+           tuple(sorted(defender.advantage.items())))
+    return key, advantage, specials
+
+
+def attack(weapon, defender, advantage=0):
+    """ Return odds of one attack of a weapon on a defender. Advantage
+    is the attacker's; prone, restrained and paralyzed defenders give
+    advantage as in battle
+
+    :type weapon              Weapon
+    :type defender            BaseCreature
+    :type advantage           int
+    :rtype                    Attack """
+    key, advantage, specials = get_key(weapon, defender, advantage)
+    odds = ATTACKS.get(key)
+    if odds is not None:
+        return odds
+
+    hit, crit = get_hit(weapon.to_hit, defender.ac + defender.ac_bonus,
+                        advantage, defender.is_paralyzed)
+    outcomes = {0: 1 - hit}
+    for chance, multiplier in ((hit - crit, 1), (crit, 2)):
+        if chance <= 0:
+            continue
+        damage = get_damage(weapon.damage, weapon.damage_type,
+                            defender.damage_modifiers, multiplier)
+        for x, p in damage.items():
+            outcomes[x] = outcomes.get(x, 0.0) + chance * p
+    mean, variance = get_moments(outcomes)
+    saves = {name: 1 - save(defender, ability, dc)
+             for name, ability, dc in specials}
+
+    odds = Attack(hit, crit, mean, variance, saves)
+    ATTACKS[key] = odds
+    return odds
+
+
+def hits_to_kill(weapon, defender, hp, advantage=0):
+    """ Return the expected number of hits of a weapon it takes to deal
+    at least ´hp´ damage, crits included; infinite if its hits deal no
+    damage. Exact for up to four maximum hits, asymptotic beyond
+
+    :type hp                  int
+    :rtype                    float """
+    key, advantage, _ = get_key(weapon, defender, advantage)
+    key += (hp,)
+    expected = KILLS.get(key)
+    if expected is not None:
+        return expected
+
+    hit, crit = get_hit(weapon.to_hit, defender.ac + defender.ac_bonus,
+                        advantage, defender.is_paralyzed)
+    damage = {}
+    for chance, multiplier in ((hit - crit, 1), (crit, 2)):
+        if chance <= 0:
+            continue
+        for x, p in get_damage(weapon.damage, weapon.damage_type,
+                               defender.damage_modifiers,
+                               multiplier).items():
+            damage[x] = damage.get(x, 0.0) + chance / hit * p
+
+    """ Far from the first hits, the damage beyond ´hp´ of the killing
+    hit has settled to its long-run mean (renewal theory) """
+    mean = sum(x * p for x, p in damage.items())
+    if hp > 4 * max(damage) and mean > 0:
+        overshoot = sum(x * (x - 1) * p for x, p in damage.items()) \
+            / (2 * mean)
+        expected = (hp + overshoot) / mean
+        KILLS[key] = expected
+        return expected
+
+    """ Sum of P(first n hits deal less than hp) over n """
+    expected = 0.0
+    standing = {0: 1.0}
+    while standing and hp > 0:
+        remaining = sum(standing.values())
+        expected += remaining
+        if remaining < 1e-9 or expected > 1e6:
+            break
+        following = {}
+        for x, p in standing.items():
+            for y, q in damage.items():
+                if x + y < hp:
+                    following[x + y] = following.get(x + y, 0.0) + p * q
+        if following.keys() == standing.keys() \
+                and sum(following.values()) > remaining - 1e-12:
+            expected = math.inf
+            break
+        standing = following
+    KILLS[key] = expected
+    return expected
+
+
+def get_weapons(creature, ranged=False):
+    """ Return weapons a creature picks from in melee, or at range, as
+    a list where duplicates weight random draws """
+    first, second = creature.melee_attacks, creature.ranged_attacks
+    if ranged:
+        first, second = second, first
+    return [w for ws in first.values() for w in ws] \
+        or [w for ws in second.values() for w in ws]
+
+
+def dpr(attacker, defender, advantage=0, ranged=False):
+    """ Return mean and variance of damage per round, with a weapon
+    drawn at random for each of the attacker's attacks. Limits on uses
+    per turn are not modelled
+
+    :type attacker            BaseCreature
+    :type defender            BaseCreature
+    :param ranged             prefer ranged weapons over melee
+    :rtype                    (float, float) """
+    weapons = get_weapons(attacker, ranged)
+    if not weapons:
+        return 0.0, 0.0
+    odds = [attack(w, defender, advantage) for w in weapons]
+    mean = sum(o.mean for o in odds) / len(odds)
+    second = sum(o.variance + o.mean ** 2 for o in odds) / len(odds)
+    return attacker.attacks * mean, attacker.attacks * (second - mean ** 2)
+
+
+class Matrix:
+
+    """ Hit chances and damage per round between all pairs of
+    creatures, e.g. Matrix(query.Bestiary().specs)
+
+    :param creatures          creatures or CreatureSpecs
+    :param advantage          advantage of the attackers
+    :param ranged             prefer ranged weapons over melee
+
+    :type creatures           [BaseCreature or CreatureSpec, ...]
+    :type advantage           int
+    :type ranged              bool """
+
+    def __init__(self, creatures, advantage=0, ranged=False):
+        self.creatures = [c.get() if isinstance(c, CreatureSpec) else c
+                          for c in creatures]
+        self.index = {c.name.lower(): i for i, c in enumerate(self.creatures)}
+        self.hit = []         # [attacker][defender] -> mean hit chance
+        self.mean = []        # [attacker][defender] -> mean DPR
+        self.variance = []    # [attacker][defender] -> variance of DPR
+
+        for a in self.creatures:
+            weapons = get_weapons(a, ranged)
+            hit, mean, variance = [], [], []
+            for d in self.creatures:
+                odds = [attack(w, d, advantage) for w in weapons]
+                hit.append(sum(o.hit for o in odds) / len(odds)
+                           if odds else 0.0)
+                m, v = dpr(a, d, advantage, ranged)
+                mean.append(m)
+                variance.append(v)
+            self.hit.append(hit)
+            self.mean.append(mean)
+            self.variance.append(variance)
+
+    def __len__(self):
+        return len(self.creatures)
+
+    def get_index(self, creature):
+        return self.index[getattr(creature, 'name', creature).lower()]
+
+    def get(self, attacker, defender):
+        """ Return mean and variance of damage per round
+
+        :param attacker           creature, spec or name
+        :param defender           creature, spec or name
+        :rtype                    (float, float) """
+        i, j = self.get_index(attacker), self.get_index(defender)
+        return self.mean[i][j], self.variance[i][j]
+
+    def get_hit(self, attacker, defender):
+        """ Return the attacker's mean chance to hit the defender """
+        return self.hit[self.get_index(attacker)][self.get_index(defender)]
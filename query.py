@@ -0,0 +1,169 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import bisect
+import registry
+from compendium import SIZES
+
+""" Indexed queries over creature stat blocks.
+
+Usage:
+
+    bestiary = Bestiary()                       # definitions' creatures
+    bestiary = Bestiary(npc, pc, compendium.load('monsters.json'))
+    bestiary.select(cr=(2, 4), category='undead', immune='poison')
+    bestiary.select(size='large', damage=(20, None), passive='AvoidDeath')
+
+Numeric fields take a value or an inclusive (low, high) range, where
+None leaves a side open, and are answered from sorted indexes. Other
+fields take a value or a list of values that must all match, and are
+answered from inverted indexes. Results are CreatureSpecs in the
+order the namespaces define them.
+
+Fields read from stat block metadata are indexed up front. Fields that
+need weapons and passives are indexed the first time they are queried,
+which builds the creatures. """
+
+
+def get_offense(creature):
+    """ Return offensive stats of a creature: average damage per round
+    if every attack hits, computed from its melee weapons or, if it has
+    none, its ranged weapons; best to-hit bonus; longest reach
+
+    :type creature            BaseCreature
+    :rtype                    {str: float} """
+    melee = [w for ws in creature.melee_attacks.values() for w in ws]
+    ranged = [w for ws in creature.ranged_attacks.values() for w in ws]
+    weapons = melee or ranged
+    if not weapons:
+        return {'damage': 0.0, 'to_hit': 0, 'reach': 0}
+    average = sum(sum(t * (s + 1) / 2 + b for t, s, b in w.damage)
+                  for w in weapons) / len(weapons)
+    return {'damage': average * creature.attacks,
+            'to_hit': max(w.to_hit for w in melee + ranged),
+            'reach': max(w.reach for w in melee + ranged)}
+
+
+class Bestiary:
+
+    """ Creature stat blocks with sorted and inverted indexes
+
+    :param namespaces         classes of CreatureSpecs such as
+                              definitions.Creatures, by default the
+                              creatures and player characters in
+                              definitions
+
+    :type namespaces          type """
+
+    """ Numeric fields from metadata and from built creatures """
+    NUMERIC = ('cr', 'ac', 'hp', 'speed', 'size', 'attacks')
+    OFFENSIVE = ('damage', 'to_hit', 'reach')
+
+    """ Set fields from metadata and the stat lists they index """
+    SETS = {'category': None, 'resistant': 'resistances',
+            'immune': 'immunities', 'vulnerable': 'vulnerabilities'}
+
+    """ Set fields from built creatures: passive class names and
+    passive types, e.g. ´AvoidDeath´ and ´avoid_death´ """
+    PASSIVES = ('passive', 'trigger')
+
+    """ BaseCreature defaults of optional metadata """
+    DEFAULTS = {'attacks': 1, 'resistances': [], 'immunities': [],
+                'vulnerabilities': []}
+
+    def __init__(self, *namespaces):
+        if not namespaces:
+            import definitions
+            namespaces = (definitions.Creatures,
+                          definitions.PlayerCharacters)
+        self.specs = [spec for namespace in namespaces
+                      for spec in registry.get_specs(namespace).values()]
+        self.sorted = {}      # Field -> ([sorted values], [spec indices])
+        self.inverted = {}    # Field -> {value: {spec indices}}
+
+        for field in self.NUMERIC:
+            self.add_sorted(field, [self.get_stat(s, field)
+                                    for s in self.specs])
+        for field, stat in self.SETS.items():
+            if stat is None:
+                values = [[self.get_stat(s, field)] for s in self.specs]
+            else:
+                values = [self.get_stat(s, stat) for s in self.specs]
+            self.add_inverted(field, values)
+
+    def __len__(self):
+        return len(self.specs)
+
+    def __repr__(self):
+        return "Bestiary(%i creatures)" % len(self.specs)
+
+    def get_stat(self, spec, name):
+        return spec.stats.get(name, self.DEFAULTS.get(name))
+
+    def add_sorted(self, field, values):
+        order = sorted(range(len(values)), key=values.__getitem__)
+        self.sorted[field] = ([values[i] for i in order], order)
+
+    def add_inverted(self, field, values):
+        index = {}
+        for i, spec_values in enumerate(values):
+            for value in spec_values:
+                index.setdefault(value, set()).add(i)
+        self.inverted[field] = index
+
+    def index_built(self):
+        """ Build the creatures and index their offense and passives """
+        creatures = [spec.get() for spec in self.specs]
+        offense = [get_offense(c) for c in creatures]
+        for field in self.OFFENSIVE:
+            self.add_sorted(field, [o[field] for o in offense])
+        self.add_inverted('passive', [
+            [getattr(p, '__name__', type(p).__name__) for p in c.passives]
+            for c in creatures])
+        self.add_inverted('trigger', [[p.type for p in c.passives]
+                                      for c in creatures])
+
+    def match(self, field, value):
+        """ Return indices of specs matching one criterion """
+        if field in self.OFFENSIVE + self.PASSIVES \
+                and field not in self.sorted and field not in self.inverted:
+            self.index_built()
+
+        if field in self.sorted:
+            values, order = self.sorted[field]
+            if field == 'size':
+                value = tuple(SIZES.get(v, v) for v in value) \
+                    if isinstance(value, tuple) else SIZES.get(value, value)
+            low, high = value if isinstance(value, tuple) else (value, value)
+            start = 0 if low is None else bisect.bisect_left(values, low)
+            end = len(values) if high is None \
+                else bisect.bisect_right(values, high)
+            return set(order[start:end])
+
+        if field in self.inverted:
+            index = self.inverted[field]
+            if not isinstance(value, (list, tuple, set)):
+                value = [value]
+            matches = None
+            for v in value:
+                found = index.get(v, set())
+                matches = found if matches is None else matches & found
+            return set(matches) if matches is not None \
+                else set(range(len(self.specs)))
+
+        raise KeyError("Unknown field: %s" % field)
+
+    def select(self, **criteria):
+        """ Return stat blocks matching all criteria, e.g.
+        select(cr=(2, 4), category='undead', immune='poison')
+
+        :rtype                    [CreatureSpec, ...] """
+        matches = None
+        for field, value in criteria.items():
+            found = self.match(field, value)
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        if matches is None:
+            return list(self.specs)
+        return [self.specs[i] for i in sorted(matches)]
@@ -0,0 +1,254 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import struct
+import world
+
+""" Recorder of creature decisions for training creature behavior
+offline.
+
+Usage:
+
+    with DecisionRecorder('decisions') as rec:
+        simulate(matches=10000, team_a=[npc.troll], team_b=[pc.ogno],
+                 record=rec, quiet=True)
+
+    shards = load('decisions')              # needs NumPy
+    shards[0]['grid'].shape                 # (n, 11, 11)
+
+Every time a creature's behavior runs (once per attack action) one
+fixed-size record is written. A record holds the creature's local view
+of the map before the decision, its own state, the chosen target,
+weapon and move, and the outcome of the match for the creature's team.
+Records of a match are kept until the match is over and then appended
+to binary shards. ´layout.json´ describes the records as a NumPy
+structured dtype, so that shards can be memory-mapped with
+numpy.memmap(). """
+
+""" Recorder used by creatures, set by simulate() during a match """
+ACTIVE = None
+
+""" Cell codes of the local view """
+EMPTY = 0
+ALLY = 1
+ENEMY = 2
+CORPSE = 3
+
+""" Match outcomes of the creature's team """
+LOSS = -1
+DRAW = 0
+WIN = 1
+
+""" Fixed record fields as (name, struct code, NumPy dtype). Positions
+are in map cells relative to the creature's position before the
+decision. Weapons are numbered over melee and then ranged attacks,
+´basic´ before ´special´; -1 marks a missing weapon and (0, 0) a
+missing target """
+FIELDS = (('match', 'I', '<u4'),
+          ('turn', 'H', '<u2'),
+          ('hp', 'h', '<i2'),
+          ('max_hp', 'h', '<i2'),
+          ('ac', 'b', 'i1'),
+          ('speed', 'h', '<i2'),
+          ('target_dx', 'h', '<i2'),
+          ('target_dy', 'h', '<i2'),
+          ('target_hp', 'h', '<i2'),
+          ('target_ac', 'b', 'i1'),
+          ('weapon', 'b', 'i1'),
+          ('move_dx', 'h', '<i2'),
+          ('move_dy', 'h', '<i2'),
+          ('attacked', 'b', 'i1'),
+          ('outcome', 'b', 'i1'))
+
+
+""" Value ranges of the struct codes used in FIELDS """
+LIMITS = {'I': (0, 2 ** 32 - 1), 'H': (0, 2 ** 16 - 1),
+          'h': (-2 ** 15, 2 ** 15 - 1), 'b': (-128, 127)}
+
+
+def clip(values):
+    """ Return record values clipped to the ranges of their fields """
+    return [min(max(int(v), LIMITS[code][0]), LIMITS[code][1])
+            for v, (_, code, _) in zip(values, FIELDS)]
+
+
+class DecisionRecorder:
+
+    """ Streams decision records to sharded binary files
+
+    :param path               output directory
+    :param radius             radius of the local view in map cells
+    :param shard_size         number of records per shard file
+
+    :type path                str
+    :type radius              int
+    :type shard_size          int """
+
+    def __init__(self, path, radius=5, shard_size=1 << 20):
+        self.path = path
+        self.radius = radius
+        self.shard_size = shard_size
+        self.side = 2 * radius + 1
+        self.struct = struct.Struct(
+            '<' + ''.join(code for _, code, _ in FIELDS)
+            + '%ib' % self.side ** 2)
+        self.matches = 0
+        self.records = 0
+        self.shard = None
+        self.shards = 0
+        self.pending = []    # Records of the current match
+        self.before = None   # State before the running decision
+        self.weapons = {}    # Creature -> {weapon id: weapon number}
+
+        os.makedirs(path, exist_ok=True)
+        layout = {'radius': radius,
+                  'record_size': self.struct.size,
+                  'dtype': [[name, dtype] for name, _, dtype in FIELDS]
+                           + [['grid', 'i1', [self.side, self.side]]],
+                  'cells': {'empty': EMPTY, 'ally': ALLY, 'enemy': ENEMY,
+                            'corpse': CORPSE},
+                  'outcomes': {'loss': LOSS, 'draw': DRAW, 'win': WIN}}
+        with open(os.path.join(path, 'layout.json'), 'w') as f:
+            json.dump(layout, f, indent=1)
+
+    def __repr__(self):
+        return "DecisionRecorder(%s, %i records)" % (self.path, self.records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def view(self, creature):
+        """ Return local view of the map around a creature as a flat
+        list of cell codes, row by row """
+        x, y, _ = creature.position
+        radius = self.radius
+        side = self.side
+        grid = [EMPTY] * side ** 2
+        occupied = world.Map.occupied
+
+        """ Scan whichever is smaller, the occupants or the view """
+        if len(occupied) + len(world.Map.statics) < side ** 2:
+            cells = [(pos, CORPSE) for pos in world.Map.statics]
+            cells += [(pos, ALLY if c.party == creature.party else ENEMY)
+                      for pos, c in occupied.items()]
+            for (px, py, _), code in cells:
+                dx = px - x + radius
+                dy = py - y + radius
+                if 0 <= dx < side and 0 <= dy < side:
+                    grid[dy * side + dx] = code
+        else:
+            statics = world.Map.statics
+            for dy in range(side):
+                for dx in range(side):
+                    pos = (x + dx - radius, y + dy - radius, 0)
+                    occupant = occupied.get(pos)
+                    if occupant is not None:
+                        grid[dy * side + dx] = ALLY \
+                            if occupant.party == creature.party else ENEMY
+                    elif pos in statics:
+                        grid[dy * side + dx] = CORPSE
+        return grid
+
+    def begin(self, creature):
+        """ Capture the state before a creature's decision """
+        self.before = (creature.position, creature.hp,
+                       creature.hits + creature.misses,
+                       self.view(creature))
+
+    def end(self, creature):
+        """ Record the decision of a creature after its behavior ran """
+        position, hp, attacks, grid = self.before
+        x, y, _ = position
+
+        target = creature.focused_enemy
+        if target is not None:
+            tx, ty, _ = target.position
+            target_values = (tx - x, ty - y, target.hp, target.ac)
+        else:
+            target_values = (0, 0, 0, 0)
+
+        numbers = self.weapons.get(creature)
+        if numbers is None:
+            weapons = [w for attacks_ in (creature.melee_attacks,
+                                          creature.ranged_attacks)
+                       for key in sorted(attacks_) for w in attacks_[key]]
+            numbers = {}
+            for i, w in enumerate(weapons):
+                numbers.setdefault(id(w), i)
+            self.weapons[creature] = numbers
+        weapon = numbers.get(id(creature.active_weapon), -1)
+
+        ex, ey, _ = creature.position
+        self.pending.append(
+            (creature.party,
+             (self.matches, creature.turns_alive, hp, creature.max_hp,
+              creature.ac, creature.speed['ground'])
+             + target_values
+             + (weapon, ex - x, ey - y,
+                int(creature.hits + creature.misses > attacks)),
+             grid))
+        self.before = None
+
+    def end_match(self, encounter, winner):
+        """ Write records of a finished match with its outcome
+
+        :type encounter           main.Encounter
+        :type winner              str """
+        pack = self.struct.pack
+        for party, values, grid in self.pending:
+            if winner == party:
+                outcome = WIN
+            elif winner in (encounter.party1.name, encounter.party2.name):
+                outcome = LOSS
+            else:
+                outcome = DRAW
+            values += (outcome,)
+            try:
+                record = pack(*values, *grid)
+            except struct.error:
+                record = pack(*clip(values), *grid)
+            self.write(record)
+        self.pending = []
+        self.weapons = {}
+        self.matches += 1
+
+    def write(self, record):
+        """ Append a packed record to the current shard """
+        if self.shard is None or self.records % self.shard_size == 0:
+            if self.shard is not None:
+                self.shard.close()
+            filename = "shard-%05i.bin" % self.shards
+            self.shard = open(os.path.join(self.path, filename), 'wb')
+            self.shards += 1
+        self.shard.write(record)
+        self.records += 1
+
+    def close(self):
+        """ Close the current shard. Records of an unfinished match are
+        discarded """
+        self.pending = []
+        if self.shard is not None:
+            self.shard.close()
+            self.shard = None
+
+
+def load(path):
+    """ Return shards of a recording as memory-mapped NumPy record
+    arrays. Needs NumPy
+
+    :type path                str
+    :rtype                    [numpy.memmap, ...] """
+    import numpy
+    with open(os.path.join(path, 'layout.json')) as f:
+        layout = json.load(f)
+    dtype = numpy.dtype([tuple(field[:2]) + tuple(tuple(s) for s
+                                                  in field[2:])
+                         for field in layout['dtype']])
+    assert dtype.itemsize == layout['record_size']
+    return [numpy.memmap(os.path.join(path, name), dtype=dtype, mode='r')
+            for name in sorted(os.listdir(path)) if name.endswith('.bin')]
@@ -0,0 +1,88 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from creature import BaseCreature
+
+""" Lazy creature registry.
+
+Stat blocks in definitions are declared as CreatureSpecs: the plain
+values of a BaseCreature (name, CR, AC, HP, speed, size, scores,
+resistances...) are kept as metadata, and weapons, abilities and other
+objects are created by a ´build´ function the first time the creature
+is used. Specs are class attributes that return the built creature, so
+
+    npc.troll                      # builds the troll on first access
+    get_specs(npc)['troll'].cr     # reads metadata without building
+
+Builders only pay for the creatures they use, and listing creatures
+does not build any. """
+
+
+class CreatureSpec:
+
+    """ Stat block that is built into a BaseCreature on first use
+
+    :param build              function returning the remaining
+                              BaseCreature arguments as a dict, e.g.
+                              melee_attacks and passives
+    :param stats              BaseCreature arguments known up front
+
+    :type build               function
+    :type stats               dict """
+
+    def __init__(self, build=None, **stats):
+        self.build = build
+        self.stats = stats
+        self.key = None        # Attribute name, e.g. ´black_bear´
+        self.creature = None
+
+    def __set_name__(self, owner, name):
+        self.key = name
+
+    def __get__(self, instance, owner=None):
+        return self.get()
+
+    def __getattr__(self, name):
+        """ Metadata of the stat block, e.g. spec.cr """
+        stats = self.__dict__.get('stats', {})
+        if name in stats:
+            return stats[name]
+        raise AttributeError(name)
+
+    def __repr__(self):
+        """ Same as repr() of the built creature before battle """
+        CR = {0.125: "1/8", 0.25: "1/4", 0.5: "1/2"}
+        name = self.stats['name'].upper()
+        indentation = " " * (20 - len(name))
+        return "%s%sAC %i | HP %i | Init %i | CR %s | Speed %i" \
+               % (name,
+                  indentation,
+                  self.stats['ac'],
+                  self.stats['hp'],
+                  0,
+                  CR.get(self.stats['cr'], str(self.stats['cr'])),
+                  self.stats['speed'])
+
+    @property
+    def is_built(self):
+        return self.creature is not None
+
+    def get(self):
+        """ Return the creature, building it on first use
+
+        :rtype                    BaseCreature """
+        if self.creature is None:
+            arguments = dict(self.stats)
+            if self.build is not None:
+                arguments.update(self.build())
+            self.creature = BaseCreature(**arguments)
+        return self.creature
+
+
+def get_specs(namespace):
+    """ Return specs of a namespace such as definitions.Creatures by
+    attribute name, in definition order, without building them
+
+    :rtype                    {str: CreatureSpec} """
+    return {key: value for key, value in vars(namespace).items()
+            if isinstance(value, CreatureSpec)}
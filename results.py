@@ -0,0 +1,570 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import array
+import math
+
+""" Results of simulate() as a compact object.
+
+Usage:
+
+    result = simulate(matches=1000, team_a=[npc.troll], team_b=[pc.ogno],
+                      quiet=True)
+    result.win_rate('Team North')          # 0.64
+    result.confidence_interval('Team North')
+    result.mean('Team North', 'TROLL', 'damage_dealt')
+    result.by_type()['troll']['kills']
+    result.to_pandas()                      # needs pandas
+    result.merge(other_result)
+    result.draws                            # {'no damage': 12}
+    result.tabulate()
+
+Only running sums are kept: wins per team, a histogram of round counts
+and per-creature stat totals, so memory does not grow with the number
+of matches. """
+
+""" Creature stats collected per match """
+STATS = ('turns_alive', 'damage_dealt', 'kills', 'deaths', 'suicides',
+         'hits', 'misses')
+
+""" Column headers of the printed table """
+HEADERS = ('avg.lt', 'avg.dmg', 'kills', 'deaths', 'suicid.', 'hits',
+           'misses')
+
+""" Stats printed as averages per match rather than totals """
+AVERAGED = ('turns_alive', 'damage_dealt')
+
+""" Winner of drawn matches, as returned by Encounter.fight() """
+DRAW = 'No-one'
+
+
+def wilson(successes, trials, z=1.96):
+    """ Return Wilson score interval of a binomial proportion
+
+    :type successes           int
+    :type trials              int
+    :type z                   float
+    :rtype                    (float, float) """
+    if not trials:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z ** 2 / trials
+    centre = p + z ** 2 / (2 * trials)
+    margin = z * math.sqrt(p * (1 - p) / trials
+                           + z ** 2 / (4 * trials ** 2))
+    return (max((centre - margin) / denominator, 0.0),
+            min((centre + margin) / denominator, 1.0))
+
+
+class SimulationResult:
+
+    """ Win counts, round counts and creature stats of simulated
+    matches
+
+    :param teams              names of the teams in printing order
+
+    :type teams               (str, str) """
+
+    def __init__(self, teams=()):
+        self.teams = list(teams)
+        self.matches = 0
+        self.wins = {}              # Team or DRAW -> number of wins
+        self.draws = {}             # Draw reason -> number of draws
+        self.rounds = array.array('q')  # Number of matches per round count
+        self.index = {}             # (team, creature name) -> row
+        self.types = []             # Creature type of each row
+        self.sums = array.array('d')    # Stat totals, len(STATS) per row
+        self.squares = array.array('d') # Sums of squared stats
+        self._by_type = None
+
+    def __repr__(self):
+        wins = ', '.join("%s %.1f%%" % (k, 100 * self.win_rate(k))
+                         for k in self.wins)
+        return "SimulationResult(%i matches: %s)" % (self.matches, wins)
+
+    def row(self, team, creature):
+        """ Return stat row of a creature, adding a new row if needed """
+        key = (team, creature.name)
+        row = self.index.get(key)
+        if row is None:
+            row = len(self.types)
+            self.index[key] = row
+            self.types.append(creature.type)
+            self.sums.extend([0.0] * len(STATS))
+            self.squares.extend([0.0] * len(STATS))
+            if team not in self.teams:
+                self.teams.append(team)
+        return row
+
+    def add(self, encounter, winner):
+        """ Add a finished match
+
+        :type encounter           main.Encounter
+        :type winner              str """
+        self.matches += 1
+        self.wins[winner] = self.wins.get(winner, 0) + 1
+        if winner == DRAW:
+            reason = getattr(encounter, 'draw_reason', None) or 'round cap'
+            self.draws[reason] = self.draws.get(reason, 0) + 1
+        for team in (encounter.party1.name, encounter.party2.name):
+            self.wins.setdefault(team, 0)
+
+        while len(self.rounds) <= encounter.rounds:
+            self.rounds.append(0)
+        self.rounds[encounter.rounds] += 1
+
+        width = len(STATS)
+        sums = self.sums
+        squares = self.squares
+        for party in (encounter.party1, encounter.party2):
+            for creature in party.members:
+                offset = self.row(party.name, creature) * width
+                for i, stat in enumerate(STATS):
+                    value = getattr(creature, stat)
+                    sums[offset + i] += value
+                    squares[offset + i] += value * value
+        self._by_type = None
+
+    def merge(self, other):
+        """ Add results of another run to this one and return self
+
+        :type other               SimulationResult
+        :rtype                    SimulationResult """
+        self.matches += other.matches
+        for team, wins in other.wins.items():
+            self.wins[team] = self.wins.get(team, 0) + wins
+        for reason, draws in other.draws.items():
+            self.draws[reason] = self.draws.get(reason, 0) + draws
+
+        while len(self.rounds) < len(other.rounds):
+            self.rounds.append(0)
+        for rounds, count in enumerate(other.rounds):
+            self.rounds[rounds] += count
+
+        width = len(STATS)
+        for (team, name), other_row in other.index.items():
+            row = self.index.get((team, name))
+            if row is None:
+                row = len(self.types)
+                self.index[(team, name)] = row
+                self.types.append(other.types[other_row])
+                self.sums.extend([0.0] * width)
+                self.squares.extend([0.0] * width)
+                if team not in self.teams:
+                    self.teams.append(team)
+            for i in range(width):
+                self.sums[row * width + i] += other.sums[other_row * width + i]
+                self.squares[row * width + i] += \
+                    other.squares[other_row * width + i]
+        self._by_type = None
+        return self
+
+    def __add__(self, other):
+        return SimulationResult(self.teams).merge(self).merge(other)
+
+    def win_rate(self, team):
+        """ Return share of matches won by a team (or DRAW) """
+        return self.wins.get(team, 0) / (self.matches or 1)
+
+    def confidence_interval(self, team, z=1.96):
+        """ Return Wilson score interval of the win rate of a team, by
+        default at 95% confidence
+
+        :rtype                    (float, float) """
+        return wilson(self.wins.get(team, 0), self.matches, z)
+
+    def creatures(self, team=None):
+        """ Return names of creatures, optionally only of a team, in
+        alphabetical order """
+        return sorted(name for t, name in self.index
+                      if team is None or t == team)
+
+    def total(self, team, name, stat):
+        """ Return sum of a creature's stat over all matches """
+        return self.sums[self.index[(team, name)] * len(STATS)
+                         + STATS.index(stat)]
+
+    def mean(self, team, name, stat):
+        """ Return mean of a creature's stat per match """
+        return self.total(team, name, stat) / (self.matches or 1)
+
+    def std(self, team, name, stat):
+        """ Return standard deviation of a creature's stat per match """
+        n = self.matches
+        if n < 2:
+            return 0.0
+        mean = self.mean(team, name, stat)
+        squares = self.squares[self.index[(team, name)] * len(STATS)
+                               + STATS.index(stat)]
+        return math.sqrt(max(squares / n - mean ** 2, 0.0) * n / (n - 1))
+
+    def mean_rounds(self):
+        """ Return mean number of rounds per match """
+        return sum(r * c for r, c in enumerate(self.rounds)) \
+               / (self.matches or 1)
+
+    def by_type(self):
+        """ Return stat totals grouped by creature type. Computed on
+        first use after new matches have been added
+
+        :rtype                    {str: {str: float}} """
+        if self._by_type is None:
+            width = len(STATS)
+            groups = {}
+            for row, type_ in enumerate(self.types):
+                group = groups.setdefault(type_, dict.fromkeys(STATS, 0.0))
+                for i, stat in enumerate(STATS):
+                    group[stat] += self.sums[row * width + i]
+            self._by_type = groups
+        return self._by_type
+
+    def to_pandas(self):
+        """ Return creature stats as a pandas DataFrame with one row per
+        creature. Needs pandas
+
+        :rtype                    pandas.DataFrame """
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError("to_pandas() needs pandas")
+        width = len(STATS)
+        rows = []
+        for (team, name), row in sorted(self.index.items()):
+            record = {'team': team, 'creature': name,
+                      'type': self.types[row], 'matches': self.matches}
+            for i, stat in enumerate(STATS):
+                record[stat] = self.sums[row * width + i]
+            rows.append(record)
+        return pandas.DataFrame(rows)
+
+    def summary(self):
+        """ Print win rates """
+        print('SIMULATION SUMMARY')
+        print('=='*40)
+        for team, wins in self.wins.items():
+            if wins:
+                print('{team} wins {rate}% of the matches'.format(
+                    team=team, rate=100 * wins / self.matches))
+        if self.draws:
+            print('Draws: ' + ', '.join(
+                '%s %i' % item for item in sorted(self.draws.items())))
+        print('\n')
+
+    def tabulate(self):
+        """ Print creature stats of both teams """
+        for team in self.teams:
+            print(team)
+            print('--'*40)
+            row_format = "{:8}" * (len(HEADERS) + 1)
+            print(row_format.format(*HEADERS, "CREATURE"))
+            for name in self.creatures(team):
+                row = []
+                for stat in STATS:
+                    if stat in AVERAGED:
+                        row.append("%.2f" % self.mean(team, name, stat))
+                    else:
+                        row.append("%i" % self.total(team, name, stat))
+                print(row_format.format(*row, name.capitalize()[0:24]))
+            print('--'*40)
+            print('\n')
+
+    def report(self):
+        """ Print summary and creature stats """
+        self.summary()
+        self.tabulate()
+
+
+class Comparison:
+
+    """ Paired comparison of a team's win rate between a base match and
+    a variant fought on common random numbers, see main.compare()
+
+    :param team               team whose win rate is compared
+
+    :type team                str """
+
+    def __init__(self, team):
+        self.team = team
+        self.base = SimulationResult()
+        self.variant = SimulationResult()
+        self.pairs = 0
+        self.sum = 0.0              # Sum of paired differences
+        self.squares = 0.0          # Sum of squared paired differences
+
+    def __repr__(self):
+        low, high = self.confidence_interval()
+        return "Comparison(%i pairs: %+.1f%% [%+.1f%%, %+.1f%%])" \
+               % (self.pairs, 100 * self.difference, 100 * low, 100 * high)
+
+    def add(self, base, variant):
+        """ Add the team's wins (1, 0 or a mean over antithetic matches)
+        in the base match and its variant """
+        self.pairs += 1
+        self.sum += variant - base
+        self.squares += (variant - base) ** 2
+
+    @property
+    def difference(self):
+        """ Difference of win rates, variant minus base """
+        return self.sum / (self.pairs or 1)
+
+    def get_variance(self):
+        """ Variance of the mean paired difference """
+        if self.pairs < 2:
+            return 0.0
+        mean = self.difference
+        return (self.squares - self.pairs * mean ** 2) \
+            / (self.pairs - 1) / self.pairs
+
+    def confidence_interval(self, z=1.96):
+        """ Return the paired confidence interval of the difference
+
+        :rtype                    (float, float) """
+        margin = z * math.sqrt(max(self.get_variance(), 0.0))
+        return self.difference - margin, self.difference + margin
+
+    def get_efficiency(self):
+        """ Return how many times more matches two independent runs would
+        need for the same confidence interval """
+        paired = self.get_variance()
+        if not paired:
+            return 1.0
+        independent = 0.0
+        for result in (self.base, self.variant):
+            rate = result.win_rate(self.team)
+            independent += rate * (1 - rate) / (result.matches or 1)
+        return independent / paired
+
+    def report(self):
+        """ Print win rates and their paired difference """
+        low, high = self.confidence_interval()
+        print('PAIRED COMPARISON')
+        print('=='*40)
+        print('{team} wins {base:.1f}% of the base matches and {variant:.1f}%'
+              ' of the variants'.format(
+                  team=self.team,
+                  base=100 * self.base.win_rate(self.team),
+                  variant=100 * self.variant.win_rate(self.team)))
+        print('Difference {diff:+.1f}% (95% CI {low:+.1f}% to {high:+.1f}%)'
+              ' over {pairs} pairs, {eff:.1f}x fewer matches than'
+              ' independent runs'.format(
+                  diff=100 * self.difference, low=100 * low,
+                  high=100 * high, pairs=self.pairs,
+                  eff=self.get_efficiency()))
+        print('\n')
+
+
+class RiskEstimate:
+
+    """ Probability of a rare event estimated from importance-sampled
+    matches, see main.estimate_risk(). Each match adds its likelihood
+    ratio ´weight´ and whether the event happened; the mean of weighted
+    events is an unbiased estimate of the probability under fair dice """
+
+    def __init__(self):
+        self.matches = 0
+        self.events = 0             # Matches where the event happened
+        self.weights = 0.0          # Sum of weights
+        self.squared_weights = 0.0
+        self.sum = 0.0              # Sum of weights of events
+        self.squares = 0.0          # Sum of squared weights of events
+
+    def __repr__(self):
+        low, high = self.confidence_interval()
+        return "RiskEstimate(%i matches: %.3g%% [%.3g%%, %.3g%%])" \
+               % (self.matches, 100 * self.probability, 100 * low,
+                  100 * high)
+
+    def add(self, weight, event):
+        """ Add a match
+
+        :type weight              float
+        :type event               bool """
+        self.matches += 1
+        self.weights += weight
+        self.squared_weights += weight * weight
+        if event:
+            self.events += 1
+            self.sum += weight
+            self.squares += weight * weight
+
+    @property
+    def probability(self):
+        return self.sum / (self.matches or 1)
+
+    def get_variance(self):
+        """ Variance of the estimate """
+        if self.matches < 2:
+            return 0.0
+        mean = self.probability
+        return max(self.squares - self.matches * mean ** 2, 0.0) \
+            / (self.matches - 1) / self.matches
+
+    def confidence_interval(self, z=1.96):
+        margin = z * math.sqrt(self.get_variance())
+        return max(self.probability - margin, 0.0), self.probability + margin
+
+    @property
+    def relative_error(self):
+        """ Standard error relative to the estimate """
+        if not self.probability:
+            return math.inf
+        return math.sqrt(self.get_variance()) / self.probability
+
+    @property
+    def effective_matches(self):
+        """ Effective sample size (sum of weights)^2 / sum of squared
+        weights; far fewer than the matches means a few heavy matches
+        dominate and the tilt is too strong """
+        if not self.squared_weights:
+            return 0.0
+        return self.weights ** 2 / self.squared_weights
+
+    @property
+    def plain_matches(self):
+        """ Matches plain Monte Carlo would need for the same variance """
+        variance = self.get_variance()
+        if not variance:
+            return 0.0
+        return self.probability * (1 - self.probability) / variance
+
+    def report(self):
+        """ Print the estimate and its diagnostics. The mean weight
+        should be close to 1 """
+        low, high = self.confidence_interval()
+        print('RARE EVENT ESTIMATE')
+        print('=='*40)
+        print('Probability {p:.4g}% (95% CI {low:.4g}% to {high:.4g}%),'
+              ' relative error {err:.1%}'.format(
+                  p=100 * self.probability, low=100 * low,
+                  high=100 * high, err=self.relative_error))
+        print('{events} events in {matches} matches, mean weight {mean:.3f},'
+              ' effective sample size {ess:.0f}'.format(
+                  events=self.events, matches=self.matches,
+                  mean=self.weights / (self.matches or 1),
+                  ess=self.effective_matches))
+        print('Plain Monte Carlo would need about {n:.0f} matches'.format(
+            n=self.plain_matches))
+        print('\n')
+
+
+class CampaignResult:
+
+    """ Results of chains of encounters fought by the same party, see
+    campaign.simulate(). ´steps´ holds a SimulationResult of every
+    encounter of the chain; chains whose party has been killed do not
+    reach the following encounters
+
+    :param stages             number of encounters in a chain
+    :param team               name of the party's team
+
+    :type stages              int
+    :type team                str """
+
+    def __init__(self, stages=0, team=''):
+        self.team = team
+        self.members = []               # Names of the party members
+        self.chains = 0
+        self.steps = [SimulationResult() for _ in range(stages)]
+        self.survived = [0] * stages    # Chains with a living party after
+                                        # each encounter
+        self.alive = [{} for _ in range(stages)]   # Member -> chains alive
+        self.hp = [0.0] * stages        # Sums of the party's HP share
+
+    def __repr__(self):
+        survival = ', '.join("%.1f%%" % (100 * self.survival(i))
+                             for i in range(len(self.steps)))
+        return "CampaignResult(%i chains: survival %s)" % (self.chains,
+                                                          survival)
+
+    def add(self, step, encounter, winner, party):
+        """ Add an encounter of a chain. The chain is counted at its
+        first encounter
+
+        :param step               index of the encounter in the chain
+        :param party              party members, dead or alive
+        :type step                int
+        :type encounter           main.Encounter
+        :type winner              str
+        :type party               [BaseCreature, ...] """
+        if step == 0:
+            self.chains += 1
+            for creature in party:
+                if creature.name not in self.members:
+                    self.members.append(creature.name)
+        self.steps[step].add(encounter, winner)
+        living = [c for c in party if not c.is_dead]
+        if living:
+            self.survived[step] += 1
+        alive = self.alive[step]
+        for creature in living:
+            alive[creature.name] = alive.get(creature.name, 0) + 1
+        self.hp[step] += sum(max(c.hp, 0) / max(c.max_hp, 1)
+                             for c in living) / (len(party) or 1)
+
+    def merge(self, other):
+        """ Add results of other chains of the same campaign and return
+        self
+
+        :type other               CampaignResult
+        :rtype                    CampaignResult """
+        self.chains += other.chains
+        for name in other.members:
+            if name not in self.members:
+                self.members.append(name)
+        for i, step in enumerate(other.steps):
+            self.steps[i].merge(step)
+            self.survived[i] += other.survived[i]
+            self.hp[i] += other.hp[i]
+            for name, count in other.alive[i].items():
+                self.alive[i][name] = self.alive[i].get(name, 0) + count
+        return self
+
+    def survival(self, step):
+        """ Return share of chains whose party is alive after an
+        encounter """
+        return self.survived[step] / (self.chains or 1)
+
+    def confidence_interval(self, step, z=1.96):
+        """ Return Wilson score interval of the survival after an
+        encounter
+
+        :rtype                    (float, float) """
+        return wilson(self.survived[step], self.chains, z)
+
+    def member_survival(self, step, name):
+        """ Return share of chains where a member is alive after an
+        encounter """
+        return self.alive[step].get(name, 0) / (self.chains or 1)
+
+    def mean_hp(self, step):
+        """ Return mean share of the party's HP left after an
+        encounter, counting dead members and wiped parties as 0 """
+        return self.hp[step] / (self.chains or 1)
+
+    def report(self):
+        """ Print survival and remaining HP after each encounter """
+        print('CAMPAIGN SUMMARY')
+        print('=='*40)
+        row_format = "{:6}{:>9}{:>9}{:>11}{:>17}{:>9}"
+        print(row_format.format('STEP', 'CHAINS', 'WINS', 'SURVIVAL',
+                                '95% CI', 'HP LEFT'))
+        for i, step in enumerate(self.steps):
+            low, high = self.confidence_interval(i)
+            print(row_format.format(
+                i + 1, step.matches,
+                "%.1f%%" % (100 * step.wins.get(self.team, 0)
+                            / (self.chains or 1)),
+                "%.1f%%" % (100 * self.survival(i)),
+                "%.1f-%.1f%%" % (100 * low, 100 * high),
+                "%.1f%%" % (100 * self.mean_hp(i))))
+        print('--'*40)
+        print("{:24}".format("MEMBER ALIVE AFTER STEP")
+              + "".join("{:>8}".format(i + 1)
+                        for i in range(len(self.steps))))
+        for name in self.members:
+            print("{:24}".format(name.capitalize()[0:24])
+                  + "".join("{:>8}".format(
+                      "%.1f%%" % (100 * self.member_survival(i, name)))
+                            for i in range(len(self.steps))))
+        print('\n')
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import operator
+
+""" Timer wheel for condition durations, saves and recharges.
+
+Conditions register their per-turn checks when they are applied, and
+the checks fire only at the turns they are due, so creatures without
+conditions pay nothing at the beginning and end of their turns.
+
+Events are plain tuples (priority, creature, name) kept in buckets
+keyed by (round, initiative slot, phase), where phase is ´begin´ or
+´end´ of the creature's turn. The creature runs the events of its own
+bucket in order of priority, see BaseCreature.run_timers(). """
+
+BEGIN = 'begin'
+END = 'end'
+
+
+class Wheel:
+
+    """ Timer wheel and clock of the running encounter. Like world.Map
+    this is global state; parallel encounters swap it with get_state()
+    and set_state() """
+
+    round = 1          # Current round
+    slot = -1          # Initiative slot of the acting creature, -1
+                       # before the first turn
+    buckets = {}       # (round, slot, phase) -> [(priority, creature, name)]
+    encounter = None   # Encounter playing the round, for behaviors
+                       # that search ahead, see behavior.MonteCarlo
+
+    @classmethod
+    def reset(cls):
+        cls.round = 1
+        cls.slot = -1
+        cls.buckets = {}
+
+    @classmethod
+    def get_state(cls):
+        return cls.round, cls.slot, cls.buckets
+
+    @classmethod
+    def set_state(cls, state):
+        cls.round, cls.slot, cls.buckets = state
+
+    @classmethod
+    def schedule(cls, creature, phase, priority, name, next_turn=False):
+        """ Register an event for the next ´phase´ of a creature's turn.
+        Events already registered for the creature are not added again
+
+        :param next_turn          skip the rest of the current turn, for
+                                  events that reschedule themselves """
+        if (phase, name) in creature.timers:
+            return
+        creature.timers.add((phase, name))
+
+        """ Next turn is due this round if the creature has not yet
+        reached the phase """
+        round_ = cls.round
+        if next_turn or creature.slot < cls.slot \
+                or (creature.slot == cls.slot and phase == BEGIN):
+            round_ += 1
+        cls.buckets.setdefault((round_, creature.slot, phase), []).append(
+            (priority, creature, name))
+
+    @classmethod
+    def pop(cls, creature, phase):
+        """ Remove and return events due for a creature now, in order
+        of priority """
+        events = cls.buckets.pop((cls.round, creature.slot, phase), None)
+        if not events:
+            return ()
+        events.sort(key=operator.itemgetter(0))
+        for _, _, name in events:
+            creature.timers.discard((phase, name))
+        return events
+
+    @classmethod
+    def defer(cls, creature, phase, events):
+        """ Move events to the creature's next turn """
+        for priority, _, name in events:
+            cls.schedule(creature, phase, priority, name, next_turn=True)
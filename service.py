@@ -0,0 +1,449 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+""" Local simulation service :: HTTP/JSON over asyncio
+
+  Keeps a pool of worker processes with the bestiary already imported
+  so that each simulation request does not pay for interpreter startup
+  and the import of definitions.py. Runs fully offline; bind it to
+  localhost and call it from the DM tool.
+
+      python service.py --port 8765 --workers 4
+
+  Endpoints
+
+      POST   /jobs              submit encounter, returns job status
+      GET    /jobs              list jobs
+      GET    /jobs/<id>         job status and partial results
+      GET    /jobs/<id>/events  stream progress as JSON lines
+      DELETE /jobs/<id>         cancel job
+      GET    /creatures         list creature object names
+
+  Encounter spec (POST body)
+
+      {"team_a": ["npc.troll", "npc.troll"],
+       "team_b": ["pc.ogno"],
+       "matches": 1000,
+       "priority": 0,           higher runs first
+       "seed": null,            optional base seed
+       "stream": false}         stream progress in the response
+
+  Matches are split into chunks that are queued by job priority and
+  run on the pool. Progress and partial win rates are published after
+  each chunk. Identical encounters submitted while a previous one is
+  still queued or running share the same job.
+
+  Specs of more than --max-matches matches are rejected. Finished,
+  failed and cancelled jobs are kept for --ttl seconds, so that their
+  results can be fetched, and are then forgotten.
+
+"""
+
+HOST = '127.0.0.1'
+PORT = 8765
+CHUNK_SIZE = 50
+MAX_MATCHES = 10**6     # Matches a single spec may ask for
+JOB_TTL = 600           # Seconds finished jobs are kept
+
+STATUS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request',
+          404: 'Not Found', 405: 'Method Not Allowed',
+          500: 'Internal Server Error'}
+
+
+""" ================================================================ """
+""" ======================== WORKER PROCESS ======================== """
+""" ================================================================ """
+
+def warm_up():
+    """ Pool initializer: import the simulator and the bestiary once
+    per worker process """
+    import main
+    import messages
+    messages.VERBOSE_LEVEL = 0
+
+
+def run_chunk(team_a, team_b, matches, seed):
+    """ Run a chunk of matches in a worker and return winner counts
+
+    :type team_a              [str, ...]
+    :type team_b              [str, ...]
+    :rtype                    {str: int} """
+    import main
+    import messages
+    messages.VERBOSE_LEVEL = 0
+    random.seed(seed)
+    a = [main.get_creature(name) for name in team_a]
+    b = [main.get_creature(name) for name in team_b]
+    wins = Counter()
+    for i in range(matches):
+        encounter = main.setup_encounter(a, b)
+        wins[encounter.fight()] += 1
+    return dict(wins)
+
+
+""" ================================================================ """
+""" ============================ JOBS ============================== """
+""" ================================================================ """
+
+class Job:
+
+    """ Simulation job split into chunks of matches
+
+    :param id                 job id
+    :param spec               normalized encounter spec
+    :param key                deduplication key of the spec """
+
+    def __init__(self, id, spec, key):
+        self.id = id
+        self.spec = spec
+        self.key = key
+        self.priority = spec['priority']
+        self.status = 'queued'
+        self.wins = Counter()
+        self.done = 0
+        self.pending = 0
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.listeners = []
+
+    @property
+    def is_active(self):
+        return self.status in ('queued', 'running')
+
+    def snapshot(self):
+        """ Return job status as JSON serializable dict """
+        matches = self.spec['matches']
+        rates = {k: v / self.done for k, v in self.wins.items()} \
+            if self.done else {}
+        return {'id': self.id,
+                'status': self.status,
+                'priority': self.priority,
+                'matches': matches,
+                'done': self.done,
+                'progress': self.done / matches,
+                'wins': dict(self.wins),
+                'win_rates': rates,
+                'error': self.error,
+                'spec': self.spec}
+
+    def publish(self):
+        event = self.snapshot()
+        for queue in self.listeners:
+            queue.put_nowait(event)
+
+
+class Service:
+
+    """ Job queue and warm worker pool
+
+    :param workers            number of worker processes
+    :param chunk_size         matches per chunk
+    :param max_matches        largest number of matches of a spec
+    :param ttl                seconds finished jobs are kept """
+
+    def __init__(self, workers=None, chunk_size=CHUNK_SIZE,
+                 max_matches=MAX_MATCHES, ttl=JOB_TTL):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.max_matches = max_matches
+        self.ttl = ttl
+        self.pool = None
+        self.queue = None
+        self.jobs = {}
+        self.active = {}
+        self.ids = itertools.count(1)
+        self.order = itertools.count()
+        self.runners = []
+
+    async def start(self):
+        """ Start worker processes and wait until they are warm """
+        loop = asyncio.get_running_loop()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                        initializer=warm_up)
+        self.queue = asyncio.PriorityQueue()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, time.sleep, 0.01)
+                               for i in range(self.workers)])
+        self.runners = [asyncio.ensure_future(self.run())
+                        for i in range(self.workers)]
+
+    async def stop(self):
+        for runner in self.runners:
+            runner.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def normalize(self, spec):
+        """ Validate encounter spec and fill in defaults. Raise
+        ValueError on invalid specs """
+        import main
+        if not isinstance(spec, dict):
+            raise ValueError('encounter spec must be a JSON object')
+        teams = {}
+        for team in ('team_a', 'team_b'):
+            names = spec.get(team)
+            if not names or not isinstance(names, list):
+                raise ValueError('%s must be a non-empty list' % team)
+            for name in names:
+                try:
+                    main.get_creature(str(name))
+                except KeyError:
+                    raise ValueError('unknown creature %r' % name)
+            teams[team] = [str(name) for name in names]
+        matches = int(spec.get('matches', 100))
+        if matches < 1:
+            raise ValueError('matches must be positive')
+        if matches > self.max_matches:
+            raise ValueError('matches must be at most %i' % self.max_matches)
+        seed = spec.get('seed')
+        return {'team_a': teams['team_a'],
+                'team_b': teams['team_b'],
+                'matches': matches,
+                'seed': None if seed is None else int(seed),
+                'priority': int(spec.get('priority', 0))}
+
+    def submit(self, spec):
+        """ Queue encounter spec, or join an identical active job """
+        spec = self.normalize(spec)
+        key = json.dumps({k: v for k, v in spec.items() if k != 'priority'},
+                         sort_keys=True)
+        job = self.active.get(key)
+        if job is not None and job.is_active:
+            if spec['priority'] > job.priority:
+                job.priority = spec['priority']
+            return job
+
+        job = Job(str(next(self.ids)), spec, key)
+        self.jobs[job.id] = job
+        self.active[key] = job
+
+        base = spec['seed']
+        if base is None:
+            base = random.SystemRandom().getrandbits(32)
+        matches = spec['matches']
+        for n, start in enumerate(range(0, matches, self.chunk_size)):
+            size = min(self.chunk_size, matches - start)
+            job.pending += 1
+            self.queue.put_nowait((-job.priority, next(self.order),
+                                   job, size, base + n))
+        return job
+
+    def evict(self):
+        """ Forget jobs that finished more than ´ttl´ seconds ago """
+        expired = time.time() - self.ttl
+        for id, job in list(self.jobs.items()):
+            if job.finished is not None and job.finished < expired:
+                del self.jobs[id]
+
+    def cancel(self, job):
+        if job.is_active:
+            job.status = 'cancelled'
+            job.finished = time.time()
+            self.active.pop(job.key, None)
+            job.publish()
+
+    async def run(self):
+        """ Take chunks from the queue in priority order and run them
+        on the pool """
+        loop = asyncio.get_running_loop()
+        while True:
+            priority, order, job, size, seed = await self.queue.get()
+            if not job.is_active:
+                continue
+            if -priority < job.priority:
+                """ Priority was raised by an identical submission """
+                self.queue.put_nowait((-job.priority, order, job, size, seed))
+                continue
+            job.status = 'running'
+            spec = job.spec
+            try:
+                wins = await loop.run_in_executor(
+                    self.pool, run_chunk, spec['team_a'], spec['team_b'],
+                    size, seed)
+            except Exception as e:
+                job.status = 'failed'
+                job.error = repr(e)
+                job.finished = time.time()
+                self.active.pop(job.key, None)
+                job.publish()
+                continue
+
+            job.pending -= 1
+            if not job.is_active:
+                continue
+            job.wins.update(wins)
+            job.done += size
+            if not job.pending:
+                job.status = 'done'
+                job.finished = time.time()
+                self.active.pop(job.key, None)
+            job.publish()
+
+
+""" ================================================================ """
+""" ============================ HTTP ============================== """
+""" ================================================================ """
+
+class Request:
+
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+
+async def read_request(reader):
+    """ Parse HTTP/1.1 request from stream, return None on EOF """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, version = line.decode('latin-1').split()
+    except ValueError:
+        raise ValueError('malformed request line')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    return Request(method.upper(), path.split('?')[0], headers, body)
+
+
+def write_json(writer, code, data):
+    body = json.dumps(data).encode('utf-8')
+    writer.write(('HTTP/1.1 %i %s\r\n'
+                  'Content-Type: application/json\r\n'
+                  'Content-Length: %i\r\n'
+                  'Connection: close\r\n\r\n'
+                  % (code, STATUS[code], len(body))).encode('latin-1'))
+    writer.write(body)
+
+
+async def stream_job(writer, service, job):
+    """ Stream job events as JSON lines using chunked encoding until
+    the job finishes or the client disconnects """
+    writer.write(('HTTP/1.1 200 OK\r\n'
+                  'Content-Type: application/x-ndjson\r\n'
+                  'Transfer-Encoding: chunked\r\n'
+                  'Connection: close\r\n\r\n').encode('latin-1'))
+
+    def send(event):
+        data = (json.dumps(event) + '\n').encode('utf-8')
+        writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    queue = asyncio.Queue()
+    job.listeners.append(queue)
+    try:
+        event = job.snapshot()
+        send(event)
+        await writer.drain()
+        while event['status'] in ('queued', 'running'):
+            event = await queue.get()
+            send(event)
+            await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+    finally:
+        job.listeners.remove(queue)
+
+
+async def handle(service, reader, writer):
+    try:
+        request = await read_request(reader)
+        if request is None:
+            return
+        parts = [p for p in request.path.split('/') if p]
+        service.evict()
+
+        if parts == ['jobs'] and request.method == 'POST':
+            try:
+                spec = json.loads(request.body or b'{}')
+                job = service.submit(spec)
+            except (TypeError, ValueError) as e:
+                write_json(writer, 400, {'error': str(e)})
+            else:
+                if isinstance(spec, dict) and spec.get('stream'):
+                    await stream_job(writer, service, job)
+                else:
+                    write_json(writer, 202, job.snapshot())
+
+        elif parts == ['jobs'] and request.method == 'GET':
+            write_json(writer, 200, [job.snapshot()
+                                     for job in service.jobs.values()])
+
+        elif parts == ['creatures'] and request.method == 'GET':
+            import main
+            names = ['%s.%s' % (prefix, k)
+                     for prefix, source in (('npc', main.npc), ('pc', main.pc))
+                     for k in vars(source) if not k.startswith('_')]
+            write_json(writer, 200, names)
+
+        elif len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = service.jobs.get(parts[1])
+            if job is None:
+                write_json(writer, 404, {'error': 'no such job'})
+            elif len(parts) == 3 and parts[2] == 'events' \
+                    and request.method == 'GET':
+                await stream_job(writer, service, job)
+            elif len(parts) == 2 and request.method == 'GET':
+                write_json(writer, 200, job.snapshot())
+            elif len(parts) == 2 and request.method == 'DELETE':
+                service.cancel(job)
+                write_json(writer, 200, job.snapshot())
+            else:
+                write_json(writer, 405, {'error': 'method not allowed'})
+        else:
+            write_json(writer, 404, {'error': 'not found'})
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    except ValueError as e:
+        write_json(writer, 400, {'error': str(e)})
+    finally:
+        writer.close()
+
+
+async def serve(host=HOST, port=PORT, workers=None, chunk_size=CHUNK_SIZE,
+                max_matches=MAX_MATCHES, ttl=JOB_TTL):
+    """ Start the service and serve until cancelled """
+    service = Service(workers, chunk_size, max_matches, ttl)
+    await service.start()
+    server = await asyncio.start_server(
+        lambda r, w: handle(service, r, w), host, port)
+    print('Serving on http://%s:%i with %i warm workers'
+          % (host, port, service.workers))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Local simulation service')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--max-matches', type=int, default=MAX_MATCHES)
+    parser.add_argument('--ttl', type=float, default=JOB_TTL)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.chunk_size,
+                          args.max_matches, args.ttl))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,329 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import array
+import messages
+import pickle
+import random
+import world
+from multiprocessing import shared_memory
+from main import Encounter, setup_encounter
+from results import DRAW, STATS, SimulationResult
+from telemetry import SERIES, RoundTelemetry
+
+""" Aggregation of simulate() across worker processes in shared memory.
+
+Usage:
+
+    result = simulate(10000, team_a=[npc.orc] * 2,
+                      team_b=[npc.goblin] * 3, workers=4, seed=1)
+
+Every worker accumulates the win counts, round counts, creature stat
+totals and telemetry of its matches directly into its own partition of
+one multiprocessing.shared_memory block, so workers never write to the
+same place and need no locks. Workers return nothing: when they are
+done, the parent sums the partitions through memoryviews of the block
+without copying or unpickling them. Only the teams and the seed and
+range of each worker's matches are sent to the workers, so traffic
+between processes grows with the number of workers, not matches.
+
+The block has a fixed layout (see Layout), which is read from an
+encounter set up in the parent before the matches are played. Each
+match is seeded from the match seeds as in simulate(seed=...), so
+results do not depend on the number of workers. """
+
+
+""" Reasons of draws, see main.Encounter """
+REASONS = ('no damage', 'no contact', 'no progress', 'round cap')
+
+
+class Layout:
+
+    """ Fixed layout of a partition of the shared block: counters as
+    64-bit integers followed by totals as doubles
+
+        counters    matches, wins per outcome, draws per reason, matches
+                    per round count, and with telemetry the histograms
+                    per party, series and round and the deaths and
+                    survivors per creature type and round
+        totals      sums and squares of creature stats, and with
+                    telemetry the sums per party, series and round
+
+    :param encounter          encounter set up with the teams to play
+    :param telemetry          telemetry to collect; its existing scales
+                              are kept
+
+    :type encounter           main.Encounter
+    :type telemetry           telemetry.RoundTelemetry """
+
+    def __init__(self, encounter, telemetry=None):
+        parties = (encounter.party1, encounter.party2)
+        self.outcomes = [p.name for p in parties] + [DRAW]
+        self.rows = [(p.name, c.name, c.type)
+                     for p in parties for c in p.members]
+        self.rounds = Encounter.MAX_ROUNDS + 1
+
+        self.telemetry = None
+        self.scales = {}
+        self.types = []
+        if telemetry is not None:
+            probe = RoundTelemetry(telemetry.rounds, telemetry.bins)
+            probe.scales = dict(telemetry.scales)
+            probe.begin(encounter)
+            self.telemetry = (telemetry.rounds, telemetry.bins)
+            self.scales = {p.name: probe.scales[p.name] for p in parties}
+            self.types = sorted({c.type for p in parties
+                                 for c in p.members})
+
+        """ Sizes of the sections """
+        series = len(self.scales) * len(SERIES)
+        length = telemetry.rounds + 1 if telemetry is not None else 0
+        width = telemetry.bins + 1 if telemetry is not None else 0
+        self.counters = 1 + len(self.outcomes) + len(REASONS) + self.rounds \
+            + series * length * width + 2 * len(self.types) * length
+        self.totals = 2 * len(self.rows) * len(STATS) + series * length
+        self.size = 8 * (self.counters + self.totals)
+
+    def split(self, buffer, partition):
+        """ Return views of the sections of a partition of the block
+
+        :type buffer              memoryview
+        :type partition           int
+        :rtype                    {str: memoryview or {str: ...}} """
+        start = partition * self.size
+        middle = start + 8 * self.counters
+        counters = buffer[start:middle].cast('q')
+        totals = buffer[middle:start + self.size].cast('d')
+
+        def take(view, offset, size):
+            return view[offset:offset + size], offset + size
+
+        views = {}
+        i = j = 0
+        views['matches'], i = take(counters, i, 1)
+        views['wins'], i = take(counters, i, len(self.outcomes))
+        views['draws'], i = take(counters, i, len(REASONS))
+        views['rounds'], i = take(counters, i, self.rounds)
+        width = len(self.rows) * len(STATS)
+        views['sums'], j = take(totals, j, width)
+        views['squares'], j = take(totals, j, width)
+
+        if self.telemetry is not None:
+            rounds, bins = self.telemetry
+            views['series'] = {}
+            views['histograms'] = {}
+            for name in self.scales:
+                views['series'][name] = {}
+                views['histograms'][name] = {}
+                for s in SERIES:
+                    views['series'][name][s], j = take(totals, j, rounds + 1)
+                    views['histograms'][name][s], i = take(
+                        counters, i, (rounds + 1) * (bins + 1))
+            views['deaths'] = {}
+            views['censored'] = {}
+            for type_ in self.types:
+                views['deaths'][type_], i = take(counters, i, rounds + 1)
+                views['censored'][type_], i = take(counters, i, rounds + 1)
+        return views
+
+
+class Partition:
+
+    """ A worker's partition of the shared block, written in place as
+    matches are added
+
+    :type layout              Layout
+    :type buffer              memoryview
+    :type partition           int """
+
+    def __init__(self, layout, buffer, partition):
+        self.views = layout.split(buffer, partition)
+        self.outcomes = {o: i for i, o in enumerate(layout.outcomes)}
+        self.reasons = {r: i for i, r in enumerate(REASONS)}
+        self.index = {(team, name): row
+                      for row, (team, name, _) in enumerate(layout.rows)}
+
+        """ Telemetry writes its sums and histograms into the block """
+        self.telemetry = None
+        if layout.telemetry is not None:
+            self.telemetry = RoundTelemetry(*layout.telemetry)
+            self.telemetry.scales = dict(layout.scales)
+            self.telemetry.sums = self.views['series']
+            self.telemetry.histograms = self.views['histograms']
+            self.telemetry.deaths = self.views['deaths']
+            self.telemetry.censored = self.views['censored']
+
+    def add(self, encounter, winner):
+        """ Add a finished match, see SimulationResult.add()
+
+        :type encounter           main.Encounter
+        :type winner              str """
+        views = self.views
+        views['matches'][0] += 1
+        views['wins'][self.outcomes[winner]] += 1
+        if winner == DRAW:
+            reason = encounter.draw_reason or 'round cap'
+            views['draws'][self.reasons[reason]] += 1
+        views['rounds'][encounter.rounds] += 1
+
+        width = len(STATS)
+        sums = views['sums']
+        squares = views['squares']
+        for party in (encounter.party1, encounter.party2):
+            for creature in party.members:
+                offset = self.index[(party.name, creature.name)] * width
+                for i, stat in enumerate(STATS):
+                    value = getattr(creature, stat)
+                    sums[offset + i] += value
+                    squares[offset + i] += value * value
+
+
+def release(views):
+    """ Release views returned by Layout.split(), so that the block can
+    be closed even if something still refers to them, e.g. the
+    telemetry of an encounter that has not been garbage collected """
+    for view in views.values():
+        if isinstance(view, dict):
+            release(view)
+        else:
+            view.release()
+
+
+def add_up(views):
+    """ Return element-wise sums of views of the same section of all
+    partitions as a list """
+    return [sum(values) for values in zip(*views)]
+
+
+def collect(layout, buffer, partitions, telemetry=None):
+    """ Sum the partitions of the block into a SimulationResult and,
+    if given, add the telemetry to ´telemetry´
+
+    :type layout              Layout
+    :type buffer              memoryview
+    :type partitions          int
+    :type telemetry           telemetry.RoundTelemetry
+    :rtype                    results.SimulationResult """
+    parts = [layout.split(buffer, p) for p in range(partitions)]
+    result = SimulationResult(teams=layout.outcomes[:2])
+    result.matches = add_up(p['matches'] for p in parts)[0]
+
+    wins = add_up(p['wins'] for p in parts)
+    result.wins = {o: w for o, w in zip(layout.outcomes, wins)
+                   if w or o != DRAW}
+    draws = add_up(p['draws'] for p in parts)
+    result.draws = {r: d for r, d in zip(REASONS, draws) if d}
+
+    rounds = add_up(p['rounds'] for p in parts)
+    while rounds and not rounds[-1]:
+        rounds.pop()
+    result.rounds = array.array('q', rounds)
+
+    for row, (team, name, type_) in enumerate(layout.rows):
+        result.index[(team, name)] = row
+        result.types.append(type_)
+    result.sums = array.array('d', add_up(p['sums'] for p in parts))
+    result.squares = array.array('d', add_up(p['squares'] for p in parts))
+
+    if telemetry is not None:
+        rounds, bins = layout.telemetry
+        for name, scales in layout.scales.items():
+            telemetry.scales.setdefault(name, scales)
+            sums = telemetry.sums.setdefault(
+                name, {s: [0] * (rounds + 1) for s in SERIES})
+            histograms = telemetry.histograms.setdefault(
+                name, {s: [0] * ((rounds + 1) * (bins + 1)) for s in SERIES})
+            for s in SERIES:
+                for i, v in enumerate(add_up(p['series'][name][s]
+                                             for p in parts)):
+                    sums[s][i] += v
+                for i, v in enumerate(add_up(p['histograms'][name][s]
+                                             for p in parts)):
+                    histograms[s][i] += v
+        for type_ in layout.types:
+            for key, counts in (('deaths', telemetry.deaths),
+                                ('censored', telemetry.censored)):
+                counts = counts.setdefault(type_, [0] * (rounds + 1))
+                for i, v in enumerate(add_up(p[key][type_] for p in parts)):
+                    counts[i] += v
+        telemetry.matches += result.matches
+
+    for p in parts:
+        release(p)
+    return result
+
+
+def play_matches(data, layout, buffer, partition, seed, start, count):
+    """ Play matches ´start´ to ´start´ + ´count´ of the match seeds
+    and add them to a partition of the block """
+    team_a, team_b, horde, policy = pickle.loads(data)
+    for creature in team_a + team_b:
+        creature.compile_damage()
+
+    part = Partition(layout, buffer, partition)
+    seeds = random.Random(seed)
+    for _ in range(start):
+        seeds.getrandbits(63)
+    try:
+        for _ in range(count):
+            random.seed(seeds.getrandbits(63))
+            x = setup_encounter(team_a, team_b, horde, part.telemetry,
+                                policy)
+            part.add(x, x.fight())
+    finally:
+        release(part.views)
+
+
+def play_chunk(name, data, layout, partition, seed, start, count):
+    """ Worker process: attach to the block and play a chunk of the
+    matches. Damage types are interned anew in the worker, so the
+    damage modifiers of the creatures are compiled again """
+    messages.VERBOSE_LEVEL = 0
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        play_matches(data, layout, block.buf, partition, seed, start,
+                     count)
+    finally:
+        block.close()
+
+
+def simulate(matches, team_a, team_b, workers, seed=None,
+             horde=False, telemetry=None, policy=None):
+    """ Play matches in worker processes and return their results, see
+    main.simulate()
+
+    :type matches             int
+    :type team_a              [BaseCreature, ...]
+    :type team_b              [BaseCreature, ...]
+    :type workers             int
+    :param seed               seed of the match seeds
+    :type seed                int
+    :rtype                    results.SimulationResult """
+    if seed is None:
+        seed = random.getrandbits(63)
+
+    """ The layout is read from an encounter that is never fought """
+    state = random.getstate()
+    x = setup_encounter(team_a, team_b, horde, policy=policy)
+    world.Map.reset_map()
+    random.setstate(state)
+    layout = Layout(x, telemetry)
+
+    size = max(-(-matches // workers), 1)
+    starts = list(range(0, matches, size)) or [0]
+    data = pickle.dumps((list(team_a), list(team_b), horde, policy))
+    block = shared_memory.SharedMemory(create=True,
+                                       size=layout.size * len(starts))
+    try:
+        """ New blocks are filled with zeros """
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(play_chunk, [block.name] * len(starts),
+                          [data] * len(starts), [layout] * len(starts),
+                          range(len(starts)), [seed] * len(starts), starts,
+                          [min(size, matches - s) for s in starts]))
+        result = collect(layout, block.buf, len(starts), telemetry)
+    finally:
+        block.close()
+        block.unlink()
+    return result
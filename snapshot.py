@@ -0,0 +1,321 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import copy
+import dice
+import messages
+import operator
+import pickle
+import random
+import scheduler
+import world
+from collections import namedtuple
+from results import SimulationResult
+
+""" Snapshots of a running encounter for what-if analysis.
+
+Usage:
+
+    x = setup_encounter([pc.ogno], [npc.troll, npc.troll])
+    x.start()
+    x.play_round()
+    x.play_round()                      # Start of round 3
+    x.party1.members[0].hp = 40         # What if Ogno had 40 HP?
+    state = snapshot.take(x)
+    result = snapshot.fork(x, state, matches=1000, workers=4)
+    result.win_rate(world.TEAM_A)       # Conditional win rate
+
+A snapshot holds everything that changes in battle: creature HP,
+conditions, positions, ammo, recharges and statistics, the map, the
+timer wheel, the initiative position (see Encounter.play_round(until=))
+and the state of the random number generators. It is encoded as
+tuples and dicts of plain values, where creatures are referred to by
+their place in the initiative order, so taking and restoring one is
+much cheaper than copy.deepcopy() of the encounter, and a snapshot can
+be pickled. Restoring writes the state back into the creatures of the
+same encounter, which can then be resumed.
+
+Definitions that do not change in battle, such as weapons' dice and
+selection tables, are shared and not part of the snapshot. """
+
+
+""" Snapshot of an encounter. ´progress´ is the stalemate detection
+state of the encounter, see Encounter.start() """
+State = namedtuple('State', ['round', 'turn', 'progress', 'creatures',
+                             'map', 'wheel', 'random'])
+
+""" Encounter attributes of stalemate detection """
+PROGRESS = ('draw_reason', 'lowest_hp', 'attacks', 'last_damage',
+            'last_attack', 'living')
+
+""" Creature attributes that hold plain values """
+VALUES = ('hp', 'max_hp', 'ac_bonus', 'to_hit_bonus', 'initiative',
+          'prone', 'prevent_heal', 'slot', 'position', 'distance',
+          'first_attack', 'weapon_choice', 'save_success',
+          'damage_dealt', 'kills', 'deaths', 'suicides', 'hits', 'misses',
+          'turns_alive')
+
+""" Creature attributes that hold dicts of plain values, and
+conditions whose ´by´ refers to a creature """
+DICTS = ('speed', 'scores', 'saves', 'advantage', 'poisoned',
+         'paralyzed', 'restrained')
+CONDITIONS = ('grappled', 'frightened', 'swallowed')
+
+get_progress = operator.attrgetter(*PROGRESS)
+get_values = operator.attrgetter(*VALUES)
+get_dicts = operator.attrgetter(*DICTS)
+get_conditions = operator.attrgetter(*CONDITIONS)
+
+
+def get_weapons(creature):
+    """ Return the creature's weapons without duplicates """
+    weapons = {}
+    for attacks in (creature.melee_attacks, creature.ranged_attacks):
+        for ws in attacks.values():
+            for w in ws:
+                weapons.setdefault(id(w), w)
+    return list(weapons.values())
+
+
+def encode_creature(creature, index):
+    """ Return battle state of a creature as a tuple
+
+    :param index              creature -> place in initiative order
+    :type index               {BaseCreature: int} """
+    conditions = []
+    for condition in get_conditions(creature):
+        condition = dict(condition)
+        condition['by'] = index.get(condition['by'])
+        conditions.append(condition)
+
+    suggested = creature.suggested_targets
+    if suggested is not None:
+        suggested = tuple(index[c] for c in suggested)
+
+    stomach = creature.stomach
+    if stomach is not None:
+        stomach = (tuple(index[c] for c in stomach.contents),
+                   stomach.damage_count)
+
+    stream = creature.stream
+    if stream is not None:
+        stream = stream.getstate()
+
+    return (get_values(creature),
+            tuple(dict(d) for d in get_dicts(creature)),
+            tuple(conditions),
+            tuple(creature.immunities),
+            frozenset(creature.timers),
+            index.get(creature.focused_enemy),
+            suggested,
+            tuple((w.ammo, w.uses_per_turn,
+                   tuple(getattr(a, 'available', None) for a in w.special))
+                  for w in get_weapons(creature)),
+            tuple(a.available for a in creature.actions),
+            stomach,
+            stream)
+
+
+def decode_creature(creature, state, order):
+    """ Write battle state returned by encode_creature() back into the
+    creature
+
+    :param order              creatures in initiative order
+    :type order               [BaseCreature, ...] """
+    values, dicts, conditions, immunities, timers, focused, suggested, \
+        weapons, actions, stomach, stream = state
+
+    for name, value in zip(VALUES, values):
+        setattr(creature, name, value)
+    for name, value in zip(DICTS, dicts):
+        setattr(creature, name, dict(value))
+    for name, value in zip(CONDITIONS, conditions):
+        value = dict(value)
+        if value['by'] is not None:
+            value['by'] = order[value['by']]
+        setattr(creature, name, value)
+
+    creature.immunities = list(immunities)
+    creature.timers = set(timers)
+    creature.focused_enemy = None if focused is None else order[focused]
+    creature.suggested_targets = None if suggested is None \
+        else [order[i] for i in suggested]
+
+    """ Turn plans are dropped at the beginning of each turn """
+    creature.active_weapon = None
+    creature.turn_plan = None
+
+    for weapon, (ammo, uses, available) in zip(get_weapons(creature),
+                                               weapons):
+        weapon.ammo = ammo
+        weapon.uses_per_turn = uses
+        for ability, value in zip(weapon.special, available):
+            if value is not None:
+                ability.available = value
+    for action, available in zip(creature.actions, actions):
+        action.available = available
+
+    if stomach is not None:
+        contents, damage_count = stomach
+        creature.stomach.contents = [order[i] for i in contents]
+        creature.stomach.damage_count = damage_count
+
+    if stream is not None:
+        creature.stream.setstate(stream)
+
+
+def take(encounter):
+    """ Return a snapshot of a started encounter between rounds or,
+    after play_round(until=slot), before the creature in that slot acts
+
+    :type encounter           main.Encounter
+    :rtype                    State """
+    order = encounter.order_of_action
+    index = {c: i for i, c in enumerate(order)}
+
+    statics, occupied, paths = world.Map.get_state()
+    map_ = (dict(statics),
+            {position: index[c] for position, c in occupied.items()},
+            dict(paths))
+
+    round_, slot, buckets = scheduler.Wheel.get_state()
+    wheel = (round_, slot,
+             {key: tuple((priority, index[c], name)
+                         for priority, c, name in events)
+              for key, events in buckets.items()})
+
+    return State(encounter.round, encounter.turn, get_progress(encounter),
+                 tuple(encode_creature(c, index) for c in order),
+                 map_, wheel, random.getstate())
+
+
+def restore(encounter, state, rng=True):
+    """ Restore an encounter, the map and the timer wheel to a snapshot
+    so that the fight can be resumed with Encounter.resume()
+
+    :type encounter           main.Encounter
+    :type state               State
+    :param rng                also restore the random number generators,
+                              which replays the same continuation """
+    order = encounter.order_of_action
+    encounter.round = state.round
+    encounter.turn = state.turn
+    for name, value in zip(PROGRESS, state.progress):
+        setattr(encounter, name, value)
+    for creature, creature_state in zip(order, state.creatures):
+        decode_creature(creature, creature_state, order)
+    for party in (encounter.party1, encounter.party2):
+        party.alive_hint = 0
+
+    statics, occupied, paths = state.map
+    world.Map.set_state((
+        dict(statics),
+        {position: order[i] for position, i in occupied.items()},
+        dict(paths)))
+
+    round_, slot, buckets = state.wheel
+    scheduler.Wheel.set_state((
+        round_, slot,
+        {key: [(priority, order[i], name) for priority, i, name in events]
+         for key, events in buckets.items()}))
+
+    if rng:
+        random.setstate(state.random)
+
+
+def branch(encounter, state, seed):
+    """ Restore a snapshot with fresh dice: the random number generator
+    and the creatures' own streams, if they have any, are seeded by
+    ´seed´ instead of being restored
+
+    :type seed                int """
+    restore(encounter, state, rng=False)
+    random.seed(seed)
+    streams = [c.stream for c in encounter.order_of_action
+               if c.stream is not None]
+    if streams:
+        encounter.set_streams(
+            seed, isinstance(streams[0], dice.AntitheticRandom))
+
+
+def play_forks(encounter, state, seeds):
+    """ Resume an encounter from a snapshot once per seed and return
+    the results
+
+    :type seeds               [int, ...]
+    :rtype                    results.SimulationResult """
+    result = SimulationResult(teams=(encounter.party1.name,
+                                     encounter.party2.name))
+    telemetry = encounter.telemetry
+    encounter.telemetry = None
+    try:
+        for seed in seeds:
+            branch(encounter, state, seed)
+            result.add(encounter, encounter.resume())
+    finally:
+        encounter.telemetry = telemetry
+        restore(encounter, state)
+    return result
+
+
+def play_chunk(data, seeds):
+    """ Worker process: unpickle an encounter and a snapshot and play
+    forks of it. Damage types are interned anew in the worker, so the
+    damage modifiers of the creatures are compiled again """
+    messages.VERBOSE_LEVEL = 0
+    encounter, state = pickle.loads(data)
+    for creature in encounter.order_of_action:
+        creature.compile_damage()
+    return play_forks(encounter, state, seeds)
+
+
+def fork(encounter, state, matches=1000, seed=None, workers=1,
+         quiet=False):
+    """ Play many continuations of a snapshot and return their results,
+    i.e. win rates conditional on the state of the snapshot. Each
+    continuation is seeded separately, so results do not depend on
+    the number of workers. The encounter is left at the snapshot
+
+        :param encounter          encounter the snapshot was taken of
+        :param state              snapshot, see take()
+        :param matches            number of continuations
+        :param seed               seed of the continuation seeds
+        :param workers            number of worker processes
+        :param quiet              do not print the results
+
+        :type encounter           main.Encounter
+        :type state               State
+        :type matches             int
+        :type seed                int
+        :type workers             int
+        :type quiet               bool
+        :rtype                    results.SimulationResult """
+    verbose = messages.VERBOSE_LEVEL
+    messages.VERBOSE_LEVEL = 0
+
+    seeds = random.Random(seed)
+    seeds = [seeds.getrandbits(63) for _ in range(matches)]
+    try:
+        if workers <= 1:
+            result = play_forks(encounter, state, seeds)
+        else:
+            """ Telemetry stays in this process """
+            encounter_ = copy.copy(encounter)
+            encounter_.telemetry = None
+            data = pickle.dumps((encounter_, state))
+            size = -(-matches // workers)
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunks = pool.map(play_chunk, [data] * workers,
+                                  [seeds[i:i + size]
+                                   for i in range(0, matches, size)])
+                result = SimulationResult(teams=(encounter.party1.name,
+                                                 encounter.party2.name))
+                for chunk in chunks:
+                    result.merge(chunk)
+    finally:
+        messages.VERBOSE_LEVEL = verbose
+
+    if not quiet:
+        result.report()
+    return result
@@ -0,0 +1,228 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Per-round battle telemetry aggregated across matches.
+
+Usage:
+
+    t = RoundTelemetry()
+    simulate(matches=1000, team_a=[npc.zombie]*6, team_b=[npc.troll],
+             telemetry=t)
+    t.mean('Team North', 'hp')          # mean party HP after each round
+    t.quantile('Team North', 'hp', 0.5) # median party HP after each round
+    t.survival('zombie')                # share of zombies alive per round
+
+All storage is allocated per round and per histogram bin, so memory does
+not grow with the number of matches. """
+
+""" Recorded series """
+SERIES = ('hp', 'alive', 'damage')
+
+
+class RoundTelemetry:
+
+    """ Collects each party's total HP, number of living members and
+    damage dealt at the end of every round, and the survival times of
+    each creature type.
+
+    Round 0 is the state before the first round. Once a match is over
+    its final state is carried forward to the remaining rounds, so that
+    every round is averaged over all matches. Quantiles are read from
+    fixed-width histograms scaled by the party's starting HP, its size
+    and the opposing party's starting HP respectively.
+
+    :param rounds             number of rounds to record
+    :param bins               number of histogram bins per round
+
+    :type rounds              int
+    :type bins                int """
+
+    def __init__(self, rounds=100, bins=100):
+        self.rounds = rounds
+        self.bins = bins
+        self.matches = 0
+        self.scales = {}     # Party -> {series: (full scale, bins)}
+        self.sums = {}       # Party -> {series: [sum per round]}
+        self.histograms = {} # Party -> {series: [count per round*bin]}
+        self.deaths = {}     # Creature type -> [deaths per round]
+        self.censored = {}   # Creature type -> [survivors per round]
+
+        """ State of the match being recorded """
+        self.alive = {}
+        self.damage = {}
+        self.last = {}
+        self.round = 0
+
+    def __repr__(self):
+        return "RoundTelemetry(%i matches, %i rounds)" % (self.matches,
+                                                          self.rounds)
+
+    def begin(self, encounter):
+        """ Start recording a match
+
+        :type encounter           main.Encounter """
+        parties = (encounter.party1, encounter.party2)
+        for party, other in (parties, parties[::-1]):
+            if party.name not in self.scales:
+                scales = {
+                    'hp': sum(c.max_hp for c in party.members) or 1,
+                    'alive': len(party.members) or 1,
+                    'damage': sum(c.max_hp for c in other.members) or 1}
+                """ Small scales get one bin per unit and exact quantiles """
+                self.scales[party.name] = {
+                    s: (v, max(int(min(self.bins, v)), 1))
+                    for s, v in scales.items()}
+                self.sums[party.name] = {s: [0] * (self.rounds + 1)
+                                         for s in SERIES}
+                self.histograms[party.name] = {
+                    s: [0] * ((self.rounds + 1) * (self.bins + 1))
+                    for s in SERIES}
+            self.damage[party.name] = sum(c.damage_dealt
+                                          for c in party.members)
+            for creature in party.members:
+                if creature.type not in self.deaths:
+                    self.deaths[creature.type] = [0] * (self.rounds + 1)
+                    self.censored[creature.type] = [0] * (self.rounds + 1)
+        self.alive = {c: c.type for c in encounter.party1.members
+                      + encounter.party2.members if not c.is_dead}
+        self.round = 0
+        self.record(encounter, 0)
+
+    def record(self, encounter, round_):
+        """ Record the state of both parties at the end of a round
+
+        :type encounter           main.Encounter
+        :type round_              int """
+        if round_ > self.rounds:
+            return
+        self.round = round_
+        self.last = {}
+        for party in (encounter.party1, encounter.party2):
+            hp = 0
+            alive = 0
+            damage = 0
+            for creature in party.members:
+                damage += creature.damage_dealt
+                if not creature.is_dead:
+                    hp += max(creature.hp, 0)
+                    alive += 1
+            values = {'hp': hp, 'alive': alive,
+                      'damage': damage - self.damage[party.name]}
+            self.damage[party.name] = damage
+            self.last[party.name] = values
+            self.add(party.name, round_, values)
+
+        """ Creatures that died during the round """
+        dead = [c for c in self.alive if c.is_dead]
+        for creature in dead:
+            self.deaths[self.alive.pop(creature)][round_] += 1
+
+    def end(self, encounter):
+        """ Finish recording a match. Survivors are censored at the last
+        recorded round and the final state is carried forward
+
+        :type encounter           main.Encounter """
+        for type_ in self.alive.values():
+            self.censored[type_][self.round] += 1
+        self.alive = {}
+        for name, values in self.last.items():
+            values = dict(values, damage=0)
+            for round_ in range(self.round + 1, self.rounds + 1):
+                self.add(name, round_, values)
+        self.matches += 1
+
+    def add(self, name, round_, values):
+        """ Add values of a party to sums and histograms of a round """
+        offset = round_ * (self.bins + 1)
+        for series, value in values.items():
+            self.sums[name][series][round_] += value
+            scale, bins = self.scales[name][series]
+            b = int(bins * value / scale)
+            self.histograms[name][series][offset + min(max(b, 0), bins)] += 1
+
+    def mean(self, party, series):
+        """ Return mean value of a series per round
+
+        :param party              party name, e.g. world.TEAM_A
+        :param series             ´hp´, ´alive´ or ´damage´
+        :rtype                    [float, ...] """
+        matches = self.matches or 1
+        return [v / matches for v in self.sums[party][series]]
+
+    def quantile(self, party, series, q):
+        """ Return q-quantile of a series per round. Values are rounded
+        down to histogram bins, i.e. to at most 1/bins of full scale
+
+        :param q                  quantile between 0 and 1
+        :rtype                    [float, ...] """
+        scale, bins = self.scales[party][series]
+        width = self.bins + 1
+        counts = self.histograms[party][series]
+        quantiles = []
+        for round_ in range(self.rounds + 1):
+            row = counts[round_ * width:(round_ + 1) * width]
+            target = q * sum(row)
+            cumulative = 0
+            value = 0
+            for b, count in enumerate(row):
+                cumulative += count
+                if count and cumulative >= target:
+                    value = b
+                    break
+            quantiles.append(value * scale / bins)
+        return quantiles
+
+    def survival(self, type_):
+        """ Return Kaplan-Meier estimate of the share of creatures of a
+        type still alive after each round
+
+        :param type_              creature type, e.g. ´zombie´
+        :rtype                    [float, ...] """
+        deaths = self.deaths[type_]
+        censored = self.censored[type_]
+        at_risk = sum(deaths) + sum(censored)
+        estimate = 1.0
+        curve = []
+        for d, c in zip(deaths, censored):
+            if at_risk > 0:
+                estimate *= 1 - d / at_risk
+            curve.append(estimate)
+            at_risk -= d + c
+        return curve
+
+    def median_survival(self, type_):
+        """ Return first round by which half of the creatures of a type
+        are dead, or None if more than half survive """
+        for round_, share in enumerate(self.survival(type_)):
+            if share <= 0.5:
+                return round_
+        return None
+
+    def report(self, rounds=10):
+        """ Print mean and median series of the first rounds and the
+        survival curves """
+        last = min(rounds, self.rounds)
+        header = ['round'] + [str(r) for r in range(last + 1)]
+        row_format = "{:>12}" + "{:>8}" * (last + 1)
+        print('ROUND TELEMETRY (%i matches)' % self.matches)
+        print('==' * 40)
+        for party in self.sums:
+            print(party)
+            print('--' * 40)
+            print(row_format.format(*header))
+            for series in SERIES:
+                mean = self.mean(party, series)[:last + 1]
+                median = self.quantile(party, series, 0.5)[:last + 1]
+                print(row_format.format('avg.' + series,
+                                        *["%.1f" % v for v in mean]))
+                print(row_format.format('med.' + series,
+                                        *["%.1f" % v for v in median]))
+            print('\n')
+        print('Survival')
+        print('--' * 40)
+        print(row_format.format(*header))
+        for type_ in sorted(self.deaths):
+            curve = self.survival(type_)[:last + 1]
+            print(row_format.format(type_[0:12],
+                                    *["%.2f" % v for v in curve]))
+        print('\n')
@@ -1,7 +1,14 @@
+import bisect
+import damagetypes
 import dice
 import messages
+from abilities import Trigger
 from mechanics import DnDRuleset as R
 
+""" Passive trigger of weapon hits; enum member lookups are slow on
+hot paths """
+ON_HIT = Trigger.ON_HIT
+
 class Weapon(object):
 
     def __init__(self, name, damage, damage_type,
@@ -18,7 +25,7 @@ class Weapon(object):
         self.name = name
         self.damage_print = damage
         self.damage = dice.parse_damage(damage)
-        self.damage_type = damage_type
+        self.damage_type = [damagetypes.get(t) for t in damage_type]
         self.reach = reach
         self.to_hit = to_hit
         self.number_of_targets = number_of_targets
@@ -52,8 +59,96 @@ class Weapon(object):
                 for on_hit_effect in self.special:
                     on_hit_effect.use(source, target, total_damage, crit_multiplier)
 
+            """ Passives of the attacker used on hits """
+            if source.triggers[ON_HIT]:
+                source.trigger(ON_HIT, target, total_damage, crit_multiplier)
+
 class MultiWeapon(Weapon):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.multiattack = True
+
+
+
+class WeaponTable:
+
+    """ Precompiled selection table for a list of weapons. Weapons are
+    grouped into distance bands by their minimum distance, and the
+    candidates for each band, remaining ammo and remaining uses are
+    resolved once into index tuples that random draws index directly.
+
+    The table only stores indices, so it is shared by all copies of a
+    creature; methods take the weapon list of the copy in question.
+
+    :param weapons          list of weapons (duplicates weight draws)
+    :param check_ammo       only weapons with ammo are candidates
+    :param check_range      only weapons whose minimum distance is
+                            covered are candidates
+
+    :type weapons           [Weapon, ...]
+    :type check_ammo        bool
+    :type check_range       bool """
+
+    def __init__(self, weapons, check_ammo=False, check_range=True):
+        weapons = weapons or []
+        self.size = len(weapons)
+        self.check_ammo = check_ammo
+        self.min_distance = [w.min_distance for w in weapons]
+        if check_range:
+            self.bands = sorted(set(self.min_distance))
+        else:
+            self.bands = []
+        self.candidates = {}
+        self.usable = {}
+
+    def __bool__(self):
+        return bool(self.size)
+
+    def select(self, weapons, distance):
+        """ Return key of the candidate weapons at given distance or
+        None if there are no candidates """
+        if self.bands:
+            band = bisect.bisect_right(self.bands, distance)
+        else:
+            band = -1
+        mask = 0
+        if self.check_ammo:
+            for i, weapon in enumerate(weapons):
+                if weapon.ammo > 0:
+                    mask |= 1 << i
+        key = (band, mask)
+
+        candidates = self.candidates.get(key)
+        if candidates is None:
+            limit = self.bands[band - 1] if band > 0 else None
+            candidates = tuple(
+                i for i in range(self.size)
+                if (band == -1 or (limit is not None
+                                   and self.min_distance[i] <= limit))
+                and (not self.check_ammo or mask & 1 << i))
+            self.candidates[key] = candidates
+
+        if not candidates:
+            return None
+        return key
+
+    def get(self, weapons, key):
+        """ Return candidate weapons of a key """
+        return [weapons[i] for i in self.candidates[key]]
+
+    def draw(self, weapons, key):
+        """ Pick random candidate weapon that has uses left this turn,
+        or return None if every candidate has used up its uses """
+        candidates = self.candidates[key]
+        mask = 0
+        for i in candidates:
+            if weapons[i].uses_per_turn != 0:
+                mask |= 1 << i
+        usable = self.usable.get((key, mask))
+        if usable is None:
+            usable = tuple(i for i in candidates if mask & 1 << i)
+            self.usable[(key, mask)] = usable
+        if not usable:
+            return None
+        return weapons[dice.STREAM.choice(usable)]
@@ -42,6 +42,16 @@ class Map:
     def reset_paths(cls):
         cls.paths = {}
 
+    @classmethod
+    def get_state(cls):
+        """ Return the current map containers """
+        return cls.statics, cls.occupied, cls.paths
+
+    @classmethod
+    def set_state(cls, state):
+        """ Switch to map containers returned by get_state() """
+        cls.statics, cls.occupied, cls.paths = state
+
     @classmethod
     def reset_map(cls):
         cls.statics = {}
@@ -66,6 +76,97 @@ def get_dist(A, B):
     this is the exact movement cost from A to B """
     return round(math.sqrt(sum([(s - d) ** 2 for s, d, in zip(A, B)]))) * 5
 
+""" Offsets of all cells adjacent to (or overlapping) a cell """
+NEIGHBOURHOOD = [(dx, dy, dz) for dx in (-1, 0, 1)
+                 for dy in (-1, 0, 1) for dz in (-1, 0, 1)]
+
+def count_adjacent(coords, exclude=()):
+    """ Return the number of occupied positions adjacent to (or
+    overlapping) coordinates, ignoring positions listed in ´exclude´.
+    Equivalent to testing is_adjacent() against every occupied
+    position, but costs a constant 27 lookups """
+    x, y, z = coords
+    occupied = Map.occupied
+    count = 0
+    for dx, dy, dz in NEIGHBOURHOOD:
+        pos = (x + dx, y + dy, z + dz)
+        if pos in occupied and pos not in exclude:
+            count += 1
+    return count
+
+def enemy_is_adjacent(creature, enemies=None):
+    """ Return True if an enemy of the creature occupies a position
+    adjacent to (or overlapping) it. If the enemy party is smaller than
+    the neighbourhood, its members are checked instead of the map """
+    x, y, z = creature.position
+    occupied = Map.occupied
+    if enemies is not None and len(enemies.members) < len(NEIGHBOURHOOD):
+        for enemy in enemies.members:
+            ex, ey, ez = enemy.position
+            if -1 <= ex - x <= 1 and -1 <= ey - y <= 1 \
+                    and -1 <= ez - z <= 1 \
+                    and occupied.get(enemy.position) is enemy:
+                return True
+        return False
+    for dx, dy, dz in NEIGHBOURHOOD:
+        occupant = occupied.get((x + dx, y + dy, z + dz))
+        if occupant is not None and occupant.party != creature.party:
+            return True
+    return False
+
+def ally_is_adjacent(creature):
+    """ Return True if an ally of the creature occupies a position
+    adjacent to it """
+    x, y, z = creature.position
+    occupied = Map.occupied
+    for dx, dy, dz in NEIGHBOURHOOD:
+        occupant = occupied.get((x + dx, y + dy, z + dz))
+        if occupant is not None and occupant is not creature \
+                and occupant.party == creature.party \
+                and occupant.position != creature.position:
+            return True
+    return False
+
+def find_closest(position, party, limit):
+    """ Return living members of ´party´ (party name) closest to
+    position by searching the map in growing rings around it, or None
+    if none is found within ´limit´ cells. Ties are all returned as
+    they are broken by the caller.
+
+    Only creatures the map holds are found: the map keeps one creature
+    per cell, so a creature that shares its cell with another one, or
+    that was dropped from the map when another creature left the cell,
+    is not seen, and only the plane of ´position´ is searched. The
+    result can therefore differ from a scan of the party's members """
+    x, y, z = position
+    occupied = Map.occupied
+    best = None
+    found = []
+    for r in range(0, limit + 1):
+        if best is not None and r * 5 > best:
+            break
+        if r == 0:
+            ring = [(x, y, z)]
+        else:
+            ring = [(x + dx, y + r, z) for dx in range(-r, r + 1)] \
+                 + [(x + dx, y - r, z) for dx in range(-r, r + 1)] \
+                 + [(x + r, y + dy, z) for dy in range(-r + 1, r)] \
+                 + [(x - r, y + dy, z) for dy in range(-r + 1, r)]
+        for pos in ring:
+            occupant = occupied.get(pos)
+            if occupant is None or occupant.party != party \
+                    or occupant.is_dead:
+                continue
+            distance = get_dist(position, pos)
+            if best is None or distance < best:
+                best = distance
+                found = [occupant]
+            elif distance == best:
+                found.append(occupant)
+    if best is None:
+        return None
+    return found
+
 def get_adjacent(coords):
     x, y, z = coords
     for dx in [-1,1,0]:
@@ -222,9 +323,8 @@ def close_distance(creature, path, reach, run=False):
     if move_points < 5 or not path:
         return 0, creature.position
 
-    """ Get enemy positions in the map that are not in the path """
-    enemy_pos = [pos for pos, party in Map.occupied.items()
-                if party != creature.party and pos not in path]
+    """ Occupied positions in the path are not counted as adjacent """
+    on_path = set(path)
 
     penalty = 0
     distance = 0
@@ -235,9 +335,7 @@ def close_distance(creature, path, reach, run=False):
 
         """ Check if enemies are occupying coordinates next to the
         current position, add 5 ft penalty for each """
-        if enemy_pos:
-            adjacent = [is_adjacent(coordinates, B) for B in enemy_pos]
-            penalty += sum(adjacent) * 5
+        penalty += count_adjacent(coordinates, on_path) * 5
 
         """ Check if creatures are blocking the path. Add 15 ft penalty
         for enemies and 5 ft for allies """